@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.bootstrap
+    ---------------
+
+    Bootstrap confidence intervals of the solver ranking. The instances are
+    resampled with replacement. Every ranking measure is a weighted sum of
+    per-instance sums (or the ratio of two), so a batch of resamples is
+    evaluated with one matrix product of the resample counts and the
+    instances x solver configurations arrays of SweepRuns.instance_matrices.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import numpy
+
+# number of resamples evaluated at once, bounds the size of the temporary arrays
+BATCH_SIZE = 200
+
+
+class BootstrapRanking(object):
+    """ Bootstrap results of the ranked solver configurations.
+        `intervals` maps the measures 'solved' (number of successful runs),
+        'par1' and 'par' (penalized average cost with the given penalty
+        factor) to tuples (lower bounds, upper bounds) of arrays.
+        below[a, b] is the fraction of resamples in which solver
+        configuration a is ranked below b.
+    """
+
+    def __init__(self, solver_config_ids, intervals, below):
+        self.solver_config_ids = solver_config_ids
+        self.intervals = intervals
+        self.below = below
+        self._index = dict((sc_id, n) for n, sc_id in enumerate(solver_config_ids))
+
+    def inversion_probability(self, a, b):
+        """ Probability that the solver configurations with the IDs a and b
+            swap places, given that a is ranked above b.
+        """
+        return self.below[self._index[a], self._index[b]]
+
+
+def _measures(weights, sums, par_factor):
+    """ Measures of the resamples given by the resamples x instances weights,
+        sums are the stacked instance arrays (see bootstrap_ranking).
+    """
+    solved, cost, penalties, num_runs = numpy.split(weights.dot(sums), 4, axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        par1 = numpy.where(num_runs > 0, (cost + penalties) / num_runs, 0.0)
+        par = numpy.where(num_runs > 0, (cost + par_factor * penalties) / num_runs, 0.0)
+    # rank by number of successful runs, ties by cumulated cost of the successful runs
+    keys = solved * (cost.max(axis=-1)[..., None] + 1.0) - cost
+    return solved, par1, par, keys
+
+
+def bootstrap_ranking(solver_config_ids, successful, successful_cost, penalty, runs, par_factor=10,
+                      resamples=1000, level=0.95, seed=0):
+    """ Bootstraps the ranking measures over the instances. The arguments
+        successful, successful_cost, penalty and runs are the instances x
+        solver configurations arrays returned by SweepRuns.instance_matrices.
+        Returns a BootstrapRanking with the percentile intervals of the
+        given level. The resamples are drawn from a RandomState with the
+        given seed, so the results are reproducible.
+    """
+    num_instances, num_solvers = successful.shape
+    random = numpy.random.RandomState(seed)
+    samples = dict((name, []) for name in ('solved', 'par1', 'par'))
+    below = numpy.zeros((num_solvers, num_solvers), dtype=numpy.int32)
+    sums = numpy.hstack((successful, successful_cost, penalty, runs))
+
+    for start in xrange(0, resamples if num_instances else 0, BATCH_SIZE):
+        batch = min(BATCH_SIZE, resamples - start)
+        drawn = random.randint(num_instances, size=(batch, num_instances))
+        drawn += numpy.arange(batch)[:, None] * num_instances
+        weights = numpy.bincount(drawn.ravel(), minlength=batch * num_instances) \
+            .reshape((batch, num_instances)).astype(float)
+        solved, par1, par, keys = _measures(weights, sums, par_factor)
+        # single precision halves the memory of the kept samples
+        samples['solved'].append(solved.astype(numpy.float32))
+        samples['par1'].append(par1.astype(numpy.float32))
+        samples['par'].append(par.astype(numpy.float32))
+        for key in keys:
+            numpy.add(below, key[:, None] < key[None, :], out=below)
+
+    intervals = dict()
+    tail = (1.0 - level) / 2.0 * 100
+    for name, values in samples.iteritems():
+        if values:
+            lower, upper = numpy.percentile(numpy.concatenate(values), [tail, 100 - tail], axis=0)
+        else:
+            lower = upper = numpy.zeros(num_solvers)
+        intervals[name] = (lower, upper)
+    return BootstrapRanking(list(solver_config_ids), intervals,
+                            below / float(max(1, resamples if num_instances else 0)))
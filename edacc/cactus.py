@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.cactus
+    ------------
+
+    Data of cactus plots. The runs of all solver configurations and instances
+    of a plot are fetched with a single query (get_cactus_runs) and the
+    series of the solver configurations and instance groups are computed from
+    the resulting arrays (CactusRuns.series) for all run modes.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import numpy
+from sqlalchemy.sql import select, and_, expression
+
+from edacc import selection
+
+# runs of penalized averages are penalized with PENALTY_FACTOR times their limit
+PENALTY_FACTOR = 10
+
+
+class CactusRuns(object):
+    """ Column arrays of runs. A run is successful if its status is 1 and
+        its result code starts with 1. `value` is the plotted result property
+        value (NaN if unknown) and `penalty` the value unsuccessful runs count
+        with in penalized averages.
+    """
+
+    def __init__(self, solver_config, instance, run, successful, value, penalty):
+        self.solver_config = numpy.asarray(solver_config, dtype=int)
+        self.instance = numpy.asarray(instance, dtype=int)
+        self.run = numpy.asarray(run, dtype=int)
+        self.successful = numpy.asarray(successful, dtype=bool)
+        self.value = numpy.asarray(value, dtype=float)
+        self.penalty = numpy.asarray(penalty, dtype=float)
+
+    def selection(self, solver_config_id, instance_ids):
+        return (self.solver_config == solver_config_id) & numpy.in1d(self.instance, list(instance_ids))
+
+    def num_solved(self, solver_config_id, instance_ids):
+        """ Number of successful runs of the solver configuration on the instances """
+        return int(numpy.count_nonzero(self.selection(solver_config_id, instance_ids) & self.successful))
+
+    def series(self, solver_config_id, instance_ids, run):
+        """ Returns the sorted values of the cactus plot series of the solver
+            configuration on the given instances and a list with the ID of the
+            instance of each value.
+            run can be 'all' (values of all successful runs), 'average' or
+            'median' (of the successful runs per instance), 'penalized_average'
+            (per instance, unsuccessful runs count as their penalty) or a run
+            number (values of the successful runs with this number).
+        """
+        selection = self.selection(solver_config_id, instance_ids)
+        solved = selection & self.successful & ~numpy.isnan(self.value)
+
+        if run == 'all':
+            values, instances = self.value[solved], self.instance[solved]
+        elif run in ('average', 'median'):
+            order = numpy.lexsort((self.value[solved], self.instance[solved]))
+            sorted_values = self.value[solved][order]
+            sorted_instances = self.instance[solved][order]
+            instances = numpy.unique(sorted_instances)
+            first = numpy.searchsorted(sorted_instances, instances)
+            counts = numpy.searchsorted(sorted_instances, instances, side='right') - first
+            if run == 'average':
+                values = numpy.add.reduceat(sorted_values, first) / counts if len(first) else sorted_values
+            else:
+                values = (sorted_values[first + (counts - 1) // 2] + sorted_values[first + counts // 2]) / 2.0
+        elif run == 'penalized_average':
+            counted = selection & (solved | ~self.successful)
+            contributions = numpy.where(self.successful[counted], self.value[counted], self.penalty[counted])
+            instances, inverse = numpy.unique(self.instance[counted], return_inverse=True)
+            values = numpy.bincount(inverse, weights=contributions, minlength=len(instances)) / \
+                     numpy.bincount(inverse, minlength=len(instances))
+        else:
+            numbered = solved & (self.run == int(run))
+            values, instances = self.value[numbered], self.instance[numbered]
+
+        order = numpy.lexsort((instances, values))
+        return values[order].tolist(), instances[order].tolist()
+
+
+def get_cactus_runs(db, experiment, solver_config_ids, instance_ids, result_property):
+    """ Fetches the runs of the solver configurations on the instances of the
+        experiment with a single query. result_property is 'resultTime',
+        'wallTime', 'cost' or the ID of a result property.
+    """
+    table = db.metadata.tables['ExperimentResults']
+    from_table = table
+    if result_property in ('resultTime', 'wallTime', 'cost'):
+        value_column = table.c[result_property]
+    else:
+        table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
+        table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
+        value_column = table_has_prop_value.c['value']
+        from_table = table.outerjoin(table_has_prop, and_(table_has_prop.c['idProperty'] == int(result_property),
+                                                          table_has_prop.c['idExperimentResults'] == table.c['idJob'])) \
+            .outerjoin(table_has_prop_value)
+
+    s = select([table.c['idJob'], table.c['SolverConfig_idSolverConfig'], table.c['Instances_idInstance'],
+                table.c['run'], table.c['status'], table.c['resultCode'], table.c['CPUTimeLimit'],
+                table.c['wallClockTimeLimit'], expression.label('value', value_column)],
+               selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                        solver_config_ids),
+               from_obj=from_table)
+
+    seen_jobs = set()
+    columns = ([], [], [], [], [], [])
+    for r in db.read_session().connection().execute(s):
+        # a job can have several values of a result property, use the first one
+        if r.idJob in seen_jobs: continue
+        seen_jobs.add(r.idJob)
+        try:
+            value = float(r.value) if r.value is not None else float('nan')
+        except ValueError:
+            value = float('nan')
+        if result_property == 'resultTime':
+            penalty = float('inf') if r.CPUTimeLimit == -1 else r.CPUTimeLimit * PENALTY_FACTOR
+        elif result_property == 'wallTime':
+            penalty = r.wallClockTimeLimit * PENALTY_FACTOR
+        else:
+            penalty = 0.0
+        for column, v in zip(columns, (r.SolverConfig_idSolverConfig, r.Instances_idInstance, r.run,
+                                       r.status == 1 and str(r.resultCode).startswith('1'), value, penalty)):
+            column.append(v)
+    return CactusRuns(*columns)
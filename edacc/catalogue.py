@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.catalogue
+    ---------------
+
+    Instance catalogues of experiments: ID, name, MD5 sum, class path and
+    property values of every instance of an experiment, read with a few
+    queries instead of loading the Instance objects with their properties
+    and walking the parent classes of each instance.
+
+    Catalogues are kept in memory per experiment. Every lookup compares
+    checksums of the rows the catalogue is built from (the experiment's
+    instances, their classes and property values and the instance classes)
+    and rebuilds the catalogue if any of them changed.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from sqlalchemy.sql import select
+
+from edacc import config, lru
+
+# (database name, experiment ID) -> (fingerprint, InstanceCatalogue)
+_catalogues = lru.LRUCache(lambda: config.INSTANCE_CATALOGUE_CACHE_SIZE)
+
+
+class CatalogueInstance(object):
+    """ Instance of a catalogue. Provides the attributes and methods of
+        Instance objects the analysis pages, forms and exports use.
+    """
+    __slots__ = ('idInstance', 'name', 'md5', 'class_path', 'property_values')
+
+    def __init__(self, idInstance, name, md5, class_path, property_values):
+        self.idInstance = idInstance
+        self.name = name
+        self.md5 = md5
+        self.class_path = class_path
+        self.property_values = property_values
+
+    def __str__(self):
+        return self.get_name()
+
+    def get_name(self):
+        """ Returns the name of the instance prefixed by its class path. """
+        return '/'.join(self.class_path + (self.name,))
+
+    def get_class_hierarchy(self):
+        return self.class_path
+
+    def get_property_value(self, property, db=None):
+        """ Returns the value of the property with the given ID. """
+        try:
+            return self.property_values.get(int(property))
+        except (TypeError, ValueError):
+            return None
+
+
+class InstanceCatalogue(object):
+    """ The instances of an experiment sorted by their full names.
+        `fingerprint` identifies the instance set and property values the
+        catalogue was built from (see get_catalogue).
+    """
+
+    def __init__(self, instances, fingerprint=None):
+        self._instances = tuple(sorted(instances, key=lambda i: i.get_name()))
+        self.by_id = dict((i.idInstance, i) for i in self._instances)
+        self.fingerprint = fingerprint
+
+    def get_instances(self):
+        """ Returns a new list of the instances sorted by their full names. """
+        return list(self._instances)
+
+    def get(self, instance_id):
+        return self.by_id.get(instance_id)
+
+    def __len__(self):
+        return len(self._instances)
+
+
+def _checksum(connection, *columns):
+    """ Returns an SQL expression of an order independent checksum of the
+        columns of the selected rows. Only MySQL has CRC32, the other
+        databases are read-only SQLite snapshots whose rows are only counted.
+    """
+    if connection.dialect.name != 'mysql': return func.count()
+    return func.sum(func.crc32(func.concat_ws('|', *columns)))
+
+
+def _fingerprint(db, experiment_id):
+    """ Returns a tuple of the number and checksum of the experiment's
+        instances, their property values and classes and of the instance
+        classes. It changes if any of the rows the catalogue is built from
+        is added, removed or updated.
+    """
+    t = db.metadata.tables['Experiment_has_Instances']
+    t_instances = db.metadata.tables['Instances']
+    t_properties = db.metadata.tables['Instance_has_Property']
+    t_instance_classes = db.metadata.tables['Instances_has_instanceClass']
+    t_classes = db.metadata.tables['instanceClass']
+    connection = db.read_session().connection()
+    experiment_instance_ids = select([t.c['Instances_idInstance']], t.c['Experiment_idExperiment'] == experiment_id)
+    statements = [
+        select([func.count(), _checksum(connection, t_instances.c['idInstance'], t_instances.c['name'],
+                                        t_instances.c['md5'])],
+               t_instances.c['idInstance'].in_(experiment_instance_ids), from_obj=t_instances),
+        select([func.count(), _checksum(connection, t_properties.c['idInstance'], t_properties.c['idProperty'],
+                                        t_properties.c['value'])],
+               t_properties.c['idInstance'].in_(experiment_instance_ids), from_obj=t_properties),
+        select([func.count(), _checksum(connection, t_instance_classes.c['Instances_idInstance'],
+                                        t_instance_classes.c['instanceClass_idinstanceClass'])],
+               t_instance_classes.c['Instances_idInstance'].in_(experiment_instance_ids), from_obj=t_instance_classes),
+        select([func.count(), _checksum(connection, t_classes.c['idinstanceClass'], t_classes.c['name'],
+                                        t_classes.c['parent'])], from_obj=t_classes)]
+    return tuple(value for s in statements for value in connection.execute(s).first())
+
+
+def _class_paths(db):
+    """ Returns a dictionary that maps instance class IDs to the tuple of the
+        class names from the root class down to the class.
+    """
+    t = db.metadata.tables['instanceClass']
+    classes = dict((r[0], (r[1], r[2])) for r in db.read_session().connection().execute(
+        select([t.c['idinstanceClass'], t.c['name'], t.c['parent']])))
+
+    def path(class_id):
+        names, seen = [], set()
+        # the seen set guards against cycles in the class hierarchy
+        while class_id in classes and class_id not in seen:
+            seen.add(class_id)
+            name, class_id = classes[class_id]
+            names.append(name)
+        return tuple(reversed(names))
+
+    return dict((class_id, path(class_id)) for class_id in classes)
+
+
+def build_catalogue(db, experiment_id):
+    """ Reads the catalogue of the experiment's instances from the database. """
+    t_instances = db.metadata.tables['Instances']
+    t_experiment_instances = db.metadata.tables['Experiment_has_Instances']
+    t_instance_classes = db.metadata.tables['Instances_has_instanceClass']
+    connection = db.read_session().connection()
+    experiment_instance_ids = select([t_experiment_instances.c['Instances_idInstance']],
+                                     t_experiment_instances.c['Experiment_idExperiment'] == experiment_id)
+
+    # like Instance.get_name, the first class of an instance determines its class path
+    class_paths = _class_paths(db)
+    path_by_instance = dict()
+    for instance_id, class_id in connection.execute(
+            select([t_instance_classes.c['Instances_idInstance'],
+                    t_instance_classes.c['instanceClass_idinstanceClass']],
+                   t_instance_classes.c['Instances_idInstance'].in_(experiment_instance_ids))):
+        path_by_instance.setdefault(instance_id, class_paths.get(class_id, ()))
+
+    property_values = dict()
+    for p in db.read_session().query(db.InstanceProperties).options(joinedload('property')) \
+            .filter(db.InstanceProperties.idInstance.in_(experiment_instance_ids)):
+        property_values.setdefault(p.idInstance, dict())[p.idProperty] = p.get_value()
+
+    s = select([t_instances.c['idInstance'], t_instances.c['name'], t_instances.c['md5']],
+               t_instances.c['idInstance'].in_(experiment_instance_ids))
+    return InstanceCatalogue(CatalogueInstance(r[0], r[1], r[2], path_by_instance.get(r[0], ()),
+                                               property_values.get(r[0], {})) for r in connection.execute(s))
+
+
+def get_catalogue(db, experiment_id):
+    """ Returns the instance catalogue of the experiment, rebuilt if the
+        experiment's instances changed since it was built.
+    """
+    key = (db.database, experiment_id)
+    fingerprint = _fingerprint(db, experiment_id)
+    cached = _catalogues.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    catalogue = build_catalogue(db, experiment_id)
+    catalogue.fingerprint = fingerprint
+    _catalogues.put(key, (fingerprint, catalogue))
+    return catalogue
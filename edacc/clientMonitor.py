@@ -11,7 +11,6 @@
 
 #test
 
-import pygame
 from math import *
 from sqlalchemy import text, func
 
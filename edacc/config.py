@@ -40,6 +40,96 @@ DATABASE_DRIVER = 'mysql'
 DATABASE_HOST = 'localhost'
 DATABASE_PORT = 3306
 
+# Connection pool settings used for each database. pool_size connections are
+# kept open, up to max_overflow additional connections are opened under load
+# (-1: unlimited) and requests wait at most pool_timeout seconds for a free
+# connection. Connections are reopened after pool_recycle seconds. With
+# pre_ping enabled, connections are tested before they are handed out.
+DATABASE_POOL = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 3600,
+    'pre_ping': True,
+}
+# Per-database changes of the pool settings, e.g.
+# {'db name': {'pool_size': 20, 'max_overflow': 20}}
+DATABASE_POOL_OVERRIDES = {}
+
+# Optional read replicas. Read-only analysis queries (result matrices, rankings,
+# CSV exports, progress tables and plot data) of the databases listed here are
+# sent to the replica as long as it lags at most max_lag seconds behind the
+# primary (None: no check). Everything else uses the primary database.
+# Format: {'db name': {'host': 'replica.host', 'port': 3306, 'max_lag': 60}},
+# username and password default to the ones of the primary database. A server
+# that isn't replicating has an unknown lag and is only used with max_lag None
+# or if its entry has 'not_replicating': True (e.g. a read-only copy that is
+# updated by other means).
+DATABASE_REPLICAS = {}
+# Seconds a measured replication lag is reused before it is measured again
+REPLICA_LAG_CHECK_INTERVAL = 10
+
+# Estimated memory in bytes the experiment result summaries (per experiment
+# and cost, see edacc/summary.py) of each process may use. The least recently
+# used summaries are dropped first.
+SUMMARY_CACHE_BYTES = 256 * 1024 * 1024
+# Number of experiment instance catalogues (see edacc/catalogue.py) each
+# process keeps in memory
+INSTANCE_CATALOGUE_CACHE_SIZE = 20
+# Number of parsed solver parameter graphs (see edacc/parameter_graph.py) each
+# process keeps in memory
+PARAMETER_GRAPH_CACHE_SIZE = 50
+
+# Point reduction before plots are rendered (can be changed per request with
+# the max_points and max_error arguments, 0 disables the reduction):
+# maximum number of points of scatter plots, extreme points and timeouts are
+# always drawn ...
+SCATTER_MAX_POINTS = 20000
+# ... and maximum deviation in pixels of the reduced cactus plot curves. The
+# curves are drawn as points, so they are only reduced in PNG plots of more
+# than CACTUS_MAX_POINTS points
+CACTUS_MAX_ERROR = 0.5
+CACTUS_MAX_POINTS = 5000
+
+# Render plots into a named pipe that is read in memory instead of writing
+# them to temporary files in TEMP_DIR (see plots.render)
+PLOT_RENDER_PIPE = True
+
+# Number of worker processes fitting the restarts of the borg explorer models
+# in parallel (0 or 1: fit them in the web server process). The workers are
+# forked from the web server process during the request, together with its
+# threads' state, database connections and the embedded R. This is unsafe in
+# threaded deployments (e.g. mod_wsgi with threads), only use more than one
+# process with single-threaded server processes.
+BORG_FIT_PROCESSES = 1
+
+# Selections of more instances or solver configurations than this are not
+# passed to the database as IN lists but loaded into temporary tables
+# (see edacc/selection.py), at most SELECTION_TABLES_PER_CONNECTION of them
+# are kept per database connection
+SELECTION_IN_LIST_LIMIT = 1000
+SELECTION_TABLES_PER_CONNECTION = 8
+SELECTION_INSERT_BATCH_SIZE = 5000
+# Directory stored selections are kept in, plot and download links pass
+# selections of more than SELECTION_URL_MAX_IDS IDs as stored selection, the
+# last SELECTION_CACHE_SIZE used selections are kept in memory. Links with
+# stored selections only work as long as the files exist, so this should be a
+# persistent directory (not inside TEMP_DIR)
+SELECTION_DIR = '/srv/edacc_web/selections'
+SELECTION_URL_MAX_IDS = 200
+SELECTION_CACHE_SIZE = 100
+# Stored selections can contain at most SELECTION_MAX_IDS IDs. Selections
+# that weren't used for SELECTION_MAX_AGE seconds and the least recently used
+# ones beyond SELECTION_MAX_FILES per database are deleted
+SELECTION_MAX_IDS = 200000
+SELECTION_MAX_AGE = 180 * 24 * 60 * 60
+SELECTION_MAX_FILES = 20000
+
+# Number of bootstrap resamples of the instances used for the confidence
+# intervals on the ranking page (0 disables them) and the seed they are drawn with
+RANKING_BOOTSTRAP_RESAMPLES = 1000
+RANKING_BOOTSTRAP_SEED = 0
+
 # Used to log into the admin interface
 ADMIN_PASSWORD = 'affe42'
 
@@ -64,6 +154,11 @@ DEFAULT_DATABASES = (
     ('username', 'password', 'db name', 'db label', False),
 )
 
+# List of experiment snapshots (SQLite files created by scripts/export_snapshot.py)
+# this server serves read-only at startup
+# Format: Tuples of snapshot filename, database name (used in the URLs), label, hidden
+DEFAULT_SNAPSHOTS = ()
+
 hidden_experiments = dict()
 
 # override config with local config, if present
@@ -141,8 +141,9 @@ class config_vis(object):
             parameterName = dict((p.idParameter, p.name)
                                  for p in db.session.query(db.Parameter).
             filter(db.Parameter.idParameter.in_(configurable)).distinct())
+            graph = experiment.configuration_scenario.get_parameter_graph()
             for id in parameterName.keys():
-                parameterDomain[id] = experiment.configuration_scenario.get_parameter_domain(parameterName[id])
+                parameterDomain[id] = graph.get_domain(parameterName[id]) if graph is not None else None
 
             paramInstance = db.session.query(db.ParameterInstance).filter(
                 db.ParameterInstance.SolverConfig_idSolverConfig.in_(choosenConfigs)).all()
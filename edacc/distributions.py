@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.distributions
+    -------------------
+
+    Estimators of result property distributions that are evaluated with
+    NumPy: empirical CDFs, histograms and Gaussian kernel density estimates.
+    The plot functions only receive the evaluated curves instead of all
+    values, which matters for solvers with a lot of runs.
+
+    The kernel density estimate bins the values linearly onto an equally
+    spaced grid and convolves the bin weights with the Gaussian kernel by
+    FFT, like R's density() with its default bandwidth (bw.nrd0).
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import math
+
+import numpy
+
+# maximum number of points of an ECDF curve, ECDFs of more distinct values
+# are evaluated on an equally spaced (log-spaced on log scales) grid
+ECDF_MAX_POINTS = 1000
+# number of grid points of kernel density estimates
+KDE_GRID_SIZE = 512
+
+
+def _grid(low, high, size, log):
+    if log and low > 0:
+        return numpy.logspace(math.log10(low), math.log10(high), size)
+    return numpy.linspace(low, high, size)
+
+
+def ecdf(values, max_points=ECDF_MAX_POINTS, log=False):
+    """ Returns the empirical CDF of the values as tuple (xs, ps) of arrays,
+        ps[i] = P(X <= xs[i]). xs are the distinct values or, if there are
+        more than max_points of them, max_points grid points between the
+        smallest and largest value (log-spaced if log is True and all values
+        are positive).
+    """
+    values = numpy.sort(numpy.asarray(values, dtype=float))
+    if not len(values):
+        return numpy.zeros(0), numpy.zeros(0)
+    xs = numpy.unique(values)
+    if max_points is None or len(xs) <= max_points:
+        return xs, numpy.searchsorted(values, xs, side='right') / float(len(values))
+    xs = _grid(values[0], values[-1], max_points, log)
+    xs[0], xs[-1] = values[0], values[-1]
+    return xs, numpy.searchsorted(values, xs, side='right') / float(len(values))
+
+
+def histogram(values, bins=None, log=False):
+    """ Returns the histogram of the values as tuple (bin edges, densities),
+        the densities integrate to 1. The number of bins defaults to
+        Sturges' rule like R's hist(), on log scales the bins are log-spaced.
+    """
+    values = numpy.asarray(values, dtype=float)
+    if not len(values):
+        return numpy.zeros(0), numpy.zeros(0)
+    if bins is None:
+        bins = int(math.ceil(math.log(len(values), 2) + 1))
+    low, high = values.min(), values.max()
+    if high <= low: high = low + 1
+    edges = _grid(low, high, bins + 1, log)
+    counts, edges = numpy.histogram(values, edges)
+    return edges, counts / (float(len(values)) * numpy.diff(edges))
+
+
+def bandwidth(values):
+    """ Silverman's rule of thumb bandwidth (R's bw.nrd0) """
+    values = numpy.asarray(values, dtype=float)
+    if len(values) < 2:
+        return abs(values[0]) if len(values) and values[0] != 0 else 1.0
+    sd = values.std(ddof=1)
+    q75, q25 = numpy.percentile(values, [75, 25])
+    low = min(sd, (q75 - q25) / 1.34) or sd or abs(values[0]) or 1.0
+    return 0.9 * low * len(values) ** -0.2
+
+
+def gaussian_kde(values, bw=None, grid_size=KDE_GRID_SIZE, cut=3):
+    """ Gaussian kernel density estimate of the values. Returns the tuple
+        (xs, densities) of arrays of the estimate on grid_size equally
+        spaced points from min - cut * bw to max + cut * bw.
+    """
+    values = numpy.asarray(values, dtype=float)
+    if not len(values):
+        return numpy.zeros(0), numpy.zeros(0)
+    if bw is None: bw = bandwidth(values)
+    low, high = values.min() - cut * bw, values.max() + cut * bw
+    xs = numpy.linspace(low, high, grid_size)
+    delta = (high - low) / (grid_size - 1)
+
+    # linear binning: each value is split between its two grid neighbours
+    position = (values - low) / delta
+    left = numpy.clip(numpy.floor(position).astype(int), 0, grid_size - 2)
+    right_weight = position - left
+    weights = numpy.bincount(left, weights=1 - right_weight, minlength=grid_size) + \
+              numpy.bincount(left + 1, weights=right_weight, minlength=grid_size)
+
+    # linear convolution with the kernel at all grid offsets via zero-padded FFT
+    offsets = numpy.arange(-(grid_size - 1), grid_size) * delta
+    kernel = numpy.exp(-0.5 * (offsets / bw) ** 2) / (bw * math.sqrt(2 * math.pi))
+    size = 1 << int(math.ceil(math.log(3 * grid_size - 2, 2)))
+    convolution = numpy.fft.irfft(numpy.fft.rfft(weights, size) * numpy.fft.rfft(kernel, size), size)
+    densities = convolution[grid_size - 1:2 * grid_size - 1] / len(values)
+    return xs, numpy.maximum(densities, 0.0)
+
+
+def log_gaussian_kde(values, grid_size=KDE_GRID_SIZE, cut=3):
+    """ Kernel density estimate of the log10 of the positive values for log
+        scaled plots. Returns (xs, densities) with xs on the original scale
+        and the densities per log10 unit.
+    """
+    values = numpy.asarray(values, dtype=float)
+    xs, densities = gaussian_kde(numpy.log10(values[values > 0]), grid_size=grid_size, cut=cut)
+    return 10 ** xs, densities
+
+
+def restart_strategy(values):
+    """ Returns the tuple (t_rs, mean with restarts, mean) for the values
+        (runtimes) where t_rs is the restart time that minimizes the
+        expected runtime with restarts t_i * n / i, or None if there are no
+        values.
+    """
+    values = numpy.sort(numpy.asarray(values, dtype=float))
+    if not len(values):
+        return None
+    means = values * len(values) / numpy.arange(1, len(values) + 1, dtype=float)
+    best = int(numpy.argmin(means))
+    return float(values[best]), float(means[best]), float(values.mean())
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.downsampling
+    ------------------
+
+    Reduction of the number of points of scatter and cactus plots before
+    they are rendered, so that plots of millions of runs can be rendered in
+    bounded time and memory.
+
+    Scatter plots are reduced by density-preserving binning: the plot area is
+    divided into a grid and every occupied grid cell keeps at least one of its
+    points, the remaining points are distributed proportionally to the number
+    of points in the cells. Cactus curves are reduced by the Ramer-Douglas-
+    Peucker algorithm, the reduced polyline deviates at most a given number of
+    pixels from the original one. In both cases the extreme points and the
+    points at or above a given limit (e.g. timeouts) are always kept.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import math
+
+import numpy
+
+
+def _plot_coordinates(values, log):
+    """ Returns the values as float array, log10 transformed for log scales.
+        Non-positive values can't be shown on log scales and are mapped to
+        the smallest positive value.
+    """
+    values = numpy.asarray(values, dtype=float)
+    if log and len(values):
+        positive = values[values > 0]
+        values = numpy.log10(numpy.maximum(values, positive.min() if len(positive) else 1.0))
+    return values
+
+
+def _extremes(*arrays):
+    indexes = set()
+    for a in arrays:
+        if len(a):
+            indexes.update((int(numpy.argmin(a)), int(numpy.argmax(a))))
+    return list(indexes)
+
+
+def scatter_mask(xs, ys, max_points, log_x=False, log_y=False, x_limit=None, y_limit=None, seed=0):
+    """ Returns a boolean array that selects at most about `max_points` of the
+        points (xs[i], ys[i]). The points with minimal and maximal coordinates
+        and the points with x >= x_limit or y >= y_limit are always selected,
+        even if this exceeds max_points. The selection is deterministic for a
+        given seed. max_points <= 0 selects all points.
+    """
+    n = len(xs)
+    if max_points <= 0 or n <= max_points:
+        return numpy.ones(n, dtype=bool)
+
+    x = _plot_coordinates(xs, log_x)
+    y = _plot_coordinates(ys, log_y)
+    keep = numpy.zeros(n, dtype=bool)
+    keep[_extremes(x, y)] = True
+    if x_limit is not None: keep |= numpy.asarray(xs, dtype=float) >= x_limit
+    if y_limit is not None: keep |= numpy.asarray(ys, dtype=float) >= y_limit
+
+    budget = max_points - keep.sum()
+    rest = numpy.flatnonzero(~keep)
+    if budget <= 0 or len(rest) == 0:
+        return keep
+
+    # grid with at most `budget` cells, every occupied cell keeps a point
+    bins = max(1, int(math.sqrt(budget)))
+
+    def cell_coordinate(v):
+        low, high = v.min(), v.max()
+        if high <= low: return numpy.zeros(len(v), dtype=int)
+        return numpy.minimum(((v - low) / (high - low) * bins).astype(int), bins - 1)
+
+    cells = cell_coordinate(x[rest]) * bins + cell_coordinate(y[rest])
+    # random order within the cells, then the first `quota` points of each cell
+    order = numpy.lexsort((numpy.random.RandomState(seed).random_sample(len(rest)), cells))
+    sorted_cells = cells[order]
+    occupied = numpy.unique(sorted_cells)
+    first = numpy.searchsorted(sorted_cells, occupied)
+    counts = numpy.searchsorted(sorted_cells, occupied, side='right') - first
+    if budget > len(occupied):
+        quota = 1 + ((counts - 1) * (budget - len(occupied)) // max(1, len(rest) - len(occupied)))
+    else:
+        quota = numpy.ones(len(occupied), dtype=int)
+    cell_index = numpy.searchsorted(occupied, sorted_cells)
+    rank = numpy.arange(len(rest)) - first[cell_index]
+    keep[rest[order[rank < quota[cell_index]]]] = True
+    return keep
+
+
+def downsample_scatter(points, max_points, log_x=False, log_y=False, x_limit=None, y_limit=None):
+    """ Downsamples the points [[(x, y, ...), ...], ...] of the instance
+        groups of a scatter plot, see scatter_mask. The groups share the
+        max_points budget proportionally to their number of points.
+    """
+    total = sum(len(ig) for ig in points)
+    if max_points <= 0 or total <= max_points:
+        return points
+    result = []
+    for ig in points:
+        group_max_points = max(1, int(max_points * len(ig) / float(total)))
+        mask = scatter_mask([p[0] for p in ig], [p[1] for p in ig], group_max_points, log_x, log_y,
+                            x_limit, y_limit)
+        result.append([p for p, k in zip(ig, mask) if k])
+    return result
+
+
+def polyline_mask(xs, ys, max_error, x_range, y_range, width, height, log_x=False, log_y=False, y_limit=None):
+    """ Returns a boolean array selecting the points of the polyline
+        (xs[i], ys[i]) that are needed to draw it with at most `max_error`
+        pixels deviation (Ramer-Douglas-Peucker). x_range and y_range are the
+        (min, max) values of the axes which are `width` and `height` pixels
+        long. The first, last and extreme points and points with
+        y >= y_limit are always selected. max_error <= 0 selects all points.
+    """
+    n = len(xs)
+    keep = numpy.zeros(n, dtype=bool)
+    if max_error <= 0 or n <= 2:
+        keep[:] = True
+        return keep
+
+    def pixels(values, value_range, log, length):
+        low, high = _plot_coordinates(value_range, log)
+        v = _plot_coordinates(values, log)
+        if high <= low: return numpy.zeros(len(v))
+        return (v - low) / (high - low) * length
+
+    px = pixels(xs, x_range, log_x, width)
+    py = pixels(ys, y_range, log_y, height)
+
+    keep[[0, n - 1]] = True
+    keep[_extremes(px, py)] = True
+    if y_limit is not None: keep |= numpy.asarray(ys, dtype=float) >= y_limit
+
+    # the polyline is drawn through all selected points, so each section
+    # between two points that are always selected is reduced on its own
+    fixed = numpy.flatnonzero(keep)
+    stack = zip(fixed[:-1], fixed[1:])
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2: continue
+        dx, dy = px[end] - px[start], py[end] - py[start]
+        length = math.hypot(dx, dy)
+        ix, iy = px[start + 1:end] - px[start], py[start + 1:end] - py[start]
+        if length == 0:
+            distances = numpy.hypot(ix, iy)
+        else:
+            distances = numpy.abs(dx * iy - dy * ix) / length
+        i = int(numpy.argmax(distances))
+        if distances[i] > max_error:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
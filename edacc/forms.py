@@ -274,6 +274,13 @@ class ProbabilisticDominationForm(Form):
     i = QuerySelectMultipleField('Instances', get_pk=lambda i: i.idInstance, allow_blank=True)
 
 
+class ProbabilisticDominationMatrixForm(Form):
+    result_property = SelectField('Property')
+    sc = QuerySelectMultipleField('Solver Configurations', get_label=lambda sc: truncate_name(sc.name, MAX_SC_LEN))
+    instance_filter = TextField('Filter Instances')
+    i = QuerySelectMultipleField('Instances', get_pk=lambda i: i.idInstance, allow_blank=True)
+
+
 class BoxPlotForm(Form):
     solver_configs = QuerySelectMultipleField('Solver Configurations',
                                               get_label=lambda sc: truncate_name(sc.name, MAX_SC_LEN))
@@ -303,6 +310,8 @@ class RankingForm(Form):
     property_limit = FloatField("Property limit (for result properties)", default=1.0,
                                 validators=[validators.required()])
     show_top = IntegerField("Maximum number of configurations displayed", default=1000)
+    sweep_cutoffs = TextField('Cutoffs (comma separated)')
+    sweep_par_factors = TextField('Penalty factors (comma separated)', default='1, 10')
 
 
 class SOTAForm(Form):
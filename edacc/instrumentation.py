@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.instrumentation
+    ---------------------
+
+    Process-wide timings and counters that help finding out where the web
+    frontend spends its time and memory, e.g. how long the lazily loaded
+    R, scipy and pygame backends took to initialize or how long requests
+    had to wait for a connection of a database connection pool.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import logging
+import time
+from threading import RLock
+
+logger = logging.getLogger('edacc.instrumentation')
+
+_lock = RLock()
+_backends = {}
+
+# backend name -> seconds it took to load the backend
+backend_load_times = {}
+
+# database name -> PoolStatistics of the database's connection pool
+pool_statistics = {}
+
+
+def load_backend(name, loader):
+    """ Returns the result of calling `loader`. The loader function is only
+        called the first time a backend with the given name is requested,
+        its result is kept for the lifetime of the process. The time it
+        took to load is recorded in `backend_load_times` and logged.
+    """
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+
+    with _lock:
+        if name not in _backends:
+            start = time.time()
+            _backends[name] = loader()
+            backend_load_times[name] = time.time() - start
+            logger.info('Loaded backend %s in %.3f s' % (name, backend_load_times[name]))
+    return _backends[name]
+
+
+def is_loaded(name):
+    """ Returns true if the backend with the given name was loaded already """
+    return name in _backends
+
+
+class PoolStatistics(object):
+    """ Checkout statistics of a connection pool. `capacity` is the
+        maximum number of connections the pool hands out at the same time
+        (pool size + max. overflow) or None if it is unbounded.
+    """
+
+    def __init__(self, database, pool_size, max_overflow):
+        self.database = database
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        if max_overflow is None or max_overflow < 0:
+            self.capacity = None
+        else:
+            self.capacity = pool_size + max_overflow
+        self.lock = RLock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.checked_out = 0
+        self.max_checked_out = 0
+
+    def record_wait(self, wait):
+        """ Record a successful checkout that took `wait` seconds. """
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_checkout(self):
+        """ Record that a connection was handed out by the pool. """
+        with self.lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def record_checkin(self):
+        """ Record that a connection was returned to the pool. """
+        with self.lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def record_timeout(self, wait):
+        """ Record a checkout that failed after waiting `wait` seconds
+            because all connections of the pool were in use.
+        """
+        with self.lock:
+            self.timeouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        logger.warning('Connection pool of database %s exhausted, gave up after %.3f s' % (self.database, wait))
+
+    def saturation(self, checked_out):
+        """ Fraction of the pool capacity used by `checked_out` connections.
+            Unbounded pools are measured against their pool size.
+        """
+        capacity = self.capacity or self.pool_size
+        if not capacity: return 0.0
+        return checked_out / float(capacity)
+
+    def as_dict(self):
+        with self.lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'database': self.database,
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait': self.total_wait / attempts if attempts else 0.0,
+                'max_wait': self.max_wait,
+                'checked_out': self.checked_out,
+                'saturation': self.saturation(self.checked_out),
+                'max_saturation': self.saturation(self.max_checked_out),
+            }
+
+
+def register_pool(database, pool_size, max_overflow):
+    """ Creates and returns a new PoolStatistics instance for the
+        connection pool of the given database.
+    """
+    with _lock:
+        pool_statistics[database] = PoolStatistics(database, pool_size, max_overflow)
+        return pool_statistics[database]
+
+
+def unregister_pool(database):
+    with _lock:
+        pool_statistics.pop(database, None)
+
+
+def get_statistics():
+    """ Returns a dictionary with the collected instrumentation data """
+    return {
+        'backend_load_times': dict(backend_load_times),
+        'pools': dict((name, stats.as_dict()) for name, stats in pool_statistics.items()),
+    }
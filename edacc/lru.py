@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.lru
+    ---------
+
+    Thread-safe least recently used caches for the per-process caches of
+    experiment summaries, instance catalogues, parameter graphs and
+    selections. Their keys are tuples starting with the database name so
+    the entries of a database can be dropped when it is removed.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+from itertools import count
+from threading import RLock
+
+# caches whose keys start with the database name, see drop_database
+_caches = []
+
+
+class LRUCache(object):
+    """ Dictionary that keeps the most recently used entries. The total size
+        of the entries is limited to max_size(), a function so changes of
+        the configuration apply immediately. The size of an entry is
+        size(value) if a size function is given and 1 otherwise.
+        If by_database is true the keys are tuples starting with the
+        database name and drop_database drops the database's entries.
+    """
+
+    def __init__(self, max_size, size=None, by_database=True):
+        self.max_size = max_size
+        self.size = size
+        self.lock = RLock()
+        # key -> [last use, value, size]
+        self._entries = dict()
+        self._total_size = 0
+        self._clock = count()
+        if by_database: _caches.append(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """ Returns the value of the key and marks it as recently used. """
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None: return default
+            entry[0] = self._clock.next()
+            return entry[1]
+
+    def put(self, key, value):
+        """ Stores the value and drops the least recently used entries
+            while the cache is too large, except the new one. Returns the
+            list of dropped (key, value) pairs.
+        """
+        with self.lock:
+            self._remove(key)
+            size = self.size(value) if self.size is not None else 1
+            self._entries[key] = [self._clock.next(), value, size]
+            self._total_size += size
+            dropped = []
+            if self._total_size > self.max_size():
+                # least recently used first
+                for last_use, old_key in sorted((e[0], k) for k, e in self._entries.iteritems() if k != key):
+                    if self._total_size <= self.max_size(): break
+                    dropped.append((old_key, self._remove(old_key)))
+            return dropped
+
+    def resize(self, key):
+        """ Updates the size of the key's entry after its value changed and
+            drops least recently used entries if the cache got too large.
+        """
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None: return self.put(key, entry[1])
+            return []
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self._entries: return default
+            return self._remove(key)
+
+    def drop_database(self, database):
+        """ Drops the entries of the database. """
+        with self.lock:
+            for key in [key for key in self._entries if key[0] == database]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._total_size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None: return None
+        self._total_size -= entry[2]
+        return entry[1]
+
+
+def drop_database(database):
+    """ Drops the entries of the database from all caches. """
+    for cache in _caches:
+        cache.drop_database(database)
@@ -11,37 +11,160 @@
     :license: MIT, see LICENSE for details.
 """
 
+import os
+import time
+import threading
 from collections import namedtuple
-from lxml import etree
-from cStringIO import StringIO
 
 import sqlalchemy
 from sqlalchemy import create_engine, MetaData, func
 from sqlalchemy.engine.url import URL
+from sqlalchemy.exc import DisconnectionError, TimeoutError
+from sqlalchemy.interfaces import PoolListener
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import mapper, sessionmaker, scoped_session, deferred
 from sqlalchemy.orm import relation, relationship, joinedload_all, backref
-from sqlalchemy.sql import and_, not_, select, label, expression, literal
+from sqlalchemy.sql import and_, select, label, expression, literal
 from sqlalchemy import schema
 
-from edacc import config, utils
+from edacc import config, utils, instrumentation, summary, selection, catalogue, parameter_graph, lru
 from edacc.constants import *
 
 
+def get_pool_settings(database):
+    """ Returns the connection pool settings of the given database, i.e.
+        config.DATABASE_POOL updated with the database's entry in
+        config.DATABASE_POOL_OVERRIDES.
+    """
+    settings = dict(config.DATABASE_POOL)
+    settings.update(config.DATABASE_POOL_OVERRIDES.get(database, {}))
+    return settings
+
+
+class InstrumentedQueuePool(QueuePool):
+    """ QueuePool recording how long each checkout had to wait for a free
+        connection. EDACCDatabase derives one subclass per database with the
+        statistics class attribute set, this way the statistics survive the
+        pool being recreated by SQLAlchemy.
+    """
+    statistics = None
+
+    def _timed(self, checkout):
+        start = time.time()
+        try:
+            connection = checkout()
+        except TimeoutError:
+            self.statistics.record_timeout(time.time() - start)
+            raise
+        self.statistics.record_wait(time.time() - start)
+        return connection
+
+    def connect(self):
+        return self._timed(lambda: QueuePool.connect(self))
+
+    def unique_connection(self):
+        return self._timed(lambda: QueuePool.unique_connection(self))
+
+
+class PoolStatisticsListener(PoolListener):
+    """ Keeps track of the number of checked out connections of a pool and,
+        if `pre_ping` is set, tests connections before they are handed out.
+        Connections that were closed by the server are replaced by the pool
+        instead of failing the request.
+    """
+
+    def __init__(self, statistics, pre_ping):
+        self.statistics = statistics
+        self.pre_ping = pre_ping
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        if self.pre_ping:
+            try:
+                cursor = dbapi_con.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            except Exception:
+                # makes the pool discard the connection and try another one
+                raise DisconnectionError()
+        self.statistics.record_checkout()
+
+    def checkin(self, dbapi_con, con_record):
+        self.statistics.record_checkin()
+
+
+def create_pooled_engine(url, database, pool_name):
+    """ Creates an engine for the given URL using the pool settings of
+        `database`. The pool's statistics are registered under `pool_name`.
+        Returns the tuple (engine, pool statistics).
+    """
+    pool_settings = get_pool_settings(database)
+    statistics = instrumentation.register_pool(pool_name, pool_settings['pool_size'],
+                                               pool_settings['max_overflow'])
+    poolclass = type('InstrumentedQueuePool_' + str(pool_name), (InstrumentedQueuePool,),
+                     {'statistics': statistics})
+    engine = create_engine(url, convert_unicode=True, poolclass=poolclass,
+                           pool_size=pool_settings['pool_size'],
+                           max_overflow=pool_settings['max_overflow'],
+                           pool_timeout=pool_settings['pool_timeout'],
+                           pool_recycle=pool_settings['pool_recycle'],
+                           listeners=[PoolStatisticsListener(statistics, pool_settings['pre_ping'])])
+    return engine, statistics
+
+
+class ReadOnlyListener(PoolListener):
+    """ Makes SQLite connections refuse any write, used for snapshots. """
+
+    def connect(self, dbapi_con, con_record):
+        dbapi_con.execute("PRAGMA query_only = ON")
+
+
 class EDACCDatabase(object):
-    """ Encapsulates a single EDACC database connection. """
+    """ Encapsulates a single EDACC database connection.
+
+        If a read replica of the database is configured in
+        config.DATABASE_REPLICAS, read-only analysis queries can be sent to it
+        by using the session returned by `read_session()`. Everything that
+        writes has to use `session`, which is always bound to the primary.
+
+        If `snapshot` is the filename of an experiment snapshot (see
+        edacc.snapshot) the database is served read-only from that SQLite
+        file instead of the MySQL server.
+    """
 
-    def __init__(self, username, password, database, label, hidden=False):
+    def __init__(self, username, password, database, label, hidden=False, snapshot=None):
         self.database = database
         self.username = username
         self.password = password
         self.label = label
         self.hidden = hidden
+        self.snapshot = snapshot
+        self.read_only = snapshot is not None
 
-        url = URL(drivername=config.DATABASE_DRIVER, username=username,
-                  password=password, host=config.DATABASE_HOST,
-                  port=config.DATABASE_PORT, database=database,
-                  query={'charset': 'utf8', 'use_unicode': 0})
-        self.engine = create_engine(url, convert_unicode=True, pool_recycle=3600)
+        if snapshot is not None:
+            self.engine = create_engine('sqlite:///' + os.path.abspath(snapshot), convert_unicode=True,
+                                        listeners=[ReadOnlyListener()])
+            self.pool_statistics = None
+        else:
+            url = URL(drivername=config.DATABASE_DRIVER, username=username,
+                      password=password, host=config.DATABASE_HOST,
+                      port=config.DATABASE_PORT, database=database,
+                      query={'charset': 'utf8', 'use_unicode': 0})
+            self.engine, self.pool_statistics = create_pooled_engine(url, database, database)
+
+        self.replica = config.DATABASE_REPLICAS.get(database) if snapshot is None else None
+        self.replica_engine = None
+        if self.replica is not None:
+            replica_url = URL(drivername=config.DATABASE_DRIVER,
+                              username=self.replica.get('username', username),
+                              password=self.replica.get('password', password),
+                              host=self.replica.get('host', config.DATABASE_HOST),
+                              port=self.replica.get('port', config.DATABASE_PORT), database=database,
+                              query={'charset': 'utf8', 'use_unicode': 0})
+            self.replica_engine, self.replica_pool_statistics = \
+                create_pooled_engine(replica_url, database, database + ' (replica)')
+        self._replica_lag = None
+        self._replica_lag_checked = None
+        self._read_sessions = threading.local()
         self.metadata = metadata = MetaData(bind=self.engine)
 
         class Solver(object):
@@ -189,9 +312,9 @@ class EDACCDatabase(object):
                 instance_ids = [i.idInstance for i in instances]
                 successful_runs = db.session.query(db.ExperimentResult.SolverConfig_idSolverConfig,
                                                    db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like("1%")) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-                    .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
+                    .filter(selection.results_filter(db, db.session, self.idExperiment, instance_ids,
+                                                     solver_config_ids)) \
+                    .filter(db.ExperimentResult.resultCode.like("1%")) \
                     .filter_by(status=1).all()
                 solved_instances = dict((sc.idSolverConfig, set()) for sc in solver_configs)
                 for run in successful_runs:
@@ -210,9 +333,9 @@ class EDACCDatabase(object):
                 instance_ids = [i.idInstance for i in instances]
                 successful_runs = db.session.query(db.ExperimentResult.SolverConfig_idSolverConfig,
                                                    db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like("1%")) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-                    .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
+                    .filter(selection.results_filter(db, db.session, self.idExperiment, instance_ids,
+                                                     solver_config_ids)) \
+                    .filter(db.ExperimentResult.resultCode.like("1%")) \
                     .filter_by(status=1).all()
                 solved_instances = dict((sc.idSolverConfig, set()) for sc in solver_configs)
                 for run in successful_runs:
@@ -241,9 +364,9 @@ class EDACCDatabase(object):
                 instance_ids = [i.idInstance for i in instances]
                 successful_runs = db.session.query(db.ExperimentResult.SolverConfig_idSolverConfig,
                                                    db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like("1%")) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-                    .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
+                    .filter(selection.results_filter(db, db.session, self.idExperiment, instance_ids,
+                                                     solver_config_ids)) \
+                    .filter(db.ExperimentResult.resultCode.like("1%")) \
                     .filter_by(status=1).all()
                 solved_instances = dict((sc.idSolverConfig, set()) for sc in solver_configs)
                 for run in successful_runs:
@@ -266,49 +389,76 @@ class EDACCDatabase(object):
                 if res is None or res[0] is None: return 0
                 return res[0] + 1
 
-            def get_solved_instances(self, db):
+            def get_instance_solution_status(self, db):
+                """ Classifies the instances of the experiment with a single
+                grouped query. Returns a dictionary with the keys 'fully_solved'
+                (all runs successful), 'partially_solved' and 'unsolved' (no
+                successful run) that map to dictionaries
+                instance id -> (number of successful runs, number of runs).
+                """
+                t_results = db.metadata.tables['ExperimentResults']
+                t_experiment_instances = db.metadata.tables['Experiment_has_Instances']
+                successful = expression.case([(and_(t_results.c['status'] == 1,
+                                                    t_results.c['resultCode'].like('1%')), 1)], else_=0)
+                s = select([t_experiment_instances.c['Instances_idInstance'],
+                            func.coalesce(func.sum(successful), 0), func.count(t_results.c['idJob'])],
+                           t_experiment_instances.c['Experiment_idExperiment'] == self.idExperiment,
+                           from_obj=t_experiment_instances.outerjoin(t_results, and_(
+                               t_results.c['Experiment_idExperiment'] == self.idExperiment,
+                               t_results.c['Instances_idInstance'] ==
+                               t_experiment_instances.c['Instances_idInstance']))) \
+                    .group_by(t_experiment_instances.c['Instances_idInstance'])
+
+                status = {'fully_solved': dict(), 'partially_solved': dict(), 'unsolved': dict()}
+                for instance_id, num_successful, num_runs in db.session.connection().execute(s):
+                    num_successful, num_runs = int(num_successful), int(num_runs)
+                    if num_successful == 0:
+                        status['unsolved'][instance_id] = (num_successful, num_runs)
+                    elif num_successful == num_runs:
+                        status['fully_solved'][instance_id] = (num_successful, num_runs)
+                    else:
+                        status['partially_solved'][instance_id] = (num_successful, num_runs)
+                return status
+
+            def _get_instances_by_id(self, db, instance_ids):
+                # filter the cached instance catalogue instead of querying the instances by a long ID list
+                instance_ids = set(instance_ids)
+                if not instance_ids: return []
+                return [i for i in self.get_instance_catalogue(db).get_instances() if i.idInstance in instance_ids]
+
+            def get_solved_instances(self, db, status=None):
                 """ Returns the instances of the experiment that any solver
-                solved in any of its runs
+                solved in any of its runs. status is the result of
+                get_instance_solution_status, it is queried if not given.
                 """
-                instance_ids = [i[0] for i in db.session.query(db.ExperimentResult.Instances_idInstance) \
-                    .filter_by(experiment=self).filter(db.ExperimentResult.resultCode.like('1%')) \
-                    .filter_by(status=1).distinct().all()]
-                return db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+                status = status or self.get_instance_solution_status(db)
+                return self._get_instances_by_id(db, status['fully_solved'].keys() +
+                                                     status['partially_solved'].keys())
 
-            def get_fully_solved_instances(self, db):
+            def get_fully_solved_instances(self, db, status=None):
                 """ Returns the instances of the experiment that all solvers
                 solved in all of their runs
                 """
-                numInstances = db.session.query(db.Instance).options(joinedload_all('properties')) \
-                    .filter(db.Instance.experiments.contains(self)).distinct().count()
-                if numInstances == 0: return 0
-                num_jobs_per_instance = db.session.query(db.ExperimentResult) \
-                                            .filter_by(experiment=self).count() / numInstances
-                instances = []
-                for i in self.instances:
-                    if db.session.query(db.ExperimentResult) \
-                        .filter(db.ExperimentResult.resultCode.like('1%')) \
-                        .filter_by(experiment=self, instance=i, status=1) \
-                        .count() == num_jobs_per_instance:
-                        instances.append(i)
-                return instances
-
-            def get_unsolved_instances(self, db):
-                t_results = db.metadata.tables['ExperimentResults']
-                s = select([t_results.c['Instances_idInstance']],
-                           and_(t_results.c['Experiment_idExperiment'] == self.idExperiment,
-                                t_results.c['resultCode'].like('1%'),
-                                t_results.c['status'] == 1),
-                           from_obj=t_results).distinct()
-                ids = db.session.connection().execute(s).fetchall()
-                return db.session.query(db.Instance).options(joinedload_all('properties')).filter(
-                    db.Instance.experiments.contains(self)).filter(
-                    not_(db.Instance.idInstance.in_(list(r[0] for r in ids)))).all()
+                status = status or self.get_instance_solution_status(db)
+                return self._get_instances_by_id(db, status['fully_solved'].keys())
+
+            def get_unsolved_instances(self, db, status=None):
+                """ Returns the instances of the experiment that no solver
+                solved in any of its runs
+                """
+                status = status or self.get_instance_solution_status(db)
+                return self._get_instances_by_id(db, status['unsolved'].keys())
 
             def get_instances(self, db):
                 return db.session.query(db.Instance).options(joinedload_all('properties')) \
                     .filter(db.Instance.experiments.contains(self)).distinct().all()
 
+            def get_instance_catalogue(self, db):
+                """ Returns the cached catalogue.InstanceCatalogue of the
+                instances of the experiment
+                """
+                return catalogue.get_catalogue(db, self.idExperiment)
+
             def get_num_solver_configs(self, db):
                 return db.session.query(db.SolverConfiguration) \
                     .filter_by(experiment=self).distinct().count()
@@ -321,7 +471,7 @@ class EDACCDatabase(object):
                 table = db.metadata.tables['Instances']
                 c_instance = table.c['instance']
                 c_id = table.c['idInstance']
-                instance_ids = [i.idInstance for i in self.get_instances(db)]
+                instance_ids = list(self.get_instance_catalogue(db).by_id)
                 instance_sizes = db.session.connection().execute(select([func.length(c_instance)],
                                                                         c_id.in_(instance_ids)).select_from(
                     table)).fetchall()
@@ -394,7 +544,7 @@ class EDACCDatabase(object):
                                           from_obj=join_expression,
                 )
 
-                results = db.session.connection().execute(select_statement)
+                results = db.read_session().connection().execute(select_statement)
                 for row in results:
                     results_by_instance[row.SolverConfig_idSolverConfig][row.run] = row
 
@@ -465,16 +615,15 @@ class EDACCDatabase(object):
                             expression.label('cost', cost_column), expression.label('status', status_column),
                             table.c['SolverConfig_idSolverConfig'], table.c['Instances_idInstance'],
                             table_result_codes.c['description'], expression.label('limit', cost_limit_column)],
-                           and_(table.c['Experiment_idExperiment'] == self.idExperiment,
-                                table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
-                                table.c['Instances_idInstance'].in_(instance_ids)),
+                           selection.results_filter(db, db.read_session(), self.idExperiment, instance_ids,
+                                                    solver_config_ids),
                            from_obj=from_table.join(table_result_codes))
 
                 Run = namedtuple('Run', ['idJob', 'status', 'result_code_description', 'resultCode', 'resultTime',
                                          'successful', 'penalized_time10', 'idSolverConfig', 'idInstance',
                                          'penalized_time1', 'censored'])
 
-                for r in db.session.connection().execute(s):
+                for r in db.read_session().connection().execute(s):
                     if r.Instances_idInstance not in M: continue
                     if r.SolverConfig_idSolverConfig not in M[r.Instances_idInstance]: continue
                     if str(r.resultCode).startswith('1'): num_successful[r.Instances_idInstance][
@@ -595,14 +744,19 @@ class EDACCDatabase(object):
                     realDomain, flagDomain, categoricalDomain, ordinalDomain,
                     integerDomain, mixedDomain, optionalDomain.
                 """
-                pgraph = self.solver_binary.solver.parameter_graph[0].serializedGraph
+                graph = self.get_parameter_graph()
+                if graph is None: return None
+                return graph.get_domain(parameter_name)
+
+            def get_parameter_graph(self):
+                """ Returns the cached parameter_graph.ParameterGraph of the
+                    solver or None if the solver has no parameter graph.
+                """
+                solver = self.solver_binary.solver
+                if not solver.parameter_graph: return None
+                pgraph = solver.parameter_graph[0].serializedGraph
                 if pgraph is None: return None
-                tree = etree.parse(StringIO(pgraph))
-                if tree is None: return None
-                root = tree.getroot()
-                for node in root:
-                    if node.tag == "parameters" and node[1].text == parameter_name:
-                        return node[0].attrib.values()[0]
+                return parameter_graph.get_parameter_graph(database, solver.idSolver, pgraph)
 
         class ConfigurationScenarioParameter(object):
             pass
@@ -887,9 +1041,14 @@ class EDACCDatabase(object):
 
         self.session = scoped_session(sessionmaker(bind=self.engine, autocommit=False,
                                                    autoflush=False))
+        if self.replica_engine is not None:
+            self.replica_session = scoped_session(sessionmaker(bind=self.replica_engine, autocommit=False,
+                                                               autoflush=False))
+        else:
+            self.replica_session = None
 
         # initialize DBConfiguration table if not already done
-        if self.session.query(DBConfiguration).get(0) is None:
+        if not self.read_only and self.session.query(DBConfiguration).get(0) is None:
             dbConfig = DBConfiguration()
             dbConfig.id = 0
             dbConfig.competition = False
@@ -954,6 +1113,72 @@ class EDACCDatabase(object):
         self.session.query(self.DBConfiguration).get(0).competitionPhase = phase
         self.db_competition_phase = phase
 
+    def get_replica_lag(self):
+        """ Returns the number of seconds the replica lags behind the primary
+            or None if that is unknown, e.g. because replication is stopped.
+            A replica server that isn't replicating at all has an unknown lag
+            unless its configuration sets 'not_replicating' (then it is
+            considered up to date). The result is reused for
+            config.REPLICA_LAG_CHECK_INTERVAL seconds.
+        """
+        now = time.time()
+        if self._replica_lag_checked is not None and \
+                        now - self._replica_lag_checked < config.REPLICA_LAG_CHECK_INTERVAL:
+            return self._replica_lag
+        try:
+            status = self.replica_engine.execute("SHOW SLAVE STATUS").fetchone()
+            if status is None:
+                lag = 0 if self.replica.get('not_replicating') else None
+            else:
+                lag = status['Seconds_Behind_Master']
+        except Exception as e:
+            instrumentation.logger.warning('Could not determine replication lag of database %s: %s' % (
+                self.database, str(e)))
+            lag = None
+        self._replica_lag, self._replica_lag_checked = lag, now
+        return lag
+
+    def replica_is_fresh(self):
+        """ Returns true if the replica is within the configured staleness
+            bound (max_lag seconds, None to disable the check).
+        """
+        max_lag = self.replica.get('max_lag')
+        if max_lag is None: return True
+        lag = self.get_replica_lag()
+        return lag is not None and lag <= max_lag
+
+    def read_session(self):
+        """ Returns the session read-only analysis queries should use. This is
+            the replica session if a replica is configured and not lagging too
+            far behind, the primary session otherwise. The choice is kept until
+            the sessions are removed at the end of the request so all queries
+            of a request see the same database. Never write using this session.
+        """
+        session = getattr(self._read_sessions, 'session', None)
+        if session is None:
+            if self.replica_session is not None and self.replica_is_fresh():
+                session = self.replica_session
+            else:
+                session = self.session
+            self._read_sessions.session = session
+        return session
+
+    def session_in_use(self):
+        """ Returns true if the current thread created a session of
+            this database that wasn't removed yet.
+        """
+        return self.session.registry.has() or \
+               getattr(self._read_sessions, 'session', None) is not None or \
+               (self.replica_session is not None and self.replica_session.registry.has())
+
+    def remove_sessions(self):
+        """ Removes the sessions the current thread created. """
+        self._read_sessions.session = None
+        if self.session.registry.has():
+            self.session.remove()
+        if self.replica_session is not None and self.replica_session.registry.has():
+            self.replica_session.remove()
+
     def __str__(self):
         return self.label
 
@@ -965,14 +1190,20 @@ def get_databases():
     return databases
 
 
-def add_database(username, password, database, label, hidden=False):
-    databases[database] = EDACCDatabase(username, password, database, label, hidden)
+def add_database(username, password, database, label, hidden=False, snapshot=None):
+    """ Adds the database to the databases this web frontend serves. If
+        `snapshot` is given, it is served read-only from that snapshot file.
+    """
+    databases[database] = EDACCDatabase(username, password, database, label, hidden, snapshot)
     return databases[database]
 
 
 def remove_database(database):
     if database in databases:
         del databases[database]
+        instrumentation.unregister_pool(database)
+        instrumentation.unregister_pool(database + ' (replica)')
+        lru.drop_database(database)
 
 
 def get_database(database):
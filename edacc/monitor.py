@@ -9,16 +9,17 @@
     :license: MIT, see LICENSE for details.
 """
 
-import pygame, time
-from pygame import gfxdraw
-
-pygame.font.init()
+import time
 from math import *
 from PIL import Image, ImageDraw
 
 from sqlalchemy import func, text
 
-from edacc import utils, models, constants
+from edacc import utils, models, constants, instrumentation
+
+# pygame is imported and its font module initialized when the first canvas
+# is configured, see load_pygame()
+pygame = None
 
 NW = True
 
@@ -53,11 +54,25 @@ def extent(numStatus):
     return e
 
 
+def _load_pygame():
+    global pygame
+    import pygame
+    from pygame import gfxdraw
+
+    pygame.font.init()
+    return True
+
+def load_pygame():
+    """ Imports pygame and initializes its font module if that didn't happen yet. """
+    instrumentation.load_backend('pygame', _load_pygame)
+
+
 class Canvas(object):
     def __init__(self, *args, **kwargs):
         pass
 
     def config(self, height, width):
+        load_pygame()
         self.surf = pygame.Surface((width, height))
         self.surf.fill(pygame.Color("white"))
 
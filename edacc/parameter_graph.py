@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.parameter_graph
+    ---------------------
+
+    Parsed parameter graphs of solvers. The serialized graph (XML) of a
+    solver is parsed once into an index parameter name -> ParameterDomain
+    (domain name, bounds and categories) that is kept in memory per solver.
+    Each lookup compares the MD5 sum of the serialized graph to the one of
+    the cached graph and parses it again if the graph changed.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import hashlib
+from cStringIO import StringIO
+
+from lxml import etree
+
+from edacc import config, lru
+
+# (database name, solver ID) -> (MD5 sum, ParameterGraph)
+_graphs = lru.LRUCache(lambda: config.PARAMETER_GRAPH_CACHE_SIZE)
+
+
+def _local_name(element):
+    """ Returns the tag of the element without its namespace. """
+    return element.tag.rsplit('}', 1)[-1] if isinstance(element.tag, basestring) else None
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class ParameterDomain(object):
+    """ Domain of a parameter. `domain` is the domain name (realDomain,
+        flagDomain, categoricalDomain, ordinalDomain, integerDomain,
+        mixedDomain or optionalDomain), `low` and `high` are the bounds of
+        numerical domains and `categories` the values of categorical and
+        ordinal domains (None if the domain has none).
+    """
+    __slots__ = ('name', 'domain', 'low', 'high', 'categories')
+
+    def __init__(self, name, domain, low=None, high=None, categories=None):
+        self.name = name
+        self.domain = domain
+        self.low = low
+        self.high = high
+        self.categories = categories
+
+    def is_numerical(self):
+        return self.domain in ('realDomain', 'integerDomain')
+
+
+class ParameterGraph(object):
+    """ The parameter domains of a parsed parameter graph by parameter name. """
+
+    def __init__(self, domains):
+        self.domains = dict((d.name, d) for d in domains)
+
+    def get(self, parameter_name):
+        return self.domains.get(parameter_name)
+
+    def get_domain(self, parameter_name):
+        """ Returns the domain name of the parameter or None if the graph
+            doesn't contain the parameter.
+        """
+        domain = self.domains.get(parameter_name)
+        return domain.domain if domain is not None else None
+
+
+def _parse_domain(name, element):
+    # like the previous get_parameter_domain, the first attribute (xsi:type) names the domain
+    domain = element.attrib.values()[0] if element.attrib else None
+    low = high = categories = None
+    values = []
+    for child in element:
+        tag = _local_name(child)
+        if tag == 'low':
+            low = _float(child.text)
+        elif tag == 'high':
+            high = _float(child.text)
+        elif tag in ('categories', 'ordered_list'):
+            values.append(child.text)
+    if values:
+        categories = values
+    return ParameterDomain(name, domain, low, high, categories)
+
+
+def parse_parameter_graph(serialized_graph):
+    """ Parses the serialized parameter graph and returns its ParameterGraph. """
+    root = etree.parse(StringIO(serialized_graph)).getroot()
+    domains = []
+    for node in root:
+        if _local_name(node) == 'parameters' and len(node) > 1:
+            domains.append(_parse_domain(node[1].text, node[0]))
+    return ParameterGraph(domains)
+
+
+def get_parameter_graph(database, solver_id, serialized_graph):
+    """ Returns the parsed ParameterGraph of the solver's serialized graph,
+        parsed again only if the graph changed since it was cached.
+    """
+    key = (database, solver_id)
+    if isinstance(serialized_graph, unicode):
+        serialized_graph = serialized_graph.encode('utf-8')
+    checksum = hashlib.md5(serialized_graph).hexdigest()
+    cached = _graphs.get(key)
+    if cached is not None and cached[0] == checksum:
+        return cached[1]
+    graph = parse_parameter_graph(serialized_graph)
+    _graphs.put(key, (checksum, graph))
+    return graph
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.plot_data
+    ---------------
+
+    Columnar encoding of plot data, used by the plot views to return the
+    data of a plot instead of an image rendered by R (?json request argument)
+    so that clients can draw the plot themselves.
+
+    A column is encoded as dictionary with the keys
+        type: 'float64' or 'int32'
+        encoding: 'plain' or 'delta' (the values are the differences of
+                  consecutive elements, the first element is kept as is;
+                  only used for integer columns so that decoding is exact)
+        format: 'list' (data is a JSON list, non-finite floats are null) or
+                'base64' (data is the base64 encoded little-endian binary
+                array, which can be used as buffer of a JavaScript typed array)
+        length: number of elements
+        data: the encoded values
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import base64
+import gzip
+import math
+from cStringIO import StringIO
+
+try:
+    from cjson import encode as json_dumps
+except ImportError:
+    try:
+        from simplejson import dumps as json_dumps
+    except ImportError:
+        from json import dumps as json_dumps
+
+import numpy
+
+DTYPES = {'float64': '<f8', 'int32': '<i4'}
+
+
+def encode_column(values, type='float64', delta=False, format='list'):
+    """ Returns the column encoding (see module description) of the
+        list of numbers `values`. None values of float columns are
+        encoded as NaN.
+    """
+    if type not in DTYPES:
+        raise ValueError('Unknown column type %s' % type)
+    if format not in ('list', 'base64'):
+        raise ValueError('Unknown column format %s' % format)
+    if type == 'float64':
+        values = [float('nan') if v is None else v for v in values]
+    array = numpy.array(values, dtype=DTYPES[type])
+    delta = delta and type != 'float64' and len(array) > 0
+    if delta:
+        array = numpy.concatenate((array[:1], numpy.diff(array))).astype(DTYPES[type])
+
+    if format == 'base64':
+        data = base64.b64encode(array.tostring())
+    elif type == 'float64':
+        data = [v if not (math.isnan(v) or math.isinf(v)) else None for v in array.tolist()]
+    else:
+        data = array.tolist()
+    return {'type': type, 'encoding': 'delta' if delta else 'plain', 'format': format,
+            'length': len(array), 'data': data}
+
+
+def decode_column(column):
+    """ Inverse of encode_column, returns a numpy array. """
+    if column['format'] == 'base64':
+        array = numpy.fromstring(base64.b64decode(column['data']), dtype=DTYPES[column['type']])
+    else:
+        array = numpy.array([float('nan') if v is None else v for v in column['data']], dtype=DTYPES[column['type']])
+    if column['encoding'] == 'delta':
+        array = numpy.cumsum(array).astype(DTYPES[column['type']])
+    return array
+
+
+def serialize(data, compress=False):
+    """ Returns the JSON serialization of `data`, gzip compressed if
+        `compress` is true.
+    """
+    s = json_dumps(data)
+    if not compress:
+        return s
+    buffer = StringIO()
+    f = gzip.GzipFile(fileobj=buffer, mode='wb')
+    try:
+        f.write(s)
+    finally:
+        f.close()
+    return buffer.getvalue()
@@ -8,52 +8,63 @@
     :copyright: (c) 2010 by Daniel Diepold.
     :license: MIT, see LICENSE for details.
 """
-import os, math, random, numpy
+import os, math, random, select, stat, tempfile, time, errno
 
 from functools import wraps
-from rpy2 import robjects
-from rpy2.robjects.packages import importr
 from edacc.utils import newline_split_string
+from edacc import config, instrumentation
+
+# rpy2 and the R packages are loaded on first use of a plotting function,
+# see _load_r(). Importing this module has to be cheap because every web
+# worker imports it, even if it never renders a plot.
+robjects = None
+grdevices = None # plotting target devices
+stats = None # statistical methods
+akima = None # surface interpolation
+fields = None # image plotting
+ellipse = None # correlation matrix plots
+color_brewer = None # correlation matrix plots
+cluster = None # correlation matrix plots
+np = None # non-parametric kernel smoothing methods
+
+
+def _load_r():
+    """ Starts the embedded R interpreter, loads the R packages used by the
+        plotting functions and binds them to the module globals.
+    """
+    global robjects, grdevices, stats, akima, fields, ellipse, color_brewer, cluster, np
+    from rpy2 import robjects
+    from rpy2.robjects.packages import importr
+
+    grdevices = importr('grDevices')
+    stats = importr('stats')
+    akima = importr('akima')
+    fields = importr('fields')
+    ellipse = importr('ellipse')
+    color_brewer = importr('RColorBrewer')
+    cluster = importr('cluster')
+
+    #with open(os.devnull) as devnull:
+    # redirect the annoying np package import output to nirvana
+    #    stdout, stderr = sys.stdout, sys.stderr
+    #    sys.stdout = sys.stderr = devnull
+    np = importr('np')
+    robjects.r("library('np')")
+    #    sys.stdout, sys.stderr = stdout, stderr
+
+    robjects.r.setEPS() # set some default options for postscript in EPS format
+
+    return True
+
+
+def load_r():
+    """ Loads R and the plotting packages if that didn't happen yet. """
+    instrumentation.load_backend('R (plots)', _load_r)
+
+from threading import RLock, Thread, Event
 
-grdevices = importr('grDevices') # plotting target devices
-stats = importr('stats') # statistical methods
-akima = importr('akima') # surface interpolation
-fields = importr('fields') # image plotting
-ellipse = importr('ellipse') # correlation matrix plots
-color_brewer = importr('RColorBrewer') # correlation matrix plots
-cluster = importr('cluster') # correlation matrix plots
-
-#with open(os.devnull) as devnull:
-# redirect the annoying np package import output to nirvana
-#    stdout, stderr = sys.stdout, sys.stderr
-#    sys.stdout = sys.stderr = devnull
-np = importr('np') # non-parametric kernel smoothing methods
-robjects.r("library('np')")
-#    sys.stdout, sys.stderr = stdout, stderr
-
-robjects.r.setEPS() # set some default options for postscript in EPS format
-
-robjects.r("""plot.multi.dens <- function(s)
-    {
-    junk.x = NULL
-junk.y = NULL
-for(i in 1:length(s))
-    {
-    junk.x = c(junk.x, density(s[[i]])$x)
-junk.y = c(junk.y, density(s[[i]])$y)
-}
-xr <- range(junk.x)
-yr <- range(junk.y)
-plot(density(s[[1]]), xlim = xr, ylim = yr, main = "")
-for(i in 1:length(s))
-    {
-    lines(density(s[[i]]), xlim = xr, ylim = yr, col = i)
-}
-}""")
-
-from threading import Lock
-
-global_lock = Lock()
+# reentrant, render() holds the lock while calling the synchronized plotting functions
+global_lock = RLock()
 
 # list of colors used in the defined order for the different solvers/instance groups in plots
 colors = [
@@ -69,6 +80,7 @@ def synchronized(f):
 
     @wraps(f)
     def lockedfunc(*args, **kwargs):
+        load_r()
         global_lock.acquire()
         try:
             return f(*args, **kwargs)
@@ -78,6 +90,88 @@ def synchronized(f):
     return lockedfunc
 
 
+class PipeReader(Thread):
+    """ Reads everything written into the named pipe `path` into memory
+        until stop() is called. The pipe is opened non-blocking so that the
+        writer can open and close it any number of times.
+    """
+
+    def __init__(self, path):
+        Thread.__init__(self)
+        self.daemon = True
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        self.chunks = []
+        self.finished = Event()
+
+    def run(self):
+        try:
+            while True:
+                readable, _, _ = select.select([self.fd], [], [], 0.05)
+                data = ''
+                if readable:
+                    try:
+                        data = os.read(self.fd, 65536)
+                    except OSError as e:
+                        if e.errno != errno.EAGAIN: raise
+                if data:
+                    self.chunks.append(data)
+                elif self.finished.is_set():
+                    break
+                elif readable:
+                    # no writer connected (yet)
+                    time.sleep(0.005)
+        finally:
+            os.close(self.fd)
+
+    def stop(self):
+        """ Reads the remaining data and returns everything that was read """
+        self.finished.set()
+        self.join()
+        return ''.join(self.chunks)
+
+
+def _get_pipe():
+    """ Returns the path of the named pipe of this process the plots are
+        rendered into, see render().
+    """
+    path = os.path.join(config.TEMP_DIR, 'plot-%d.fifo' % os.getpid())
+    if os.path.exists(path) and not stat.S_ISFIFO(os.stat(path).st_mode):
+        os.remove(path)
+    if not os.path.exists(path):
+        os.mkfifo(path, 0600)
+    return path
+
+
+def render(function, format, *args, **kwargs):
+    """ Renders a plot with the plotting function `function` of this module
+        in the given format and returns the tuple (plot data, return value
+        of the plotting function).
+        The plot is written into a named pipe that is read in memory by a
+        second thread, so rendering doesn't create any files. Without
+        named pipe support or if config.PLOT_RENDER_PIPE is disabled, a
+        temporary file is used.
+    """
+    load_r()
+    with global_lock:
+        if config.PLOT_RENDER_PIPE and hasattr(os, 'mkfifo'):
+            reader = PipeReader(_get_pipe())
+            reader.start()
+            try:
+                result = function(*args, filename=_get_pipe(), format=format, **kwargs)
+            finally:
+                data = reader.stop()
+            return data, result
+
+        fd, filename = tempfile.mkstemp(suffix='.' + format, dir=config.TEMP_DIR)
+        os.close(fd)
+        try:
+            result = function(*args, filename=filename, format=format, **kwargs)
+            with open(filename, 'rb') as f:
+                return f.read(), result
+        finally:
+            os.remove(filename)
+
+
 @synchronized
 def scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='png',
             xscale='', yscale='', diagonal_line=False, dim=700):
@@ -457,11 +551,32 @@ def result_property_comparison(results1, results2, solver1, solver2, result_prop
     grdevices.dev_off()
 
 
+def _plot_ecdf(ecdf, color, point_style, log, min_x, max_x, file=None):
+    """ Draws the empirical CDF (xs, ps) as step function into the current
+        plot, with points at the steps. The R commands are also written to
+        the file, if given.
+    """
+    xs, ps = robjects.FloatVector(ecdf[0]), robjects.FloatVector(ecdf[1])
+    robjects.r.plot(xs, ps, type='s', main='', col=color, log=log, xlab='', ylab='', xaxs='i', yaxs='i', las=1,
+                    xaxt='n', yaxt='n', xlim=robjects.r.c(min_x, max_x), ylim=robjects.r.c(-0.05, 1.05))
+    robjects.r.points(xs, ps, col=color, pch=point_style)
+    robjects.r.par(new=1)
+
+    if file is not None:
+        file.write(
+            "plot(c(%s), c(%s), type='s', main='', col='%s', log='%s', xlab='', ylab='', xaxs='i', yaxs='i', las=1, xaxt='n', yaxt='n', xlim=c(%f, %f), ylim=c(-0.05, 1.05))\n" \
+            % (','.join(map(str, ecdf[0])), ','.join(map(str, ecdf[1])), color, log, min_x, max_x))
+        file.write("points(c(%s), c(%s), col='%s', pch=%d)\n"
+                   % (','.join(map(str, ecdf[0])), ','.join(map(str, ecdf[1])), color, point_style))
+        file.write("par(new=T)\n")
+
+
 @synchronized
 def property_distributions(results, property_name, log_property, filename, format='png'):
     """Runtime distribution plots for multiple result vectors.
-    results is expected to be a list of tuples (sc, data)
-    where data is the result vector of the solver configuration sc.
+    results is expected to be a list of tuples (sc, (xs, ps))
+    where xs, ps is the empirical CDF of the results of the solver
+    configuration sc (see distributions.ecdf).
     """
     if format == 'png':
         grdevices.png(file=filename, units="px", width=800,
@@ -474,11 +589,11 @@ def property_distributions(results, property_name, log_property, filename, forma
         grdevices.postscript(file=os.devnull, height=7, width=9)
         file = open(filename, 'w')
 
-    max_x = max([max(r[1] or [0]) for r in results] or [0])
+    max_x = max([max(list(r[1][0]) or [0]) for r in results] or [0])
 
     if log_property:
         log = 'x'
-        min_x = min([min(r[1] or [0.1]) for r in results] or [0.1])
+        min_x = min([min(list(r[1][0]) or [0.1]) for r in results] or [0.1])
     else:
         log = ''
         min_x = 0
@@ -508,20 +623,9 @@ def property_distributions(results, property_name, log_property, filename, forma
     # plot the distributions
     point_style = 0
     for res in results:
-        if len(res[1]) > 0:
-            robjects.r.plot(robjects.r.ecdf(robjects.FloatVector(res[1])),
-                            main='', col=colors[point_style % len(colors)], pch=point_style, log=log,
-                            xlab='', ylab='', xaxs='i', yaxs='i', las=1,
-                            xaxt='n', yaxt='n',
-                            xlim=robjects.r.c(min_x, max_x), ylim=robjects.r.c(-0.05, 1.05))
-            robjects.r.par(new=1)
-
-            if format == "rscript":
-                file.write(
-                    "ecdf(c(%s), main='', col='%s', pch=%d, log='%s', xlab='', ylab='', xaxs='i', yaxs='i', las=1, xaxt='n', yaxt='n', xlim=c(%f, %f), ylim=c(-0.05, 1.05))\n" \
-                    % (','.join(map(str, res[1])), colors[point_style % len(colors)], point_style, log, min_x, max_x))
-                file.write("par(new=T)\n")
-
+        if len(res[1][0]) > 0:
+            _plot_ecdf(res[1], colors[point_style % len(colors)], point_style, log, min_x, max_x,
+                       file if format == "rscript" else None)
             point_style += 1
 
 
@@ -599,10 +703,13 @@ def box_plot(data, property_label, filename, format='png'):
 
 
 @synchronized
-def property_distribution(results_by_sc, property_name, log_property, restart_strategy, filename, format='png'):
+def property_distribution(ecdfs_by_sc, property_name, log_property, restart, filename, format='png'):
     """Plot of a property distributions.
 
-    :param results: result vector
+    :param ecdfs_by_sc: dictionary of the empirical CDFs (xs, ps) of the
+                        results of the solver configurations
+    :param restart: None or the tuple (t_rs, mean with restarts, mean) of
+                    the restart strategy, see distributions.restart_strategy
     """
     if format == 'png':
         grdevices.png(file=filename, units="px", width=800,
@@ -616,14 +723,14 @@ def property_distribution(results_by_sc, property_name, log_property, restart_st
         file = open(filename, 'w')
 
     max_x = 0
-    for sc in results_by_sc:
-        max_x = max(max(results_by_sc[sc]), max_x)
+    for sc in ecdfs_by_sc:
+        max_x = max(max(list(ecdfs_by_sc[sc][0]) or [0]), max_x)
 
     if log_property:
         log = 'x'
         min_x = max_x
-        for sc in results_by_sc:
-            min_x = min(min(results_by_sc[sc]), min_x)
+        for sc in ecdfs_by_sc:
+            min_x = min(min(list(ecdfs_by_sc[sc][0]) or [max_x]), min_x)
     else:
         log = ''
         min_x = 0
@@ -652,45 +759,31 @@ def property_distribution(results_by_sc, property_name, log_property, restart_st
     col = 0
     point_style = 0
 
-    for sc in results_by_sc:
-        if restart_strategy and len(results_by_sc) == 1:
-            mean = numpy.mean(results_by_sc[sc] or [0])
-            best_i, best_ti, best_mean = 0, 0, None
-            for i, t_i in zip(range(1, len(results_by_sc[sc]) + 1), sorted(results_by_sc[sc])):
-                mp = t_i * len(results_by_sc[sc]) / float(i)
-                if best_mean is None or mp - mean < best_mean - mean:
-                    best_mean = mp
-                    best_i = i
-                    best_ti = t_i
-
-            robjects.r.abline(v=best_ti, col='red')
-            robjects.r.abline(v=best_mean, col='blue')
-            robjects.r.abline(v=mean, col='green')
-            robjects.r.par(new=1)
-
-            if format == "rscript":
-                file.write("abline(v=%f, col='red')\n" % (best_ti, ))
-                file.write("par(new=T)\n")
-
-        robjects.r.plot(robjects.r.ecdf(robjects.FloatVector(results_by_sc[sc] or [0])),
-                        main='', xaxt='n', yaxt='n', log=log, col=colors[col % len(colors)], pch=point_style,
-                        xlab='', ylab='', xaxs='i', yaxs='i', las=1,
-                        xlim=robjects.r.c(min_x, max_x), ylim=robjects.r.c(-0.05, 1.05))
-
+    if restart is not None:
+        best_ti, best_mean, mean = restart
+        robjects.r.abline(v=best_ti, col='red')
+        robjects.r.abline(v=best_mean, col='blue')
+        robjects.r.abline(v=mean, col='green')
         robjects.r.par(new=1)
 
+        if format == "rscript":
+            file.write("abline(v=%f, col='red')\n" % (best_ti, ))
+            file.write("abline(v=%f, col='blue')\n" % (best_mean, ))
+            file.write("abline(v=%f, col='green')\n" % (mean, ))
+            file.write("par(new=T)\n")
+
+    for sc in ecdfs_by_sc:
+        _plot_ecdf(ecdfs_by_sc[sc], colors[col % len(colors)], point_style, log, min_x, max_x,
+                   file if format == "rscript" else None)
         col += 1
         point_style += 1
 
     if format == "rscript":
-        file.write(
-            "plot(ecdf(c(%s)), main='', xaxt='n', yaxt='n', log='%s', xlab='', ylab='', xaxs='i', yaxs='i', las=1, xlim=c(%f, %f), ylim=c(-0.05, 1.05))\n" \
-            % (','.join(map(str, results or [0])), log, min_x, max_x))
         file.write("mtext('%s', side=1, line=3, cex=1.2)\n" % (property_name, ))
         file.write("mtext('P(X <= x)', side=2, padj=0, line=3, cex=1.2)\n")
         file.write("mtext('%s', padj=1, side=3, line=3, cex=1.7)\n" \
                    % (property_name + ' distribution' + (
-        u', t_rs = ' + str(round(best_ti, 4)) if restart_strategy and len(results_by_sc) == 1 else ''), ))
+        u', t_rs = ' + str(round(restart[0], 4)) if restart is not None else ''), ))
 
     # plot labels and axes
     robjects.r.mtext(property_name, side=1,
@@ -698,17 +791,17 @@ def property_distribution(results_by_sc, property_name, log_property, restart_st
     robjects.r.mtext('P(X <= x)', side=2, padj=0,
                      line=3, cex=1.2) # left axis label
     robjects.r.mtext(property_name + ' distribution' + (
-    u', t_rs = ' + str(round(best_ti, 4)) if restart_strategy and len(results_by_sc) == 1 else ''),
+    u', t_rs = ' + str(round(restart[0], 4)) if restart is not None else ''),
                      padj=1, side=3, line=3, cex=1.7) # plot title
 
     robjects.r.par(xpd=True)
     # plot legend
     robjects.r.legend("right", inset=-0.4,
-                      legend=robjects.StrVector([newline_split_string(str(sc), 23) for sc in results_by_sc]),
-                      col=robjects.StrVector(colors[:len(results_by_sc)]),
-                      pch=robjects.IntVector(range(len(results_by_sc))), lty=1, **{'y.intersp': 1.4})
+                      legend=robjects.StrVector([newline_split_string(str(sc), 23) for sc in ecdfs_by_sc]),
+                      col=robjects.StrVector(colors[:len(ecdfs_by_sc)]),
+                      pch=robjects.IntVector(range(len(ecdfs_by_sc))), lty=1, **{'y.intersp': 1.4})
 
-    if not results_by_sc:
+    if not ecdfs_by_sc:
         robjects.r.mtext('not enough data', padj=5, side=3, line=3, cex=1.7)
 
         if format == "rscript":
@@ -718,8 +811,15 @@ def property_distribution(results_by_sc, property_name, log_property, restart_st
 
 
 @synchronized
-def kerneldensity(results_by_sc, property_name, log_property, restart_strategy, filename, format='png'):
-    """Non-parametric kernel density estimation plots of result vectors."""
+def kerneldensity(densities_by_sc, property_name, log_property, restart, filename, format='png'):
+    """Non-parametric kernel density estimation plots of result vectors.
+
+    :param densities_by_sc: dictionary of the kernel density estimates
+                            (xs, densities) of the results of the solver
+                            configurations, see distributions.gaussian_kde
+    :param restart: None or the tuple (t_rs, mean with restarts, mean) of
+                    the restart strategy, see distributions.restart_strategy
+    """
     if format == 'png':
         grdevices.png(file=filename, units="px", width=800,
                       height=600, type="cairo")
@@ -731,44 +831,35 @@ def kerneldensity(results_by_sc, property_name, log_property, restart_strategy,
         grdevices.postscript(file=os.devnull, height=7, width=9)
         file = open(filename, 'w')
 
-    max_x = 0
-    for sc in results_by_sc:
-        max_x = max(max(results_by_sc[sc]), max_x)
-
-    if log_property:
-        log = 'x'
-        min_x = max_x
-        for sc in results_by_sc:
-            min_x = min(min(results_by_sc[sc]), min_x)
-    else:
-        log = ''
-        min_x = 0
+    curves = [densities_by_sc[sc] for sc in densities_by_sc if len(densities_by_sc[sc][0]) > 0]
+    min_x = min([min(xs) for xs, _ in curves] or [0.1])
+    max_x = max([max(xs) for xs, _ in curves] or [1])
+    max_y = max([max(ys) for _, ys in curves] or [1])
+    log = 'x' if log_property else ''
 
     robjects.r.par(mar=robjects.FloatVector([5, 4, 4, 15]))
+    robjects.r.plot(robjects.FloatVector([]), robjects.FloatVector([]), type='n', log=log, las=1,
+                    xlim=robjects.r.c(min_x, max_x), ylim=robjects.r.c(0, max_y),
+                    xlab=property_name, ylab='Density' + (' (log10 scale)' if log_property else ''), main='')
+    if format == "rscript":
+        file.write("par(mar=c(5,4,4,15))\n")
+        file.write("plot(c(), c(), type='n', log='%s', las=1, xlim=c(%f, %f), ylim=c(0, %f), xlab='%s', ylab='%s', main='')\n" \
+                   % (log, min_x, max_x, max_y, property_name, 'Density' + (' (log10 scale)' if log_property else '')))
 
-    col = 0
-    point_style = 0
-
-    robjects.r("plot.multi.dens")((robjects.r("list"))(*map(robjects.FloatVector, results_by_sc.values())))
+    for col, sc in enumerate(densities_by_sc, 1):
+        xs, ys = densities_by_sc[sc]
+        if not len(xs): continue
+        robjects.r.lines(robjects.FloatVector(xs), robjects.FloatVector(ys), col=col)
+        if format == "rscript":
+            file.write("lines(c(%s), c(%s), col=%d)\n" % (','.join(map(str, xs)), ','.join(map(str, ys)), col))
 
-    # plot labels and axes
-    if restart_strategy and len(results_by_sc) == 1:
-        sc = results_by_sc.keys()[0]
-        mean = numpy.mean(results_by_sc[sc] or [0])
-        best_i, best_ti, best_mean = 0, 0, None
-        for i, t_i in zip(range(1, len(results_by_sc[sc]) + 1), sorted(results_by_sc[sc])):
-            mp = t_i * len(results_by_sc[sc]) / float(i)
-            if best_mean is None or mp - mean < best_mean - mean:
-                best_mean = mp
-                best_i = i
-                best_ti = t_i
-        robjects.r.par(new=1)
+    if restart is not None:
+        best_ti, best_mean, mean = restart
         robjects.r.abline(v=best_ti, col='red')
         robjects.r.abline(v=best_mean, col='blue')
         robjects.r.abline(v=mean, col='green')
 
         if format == "rscript":
-            file.write("par(new=T)\n")
             file.write("abline(v=%f, col='red')\n" % (best_ti,))
             file.write("abline(v=%f, col='blue')\n" % (best_mean,))
             file.write("abline(v=%f, col='green')\n" % (mean,))
@@ -776,20 +867,20 @@ def kerneldensity(results_by_sc, property_name, log_property, restart_strategy,
     # plot labels and axes
 
     robjects.r.mtext('Kernel density estimation' + (
-    u', t_rs = ' + str(round(best_ti, 4)) if restart_strategy and len(results_by_sc) == 1 else ''),
+    u', t_rs = ' + str(round(restart[0], 4)) if restart is not None else ''),
                      padj=1, side=3, line=3, cex=1.7) # plot title
 
     if format == "rscript":
         file.write("mtext('Kernel density estimation%s', padj=1, side=3, line=3, cex=1.7)\n" \
-                   % ((u', t_rs = ' + str(round(best_ti, 4)) if restart_strategy and len(results_by_sc) == 1 else ''),))
+                   % ((u', t_rs = ' + str(round(restart[0], 4)) if restart is not None else ''),))
 
     robjects.r.par(xpd=True)
     # plot legend
     robjects.r.legend("right", inset=-0.4,
-                      legend=robjects.StrVector([newline_split_string(str(sc), 23) for sc in results_by_sc]),
-                      col=robjects.StrVector(range(1, len(results_by_sc) + 1)), lty=1, **{'y.intersp': 1.4})
+                      legend=robjects.StrVector([newline_split_string(str(sc), 23) for sc in densities_by_sc]),
+                      col=robjects.StrVector(range(1, len(densities_by_sc) + 1)), lty=1, **{'y.intersp': 1.4})
 
-    if not results_by_sc:
+    if not curves:
         robjects.r.frame()
         robjects.r.mtext('not enough data', padj=5, side=3, line=3, cex=1.7)
 
@@ -6,13 +6,9 @@
     Adapted for the EDACC Web Frontend by Daniel Diepold.
 """
 
-import scipy.special, scipy.optimize, scipy.stats
-import scikits.learn.linear_model
 import numpy
 import os
-import rpy2.robjects
-from rpy2.robjects.numpy2ri import numpy2ri
-from functools import wraps
+import multiprocessing
 try: from cjson import encode as json_dumps
 except:
     try: from simplejson import dumps as json_dumps
@@ -21,27 +17,41 @@ except:
 from flask import Blueprint, abort, request
 from flask import render_template as render
 from sqlalchemy import not_, func
+from sqlalchemy.sql import select, and_, expression
 
-from edacc import models
+from edacc import models, instrumentation, config, plots
 from edacc.web import cache
 from edacc.constants import STATUS_PROCESSING
 from edacc.views.helpers import require_login, require_phase
 
 from threading import Lock
-global_lock = Lock()
 
-def synchronized(f):
-    """Thread synchronization decorator. Only allows exactly one thread
-    to enter the wrapped function at any given point in time.
-    """
-    @wraps(f)
-    def lockedfunc(*args, **kwargs):
-        try:
-            global_lock.acquire()
-            return f(*args, **kwargs)
-        finally:
-            global_lock.release()
-    return lockedfunc
+# (database, experiment ID) -> lock held while the data of the experiment is
+# loaded and fitted, so the models of different experiments are fitted in
+# parallel and each model is fitted only once
+_experiment_locks = {}
+_experiment_locks_lock = Lock()
+
+def experiment_lock(database, experiment_id):
+    """Return the lock of the borg explorer data of an experiment."""
+    with _experiment_locks_lock:
+        return _experiment_locks.setdefault((database, experiment_id), Lock())
+
+# scipy, scikits.learn and rpy2 are only needed to fit the models, they are
+# imported by load_backends() when the first model is fitted.
+scipy = scikits = rpy2 = numpy2ri = None
+
+def _load_backends():
+    global scipy, scikits, rpy2, numpy2ri
+    import scipy.special, scipy.optimize, scipy.stats
+    import scikits.learn.linear_model
+    import rpy2.robjects
+    from rpy2.robjects.numpy2ri import numpy2ri
+    return True
+
+def load_backends():
+    """Import the numerical backends used by the model fitting code."""
+    instrumentation.load_backend('scipy, scikits.learn, R (borgexplorer)', _load_backends)
 
 borgexplorer = Blueprint('borgexplorer', __name__, template_folder='static')
 
@@ -69,15 +79,12 @@ def borg_explorer_data(database, experiment_id):
         .filter_by(experiment=experiment).first()
     job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
 
-    @synchronized
     @cache.memoize(7*24*60*60)
     def get_data(database, experiment_id, job_count, last_modified_job):
-        runs = db.session.query(db.ExperimentResult) \
-                                .filter(db.ExperimentResult.Experiment_idExperiment==experiment_id) \
-                                .filter(not_(db.ExperimentResult.status.in_(STATUS_PROCESSING))).order_by('idJob').all()
-        return CategoryData().fit([(0, r.instance.name, r.result_code.description, r.resultTime, 0, r.solver_configuration.name, 0) for r in runs])
+        return CategoryData().fit(*get_category_runs(db, experiment_id))
 
-    data = get_data(database, experiment_id, job_count, last_modified_job)
+    with experiment_lock(database, experiment_id):
+        data = get_data(database, experiment_id, job_count, last_modified_job)
 
     if type == 'runs.json':
         return json_dumps(data.table)
@@ -92,6 +99,31 @@ def borg_explorer_data(database, experiment_id):
     else:
         abort(404)
 
+def get_category_runs(db, experiment_id):
+    """ Fetches the finished runs of an experiment with a single query.
+        Returns the columns (instance names, result code descriptions,
+        CPU times, solver configuration names) as lists in job order.
+    """
+    table = db.metadata.tables['ExperimentResults']
+    table_instances = db.metadata.tables['Instances']
+    table_result_codes = db.metadata.tables['ResultCodes']
+    table_sc = db.metadata.tables['SolverConfig']
+
+    s = select([expression.label('instance_name', table_instances.c['name']),
+                expression.label('result_code_description', table_result_codes.c['description']),
+                table.c['resultTime'],
+                expression.label('solver_config_name', table_sc.c['name'])],
+               and_(table.c['Experiment_idExperiment'] == experiment_id,
+                    not_(table.c['status'].in_(STATUS_PROCESSING))),
+               from_obj=table.join(table_instances).join(table_result_codes).join(table_sc)) \
+        .order_by(table.c['idJob'])
+
+    columns = ([], [], [], [])
+    for r in db.read_session().connection().execute(s):
+        for column, v in zip(columns, r):
+            column.append(v)
+    return columns
+
 ##############################################################################
 
 def assert_probabilities(array):
@@ -110,13 +142,21 @@ def assert_weights(array, axis = None):
 
     assert numpy.all(numpy.abs(numpy.sum(array, axis = axis) - 1.0 ) < 1e-6)
 
-def fit_binomial_mixture(observed, counts, K):
+def duplicate_components(components, tolerance = 1e-6):
+    """Return a mask of the mixture components that (almost) equal a later component."""
+
+    flat = components.reshape((components.shape[0], -1))
+    distances = numpy.sum(numpy.abs(flat[:, None, :] - flat[None, :, :]), axis = -1)
+
+    return numpy.any(numpy.triu(distances < tolerance, 1), axis = 1)
+
+def fit_binomial_mixture(observed, counts, K, random = numpy.random):
     """Use EM to fit a discrete mixture."""
 
     concentration = 1e-8
     N = observed.shape[0]
     rates = (observed + concentration / 2.0) / (counts + concentration)
-    components = rates[numpy.random.randint(N, size = K)]
+    components = rates[random.randint(N, size = K)]
     responsibilities = numpy.empty((K, N))
     old_ll = -numpy.inf
 
@@ -142,35 +182,43 @@ def fit_binomial_mixture(observed, counts, K):
         components /= numpy.sum(map_counts, axis = 1) + concentration
 
         # split duplicates
-        for j in xrange(K):
-            for k in xrange(K):
-                if j != k and numpy.sum(numpy.abs(components[j] - components[k])) < 1e-6:
-                    components[j] = rates[numpy.random.randint(N)]
-                    old_ll = -numpy.inf
+        duplicates = duplicate_components(components)
+
+        if numpy.any(duplicates):
+            components[duplicates] = rates[random.randint(N, size = numpy.sum(duplicates))]
+            old_ll = -numpy.inf
 
     assert numpy.all(components >= 0.0)
     assert numpy.all(components <= 1.0)
 
     return (components, weights, responsibilities, ll)
 
-def inverse_digamma(x):
-    """Return the (approximate) inverse of the digamma function."""
+def inverse_digamma(x, tolerance = 1.48e-8, iterations = 50):
+    """Return the (approximate) inverse of the digamma function.
 
-    if x >= -2.22:
-        y0 = numpy.exp(x) + 0.5
-    else:
-        y0 = -1.0 / (x - scipy.special.digamma(1.0))
+    Works element-wise on arrays: all elements are solved by Newton's method
+    at once, elements stop being updated as soon as they converged.
+    """
 
-    f = lambda y: scipy.special.digamma(y) - x
-    f_ = lambda y: scipy.special.polygamma(1, y)
+    x = numpy.asarray(x, dtype = float)
+    y = numpy.where(x >= -2.22, numpy.exp(x) + 0.5, -1.0 / (x - scipy.special.digamma(1.0)))
+    active = numpy.ones(y.shape, dtype = bool)
 
-    return scipy.optimize.newton(f, y0, fprime = f_)
+    for _ in xrange(iterations):
+        step = (scipy.special.digamma(y[active]) - x[active]) / scipy.special.polygamma(1, y[active])
+        y[active] -= step
+        active[active] = numpy.abs(step) > tolerance
 
-def fit_dirichlet(vectors, weights):
+        if not numpy.any(active):
+            break
+
+    return y if y.ndim else float(y)
+
+def fit_dirichlet(vectors, weights, random = numpy.random):
     """Compute the maximum-likelihood Dirichlet distribution."""
 
     log_pbar_k = numpy.sum(weights[:, None, None] * numpy.log(vectors), axis = 0) / numpy.sum(weights)
-    alpha = numpy.random.random(vectors.shape[1:])
+    alpha = random.random_sample(vectors.shape[1:])
     alpha /= numpy.sum(alpha, axis = 1)[:, None]
     last_alpha = alpha
 
@@ -178,8 +226,7 @@ def fit_dirichlet(vectors, weights):
         psi_total = scipy.special.digamma(numpy.sum(alpha, axis = 1))
         psi_alpha = psi_total[:, None] + log_pbar_k
 
-        alpha = numpy.array([[inverse_digamma(x) for x in row.flatten()] for row in psi_alpha])
-        alpha = alpha.reshape(psi_alpha.shape)
+        alpha = inverse_digamma(psi_alpha)
 
         if numpy.sum(numpy.abs(alpha - last_alpha)) <= 1e-10:
             break
@@ -188,11 +235,11 @@ def fit_dirichlet(vectors, weights):
 
     return alpha
 
-def fit_dirichlet_vfixed(vectors, weights, variance):
+def fit_dirichlet_vfixed(vectors, weights, variance, random = numpy.random):
     """Compute the maximum-likelihood Dirichlet distribution with fixed concentration."""
 
     log_pbar_k = numpy.sum(weights[:, None, None] * numpy.log(vectors), axis = 0) / numpy.sum(weights)
-    alpha = numpy.random.random(vectors.shape[1:])
+    alpha = random.random_sample(vectors.shape[1:])
     alpha /= numpy.sum(alpha, axis = 1)[:, None]
     last_alpha = alpha
 
@@ -201,8 +248,7 @@ def fit_dirichlet_vfixed(vectors, weights, variance):
         psi_sigma = numpy.sum(alpha * (log_pbar_k - psi_full), axis = -1)
         psi_alpha = log_pbar_k - psi_sigma[..., None]
 
-        alpha = numpy.array([[inverse_digamma(x) for x in row.flatten()] for row in psi_alpha])
-        alpha = alpha.reshape(psi_alpha.shape)
+        alpha = inverse_digamma(psi_alpha)
         alpha /= numpy.sum(alpha, axis = -1)[..., None]
 
         if numpy.sum(numpy.abs(alpha - last_alpha)) <= 1e-10:
@@ -248,7 +294,7 @@ def dcm_draw_pdf(k, alpha):
 
     return term_l * term_r
 
-def fit_dirichlet_mixture(vectors, K):
+def fit_dirichlet_mixture(vectors, K, random = numpy.random):
     """Use EM to fit a Dirichlet mixture."""
 
     # hackishly regularize our input vectors
@@ -257,7 +303,7 @@ def fit_dirichlet_mixture(vectors, K):
 
     # then do EM
     N = vectors.shape[0]
-    components = vectors[numpy.random.randint(N, size = K)]
+    components = vectors[random.randint(N, size = K)]
     responsibilities = numpy.empty((K, N))
     old_ll = -numpy.inf
 
@@ -280,13 +326,13 @@ def fit_dirichlet_mixture(vectors, K):
 
         # compute new components
         for k in xrange(K):
-            components[k] = fit_dirichlet(vectors, responsibilities[k])
+            components[k] = fit_dirichlet(vectors, responsibilities[k], random)
+
+        duplicates = duplicate_components(components)
 
-        for j in xrange(K):
-            for k in xrange(K):
-                if j != k and numpy.sum(numpy.abs(components[j] - components[k])) < 1e-6:
-                    components[j] = vectors[numpy.random.randint(N)]
-                    old_ll = -numpy.inf
+        if numpy.any(duplicates):
+            components[duplicates] = vectors[random.randint(N, size = numpy.sum(duplicates))]
+            old_ll = -numpy.inf
 
     return (components, weights)
 
@@ -413,7 +459,7 @@ def multinomial_log_mass_implied(counts, total_counts, beta):
 
     return log_mass
 
-def fit_multinomial_mixture(successes, attempts, K):
+def fit_multinomial_mixture(successes, attempts, K, random = numpy.random):
     """Fit a discrete mixture using EM."""
 
     # mise en place
@@ -428,7 +474,7 @@ def fit_multinomial_mixture(successes, attempts, K):
     prior_beta = 1.0 + 1e-1
     prior_upper = prior_alpha - 1.0
     prior_lower = B * prior_alpha + prior_beta - B - 1.0
-    initial_n_K = numpy.random.randint(N, size = K)
+    initial_n_K = random.randint(N, size = K)
     components_KB = successes_NB[initial_n_K] + prior_upper
     components_KB /= (attempts_N[initial_n_K] + prior_lower)[:, None]
 
@@ -461,19 +507,19 @@ def fit_multinomial_mixture(successes, attempts, K):
         components_KB /= (numpy.sum(weighted_attempts_KN, axis = 1) + prior_lower)[:, None]
 
         # split duplicates
-        for j in xrange(K):
-            for k in xrange(K):
-                if j != k and numpy.sum(numpy.abs(components_KB[j] - components_KB[k])) < 1e-6:
-                    previous_ll = -numpy.inf
-                    n = numpy.random.randint(N)
-                    components_KB[k] = successes_NB[n] + prior_upper
-                    components_KB[k] /= attempts_N[n] + prior_lower
+        duplicates_K = duplicate_components(components_KB)
+
+        if numpy.any(duplicates_K):
+            previous_ll = -numpy.inf
+            n = random.randint(N, size = numpy.sum(duplicates_K))
+            components_KB[duplicates_K] = successes_NB[n] + prior_upper
+            components_KB[duplicates_K] /= (attempts_N[n] + prior_lower)[:, None]
 
     assert_probabilities(components_KB)
 
     return (components_KB, responsibilities_KN, log_mass_KN, ll)
 
-def fit_multinomial_outer_mixture(rclass_res, rclass_mass, L):
+def fit_multinomial_outer_mixture(rclass_res, rclass_mass, L, random = numpy.random):
     """Fit a discrete mixture using EM."""
 
     # mise en place
@@ -487,7 +533,7 @@ def fit_multinomial_outer_mixture(rclass_res, rclass_mass, L):
     # expectation maximization
     previous_ll = -numpy.inf
     prior_alpha = 1.0 + 1e-2
-    initial_n_L = numpy.random.randint(N, size = L)
+    initial_n_L = random.randint(N, size = L)
     components_LSK = rclass_res_NSK[initial_n_L]
 
     for _ in xrange(1024):
@@ -520,22 +566,37 @@ def fit_multinomial_outer_mixture(rclass_res, rclass_mass, L):
         components_LSK /= numpy.sum(components_LSK, axis = -1)[..., None]
 
         # split duplicates
-        for l in xrange(L):
-            for m in xrange(L):
-                if l != m and numpy.sum(numpy.abs(components_LSK[l] - components_LSK[m])) < 1e-6:
-                    previous_ll = -numpy.inf
-                    n = numpy.random.randint(N)
-                    components_LSK[l] = rclass_res_NSK[n]
+        duplicates_L = duplicate_components(components_LSK)
+
+        if numpy.any(duplicates_L):
+            previous_ll = -numpy.inf
+            components_LSK[duplicates_L] = rclass_res_NSK[random.randint(N, size = numpy.sum(duplicates_L))]
 
     weights_L = numpy.exp(log_weights_L)
 
     return (components_LSK, weights_L, responsibilities_LN, ll)
 
+def _fit_multinomial_restart(arguments):
+    """Fit one restart of a solver behavior mixture; runs in the worker processes."""
+
+    (successes, attempts, K, seed) = arguments
+
+    load_backends()
+
+    return fit_multinomial_mixture(successes, attempts, K, numpy.random.RandomState(seed))
+
 class BilevelMultinomialModel(object):
     """Two-level multinomial mixture model."""
 
-    def __init__(self, successes, attempts, features = None):
-        """Fit the model to data."""
+    def __init__(self, successes, attempts, features = None, seed = 0, restarts = 4):
+        """Fit the model to data.
+
+        The restarts of the solver mixtures are fitted in a pool of
+        config.BORG_FIT_PROCESSES worker processes (forked, see the warning
+        in config.py). Restart r of solver s is seeded with
+        seed + s * restarts + r, so the fitted model does not depend on the
+        number of processes.
+        """
 
         # mise en place
         (N, S, B) = successes.shape
@@ -550,11 +611,27 @@ class BilevelMultinomialModel(object):
         rclass_res = numpy.empty((S, K, N))
         rclass_mass = numpy.empty((S, K, N))
 
+        tasks = [
+            (successes_NSB[:, s], attempts_NS[:, s], K, seed + s * restarts + r)
+            for s in xrange(S)
+            for r in xrange(restarts)
+            ]
+        processes = min(config.BORG_FIT_PROCESSES, len(tasks))
+
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+
+            try:
+                fits = pool.map(_fit_multinomial_restart, tasks)
+            finally:
+                pool.terminate()
+        else:
+            fits = map(_fit_multinomial_restart, tasks)
+
         for s in xrange(S):
-            fit = lambda: fit_multinomial_mixture(successes_NSB[:, s], attempts_NS[:, s], K)
             (self._rclass_SKB[s], rclass_res[s], rclass_mass[s], _) = \
                 max(
-                    [fit() for _ in xrange(4)],
+                    fits[s * restarts:(s + 1) * restarts],
                     key = lambda x: x[-1],
                     )
 
@@ -566,6 +643,7 @@ class BilevelMultinomialModel(object):
                 rclass_res,
                 rclass_mass,
                 L,
+                numpy.random.RandomState(seed),
                 )
 
         # fit the classifier
@@ -639,66 +717,61 @@ class BilevelMultinomialModel(object):
 class CategoryData(object):
     """Data for a category."""
 
-    def fit(self, runs, budget_interval=100, budget_count=61):
+    def fit(self, instance_names, answers, costs, solver_names, budget_interval=100, budget_count=61, seed=0):
         """ Fit data for a category.
-            runs is expected to be a list of tuples of the format
-            (_, instanceName, resultCodeDescription, cost, _, solverName, _)
-            where '_' denotes currently unused entries
+            The runs are given column-wise: instance_names, answers (result
+            code descriptions), costs and solver_names hold one entry per
+            run (see get_category_runs).
+            The model is fitted with the given random seed, fitting the same
+            runs again gives the same model.
         """
 
-        #runs = numpy.recfromcsv(runs_path, usemask = True).tolist()
-
-        # build the indices
-        solver_index = {}
-        instance_index = {}
-
-        for (_, instance, _, _, _, solver_name, _) in runs:
-            instance_name = os.path.basename(instance)
+        load_backends()
 
-            if instance_name not in instance_index:
-                instance_index[instance_name] = len(instance_index)
-            if solver_name not in solver_index:
-                solver_index[solver_name] = len(solver_index)
+        # build the indices, instances and solvers are numbered by first appearance
+        instance_names = [os.path.basename(name) for name in instance_names]
+        (instance_names_, first_n, n_R) = numpy.unique(instance_names, return_index = True, return_inverse = True)
+        (solver_names_, first_s, s_R) = numpy.unique(solver_names, return_index = True, return_inverse = True)
+        order_N = numpy.argsort(first_n, kind = "mergesort")
+        order_S = numpy.argsort(first_s, kind = "mergesort")
+        n_R = numpy.argsort(order_N)[n_R]
+        s_R = numpy.argsort(order_S)[s_R]
 
-        S = len(solver_index)
-        N = len(instance_index)
+        S = len(solver_names_)
+        N = len(instance_names_)
         B = budget_count
 
-        self.solvers = sorted(solver_index, key = lambda k: solver_index[k])
-        self.instances = sorted(instance_index, key = lambda k: instance_index[k])
+        self.solvers = solver_names_[order_S].tolist()
+        self.instances = instance_names_[order_N].tolist()
+
+        # build the matrices from the first run of each solver on each instance
+        # XXX support multiple runs
+        (_, first_R) = numpy.unique(n_R * S + s_R, return_index = True)
+        n_R = n_R[first_R]
+        s_R = s_R[first_R]
+        cost_R = numpy.array(costs, dtype = float)[first_R]
+        answer_R = numpy.array(answers, dtype = object)[first_R]
 
-        # build the matrices
         budgets = [b * budget_interval for b in xrange(1, B + 1)]
         max_cost = budget_interval * budget_count
         attempts = numpy.zeros((N, S))
         costs = numpy.zeros((N, S))
-        successes = numpy.zeros((N, S))
         answers = numpy.zeros((N, S))
         binned_successes = numpy.zeros((N, S, B))
 
-        for (_, instance, answer, cost, _, solver_name, _) in runs:
-            s = solver_index[solver_name]
-            n = instance_index[os.path.basename(instance)]
-
-            if attempts[n, s] == 0.0: # XXX support multiple runs
-                attempts[n, s] = 1.0
-                costs[n, s] = cost
+        attempts[n_R, s_R] = 1.0
+        costs[n_R, s_R] = cost_R
 
-                if cost <= max_cost and answer in ('SAT', 'UNSAT'):
-                    b = numpy.digitize([cost], budgets)
+        sat_R = answer_R == "SAT"
+        unsat_R = answer_R == "UNSAT"
+        solved_R = (cost_R <= max_cost) & (sat_R | unsat_R)
+        b_R = numpy.minimum(numpy.digitize(cost_R[solved_R], budgets), B - 1)
 
-                    successes[n, s] += 1.0
-                    binned_successes[n, s, b] += 1.0
-
-                    if answer == "SAT":
-                        answers[n, s] = 1.0
-                    elif answer == "UNSAT":
-                        answers[n, s] = -1.0
-                    else:
-                        raise RuntimeError("unrecognized answer {0}".format(answer))
+        binned_successes[n_R[solved_R], s_R[solved_R], b_R] = 1.0
+        answers[n_R[solved_R], s_R[solved_R]] = numpy.where(sat_R[solved_R], 1.0, -1.0)
 
         # fit the model
-        self.model = BilevelMultinomialModel(binned_successes, attempts)
+        self.model = BilevelMultinomialModel(binned_successes, attempts, seed = seed)
 
         # build the mean-cost table
         self.table = []
@@ -725,16 +798,16 @@ class CategoryData(object):
                 "runs": task_runs_list,
                 })
 
-        # generate cluster projection
-        self.similarity_NN = numpy.empty((N, N))
-
-        for m in xrange(N):
-            for n in xrange(N):
-                rm_SK = numpy.sum(self.model._tclass_res_LN[:, m][:, None, None] * self.model._tclass_LSK, axis = 0)
-                rn_SK = numpy.sum(self.model._tclass_res_LN[:, n][:, None, None] * self.model._tclass_LSK, axis = 0)
+        # generate cluster projection: KL divergences of the instances' expected
+        # solver behavior distributions, sum(r_m * log(r_m / r_n)) for all pairs
+        r_NSK = numpy.tensordot(self.model._tclass_res_LN.T, self.model._tclass_LSK, 1)
+        r_NX = r_NSK.reshape((N, -1))
+        log_r_NX = numpy.log(r_NX)
 
-                self.similarity_NN[m, n] = numpy.sum(rm_SK * numpy.log(rm_SK / rn_SK))
+        self.similarity_NN = numpy.sum(r_NX * log_r_NX, axis = 1)[:, None] - numpy.dot(r_NX, log_r_NX.T)
 
-        self.projection_N2 = numpy.array(rpy2.robjects.r["cmdscale"](numpy2ri(1.0 - self.similarity_NN)))
+        # R is not thread-safe, calls of R functions have to hold the lock of the plots
+        with plots.global_lock:
+            self.projection_N2 = numpy.array(rpy2.robjects.r["cmdscale"](numpy2ri(1.0 - self.similarity_NN)))
 
         return self
@@ -10,12 +10,11 @@
     :license: MIT, see LICENSE for details.
 """
 import numpy, math
-from scipy.stats.mstats import mquantiles
 from itertools import izip
 
 from sqlalchemy.sql import select, and_, functions, not_, expression, literal
 
-from edacc import statistics
+from edacc import statistics, summary, selection
 
 
 def avg_point_biserial_correlation_ranking(db, experiment, instances):
@@ -30,76 +29,31 @@ def avg_point_biserial_correlation_ranking(db, experiment, instances):
     table = db.metadata.tables['ExperimentResults']
     c_solver_config_id = table.c['SolverConfig_idSolverConfig']
     c_result_time = table.c['resultTime']
-    c_experiment_id = table.c['Experiment_idExperiment']
     c_result_code = table.c['resultCode']
     c_status = table.c['status']
     c_instance_id = table.c['Instances_idInstance']
 
     s = select([c_solver_config_id, c_instance_id, c_result_time], \
-               and_(c_experiment_id == experiment.idExperiment, c_instance_id.in_(instance_ids),
+               and_(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids),
                     c_result_code.in_([1, -21, -22]),
                     c_status.in_([1, 21, 22]),
                )) \
         .select_from(table)
 
-    query_results = db.session.connection().execute(s)
+    query_results = db.read_session().connection().execute(s)
     solver_config_results = dict(
         [(s.idSolverConfig, dict([(i, list()) for i in instance_ids])) for s in experiment.solver_configurations])
     for row in query_results:
         solver_config_results[row[0]][row[1]].append(row[2])
 
-    def rank_simple(vector):
-        return sorted(range(len(vector)), key=vector.__getitem__)
-
-    def rankdata(a):
-        n = len(a)
-        ivec = rank_simple(a)
-        svec = [a[rank] for rank in ivec]
-        sumranks = 0
-        dupcount = 0
-        newarray = [0] * n
-        for i in xrange(n):
-            sumranks += i
-            dupcount += 1
-            if i == n - 1 or svec[i] != svec[i + 1]:
-                averank = sumranks / float(dupcount) + 1
-                for j in xrange(i - dupcount + 1, i + 1):
-                    newarray[ivec[j]] = averank
-                sumranks = 0
-                dupcount = 0
-        return newarray
-
-    def pointbiserialcorr(s1, s2):
-        """ Calculate the mean point biserial correlation of the RTDs of
-            the two given solvers on all instances of the experiment.
-            Only consider values where the statistical significance is large
-            enough (p-value < alpha = 0.05)
-        """
-        from scipy import stats
-
-        alpha = 0.05 # level of statistical significant difference
-        d = 0.0
-        num = 0
-        for i in instance_ids:
-            res1 = solver_config_results[s1.idSolverConfig][i]
-            res2 = solver_config_results[s2.idSolverConfig][i]
-            ranked_data = list(rankdata(res1 + res2))
-
-            r, p = stats.pointbiserialr([1] * len(res1) + [0] * len(res2), ranked_data)
-            # only take instances with significant differences into account
-            if p < alpha:
-                #print str(s1), str(s2), str(i), r, p
-                d += r
-                num += 1
-
-        if num > 0:
-            return d / num # return mean difference
-        else:
-            return 0 # s1 == s2
+    solver_configs = experiment.solver_configurations
+    correlations = statistics.point_biserial_matrix(
+        [[solver_config_results[sc.idSolverConfig][i] for sc in solver_configs] for i in instance_ids])
+    index_by_solver = dict((sc.idSolverConfig, index) for index, sc in enumerate(solver_configs))
 
     def comp(s1, s2):
         """ Comparator function for point biserial correlation based ranking."""
-        r = pointbiserialcorr(s1, s2)
+        r = correlations[index_by_solver[s1.idSolverConfig], index_by_solver[s2.idSolverConfig]]
         if r < 0:
             return 1
         elif r > 0:
@@ -108,7 +62,7 @@ def avg_point_biserial_correlation_ranking(db, experiment, instances):
             return 0
 
     # List of solvers sorted by their rank. Best solver first.
-    return list(sorted(experiment.solver_configurations, cmp=comp))
+    return list(sorted(solver_configs, cmp=comp))
 
 
 def number_of_solved_instances_ranking(db, experiment, instances, solver_configs, cost='resultTime', fixed_limit=None):
@@ -126,10 +80,8 @@ def number_of_solved_instances_ranking(db, experiment, instances, solver_configs
     table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
     c_solver_config_id = table.c['SolverConfig_idSolverConfig']
     c_result_time = table.c['resultTime']
-    c_experiment_id = table.c['Experiment_idExperiment']
     c_result_code = table.c['resultCode']
     c_status = table.c['status']
-    c_instance_id = table.c['Instances_idInstance']
     c_solver_config_id = table.c['SolverConfig_idSolverConfig']
     if cost == 'resultTime':
         cost_column = table.c['resultTime']
@@ -167,12 +119,13 @@ def number_of_solved_instances_ranking(db, experiment, instances, solver_configs
     results = {}
     if cost in ('resultTime', 'wallTime', 'cost'):
         s = select([c_solver_config_id, functions.sum(cost_column), functions.count()],
-                   and_(c_experiment_id == experiment.idExperiment, c_result_code.like(u'1%'), c_status == 1,
-                        c_instance_id.in_(instance_ids), c_solver_config_id.in_(solver_config_ids))) \
+                   and_(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                                 solver_config_ids),
+                        c_result_code.like(u'1%'), c_status == 1)) \
             .select_from(table) \
             .group_by(c_solver_config_id)
 
-        query_results = db.session.connection().execute(s)
+        query_results = db.read_session().connection().execute(s)
         for row in query_results:
             results[row[0]] = (row[1], row[2])
     else:
@@ -181,14 +134,15 @@ def number_of_solved_instances_ranking(db, experiment, instances, solver_configs
             table_has_prop_value)
 
         s = select([c_solver_config_id, cost_column],
-                   and_(c_experiment_id == experiment.idExperiment, c_result_code.like(u'1%'), c_status == 1,
-                        c_instance_id.in_(instance_ids), c_solver_config_id.in_(solver_config_ids))) \
+                   and_(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                                 solver_config_ids),
+                        c_result_code.like(u'1%'), c_status == 1)) \
             .select_from(table)
 
         sum_by_sc_id = dict((i, 0) for i in solver_config_ids)
         count_by_sc_id = dict((i, 0) for i in solver_config_ids)
 
-        query_results = db.session.connection().execute(s)
+        query_results = db.read_session().connection().execute(s)
         for row in query_results:
             sum_by_sc_id[row[0]] += float(row[1])
             count_by_sc_id[row[0]] += 1
@@ -285,23 +239,30 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
     from sqlalchemy import func, or_, not_
 
     property_limit = 0
-    if cost in ('resultTime', 'wallTime', 'cost'):
-        best_instance_runtimes = db.session.query(func.min(cost_property), db.ExperimentResult.Instances_idInstance) \
-            .filter(db.ExperimentResult.Experiment_idExperiment == experiment.idExperiment) \
+    if cost in ('resultTime', 'wallTime', 'cost') and not fixed_limit:
+        results_summary = summary.get_summary(db, experiment.idExperiment, cost)
+        best_instance_runtimes = []
+        for instance_id in instance_ids:
+            successful_costs = [results_summary.get(sc_id, instance_id).successful_costs for sc_id in
+                                solver_config_ids]
+            successful_costs = [c[0] for c in successful_costs if len(c)]
+            if successful_costs:
+                best_instance_runtimes.append((min(successful_costs), instance_id))
+    elif cost in ('resultTime', 'wallTime', 'cost'):
+        best_instance_runtimes = db.read_session().query(func.min(cost_property), db.ExperimentResult.Instances_idInstance) \
+            .filter(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                             solver_config_ids)) \
             .filter(result_code_column.like(u'1%')) \
-            .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
-            .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)) \
             .group_by(db.ExperimentResult.Instances_idInstance).all()
     else:
         s = select([cost_property, table.c['Instances_idInstance']], and_(
-            table.c['Experiment_idExperiment'] == experiment.idExperiment,
-            table.c['resultCode'].like(u'1%'),
-            table.c['Instances_idInstance'].in_(instance_ids),
-            table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids)
+            selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                     solver_config_ids),
+            table.c['resultCode'].like(u'1%')
         )).select_from(from_table)
 
         min_by_instance = dict((i, float("inf")) for i in instance_ids)
-        for row in db.session.connection().execute(s):
+        for row in db.read_session().connection().execute(s):
             property_limit = max(property_limit, float(row[0]))
             min_by_instance[row[1]] = min(min_by_instance[row[1]], float(row[0]))
 
@@ -343,11 +304,10 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
                 table.c['SolverConfig_idSolverConfig'],
                 table.c['Instances_idInstance']],
                and_(result_code_column.like(u'1%'),
-                    table.c['Instances_idInstance'].in_(instance_ids),
-                    table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
-                    table.c['Experiment_idExperiment'] == experiment.idExperiment,
+                    selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                             solver_config_ids),
                     status_column == 1)).select_from(from_table)
-    successful_runs = db.session.connection().execute(s)
+    successful_runs = db.read_session().connection().execute(s)
 
     vbs_uses_solver_count = dict((id, 0) for id in solver_config_ids)
     runs_by_solver_and_instance = {}
@@ -365,11 +325,10 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
         s = select([expression.label('cost', cost_column),
                     table.c['SolverConfig_idSolverConfig'],
                     table.c['Instances_idInstance']],
-                   and_(table.c['Instances_idInstance'].in_(instance_ids),
-                        table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
-                        table.c['Experiment_idExperiment'] == experiment.idExperiment,
+                   and_(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                                 solver_config_ids),
                         not_(status_column.in_((-1, 0))))).select_from(from_table)
-        finished_runs = db.session.connection().execute(s)
+        finished_runs = db.read_session().connection().execute(s)
         for run in finished_runs:
             if not finished_runs_by_solver_and_instance.has_key(run.SolverConfig_idSolverConfig):
                 finished_runs_by_solver_and_instance[run.SolverConfig_idSolverConfig] = {}
@@ -381,9 +340,8 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
     failed_runs_by_solver = dict((sc.idSolverConfig, list()) for sc in ranked_solvers)
     s = select([expression.label('cost', cost_column),
                 expression.label('cost_limit', cost_limit_column), table.c['SolverConfig_idSolverConfig']],
-               and_(table.c['Experiment_idExperiment'] == experiment.idExperiment,
-                    table.c['Instances_idInstance'].in_(instance_ids),
-                    table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
+               and_(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                             solver_config_ids),
                     and_(
                         or_(
                             status_column != 1,
@@ -392,7 +350,7 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
                         not_(status_column.in_([-1, 0]))
                     )
                )).select_from(from_table)
-    failed_runs = db.session.connection().execute(s)
+    failed_runs = db.read_session().connection().execute(s)
     for run in failed_runs:
         failed_runs_by_solver[run.SolverConfig_idSolverConfig].append(run)
 
@@ -434,6 +392,7 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
         avg_cv = 0.0
         avg_qcd = 0.0
         if calculate_avg_stddev:
+            from scipy.stats.mstats import mquantiles
             count = 0
             for instance in instance_ids:
                 if solver.idSolverConfig in finished_runs_by_solver_and_instance and \
@@ -469,78 +428,51 @@ def get_ranking_data(db, experiment, ranked_solvers, instances, calculate_par10,
     return data, vbs_uses_solver_count
 
 
+def graph_ranking(adjacency):
+    """ Ranks the vertices 0, ..., n-1 of the graph given by the n x n boolean
+        adjacency array, an edge i -> j means that i is at least as good as j.
+        The strongly connected components of the graph are ranked equally,
+        they are returned as list of lists of vertices in topological order
+        of the condensed graph (components without incoming edges first).
+        Ties of the topological order and the vertices of a component are
+        ordered by vertex.
+    """
+    from scipy.sparse import csgraph
+
+    n = len(adjacency)
+    if n == 0: return []
+    num_components, labels = csgraph.connected_components(numpy.asarray(adjacency, dtype=bool),
+                                                          directed=True, connection='strong')
+    components = [[] for _ in xrange(num_components)]
+    for v, label in enumerate(labels):
+        components[label].append(v)
+
+    # condensed graph and its topological order, one layer of sources at a time
+    condensed = numpy.zeros((num_components, num_components), dtype=bool)
+    rows, columns = numpy.nonzero(adjacency)
+    condensed[labels[rows], labels[columns]] = True
+    numpy.fill_diagonal(condensed, False)
+    in_degrees = condensed.sum(axis=0)
+    remaining = numpy.ones(num_components, dtype=bool)
+    order = []
+    while remaining.any():
+        sources = numpy.flatnonzero(remaining & (in_degrees == 0))
+        order.extend(sorted(sources, key=lambda c: components[c][0]))
+        remaining[sources] = False
+        in_degrees -= condensed[sources].sum(axis=0)
+    return [components[c] for c in order]
+
+
 def ranking_from_graph(M, edges, vertices, solver_config_ids):
     """Determine the ranking of the solvers with IDs given in solver_config_ids and vertices
     and the graph described by the adjacency matrix M and list of edges. Returns a list of
     lists of solver config IDs. Each list holds the solvers that are ranked equally.
     """
-    outedges_by_node = dict((v, list()) for v in vertices)
-    for e in edges:
-        outedges_by_node[e[0]].append(e)
-
-    indices = dict((v, -1) for v in vertices)
-    lowlinks = indices.copy()
-    index = 0
-    stack = []
-    connected_components = []
-
-    def strongly_connected(v, index):
-        indices[v] = index
-        lowlinks[v] = index
-        index += 1
-        stack.append(v)
-
-        for v, w in outedges_by_node[v]:
-            if indices[w] < 0:
-                strongly_connected(w, index)
-                lowlinks[v] = min(lowlinks[v], lowlinks[w])
-            elif w in stack:
-                lowlinks[v] = min(lowlinks[v], indices[w])
-
-        if indices[v] == lowlinks[v]:
-            connected_components.append([])
-            while stack[-1] != v:
-                connected_components[-1].append(stack.pop())
-            connected_components[-1].append(stack.pop())
-
-    for v in vertices:
-        if indices[v] < 0:
-            strongly_connected(v, index)
-
-    scc_edges = set()
-    for comp in connected_components:
-        for s1 in comp:
-            for s2 in solver_config_ids:
-                if s1 == s2: continue
-                if M[s1][s2] == 1 and s2 not in comp:
-                    scc_edges.add((frozenset(comp), frozenset([c for c in connected_components if s2 in c][0])))
-
-    def topological_sort():
-        l = []
-        visited = set()
-        s = set()
-        for comp in connected_components:
-            outgoingEdges = False
-            for edge in scc_edges:
-                if frozenset(edge[0]) == frozenset(comp): outgoingEdges = True
-            if not outgoingEdges:
-                s.add(frozenset(comp))
-
-        def visit(n):
-            if n not in visited:
-                visited.add(n)
-                for edge in scc_edges:
-                    if frozenset(edge[1]) == frozenset(n):
-                        visit(frozenset(edge[0]))
-                l.append(list(n))
-
-        for n in s:
-            visit(n)
-        return l
-
-    l = topological_sort()
-
-    return l
+    index_by_id = dict((v, i) for i, v in enumerate(solver_config_ids))
+    adjacency = numpy.zeros((len(solver_config_ids), len(solver_config_ids)), dtype=bool)
+    for s1, s2 in edges:
+        adjacency[index_by_id[s1], index_by_id[s2]] = True
+    return [[solver_config_ids[i] for i in comp] for comp in graph_ranking(adjacency)]
 
 
 def survival_ranking(db, experiment, instances, solver_configs, results, cost="resultTime", a=0.00, alpha=0.05):
@@ -668,48 +600,82 @@ def survival_ranking(db, experiment, instances, solver_configs, results, cost="r
     # find strongly connected components and sort topologically
     l_surv = ranking_from_graph(M_surv, edges_surv, vertices, solver_config_ids)
 
+    # Order the solvers of each component by the significant differences. The
+    # edges sc1 -> sc2 of a component at significance level alpha are the
+    # pairs with p-value > alpha (in both directions) and the pairs where sc1
+    # is better with p-value <= alpha. Going through the sorted p-values,
+    # the component graph can only become acyclic once no pair is left
+    # with edges in both directions, i.e. at its largest p-value. It is
+    # acyclic then if the "better" relation is transitive, in which case
+    # the solvers have 0, ..., k-1 wins and are ordered by them.
     for comp in l_surv:
-        comp_p_values = set([1]) # always include alpha 1
-        for sc1 in comp:
-            for sc2 in comp:
-                comp_p_values.add(p_values[(sc1, sc2)])
-
-        #print "SC:", [sc_by_id[sc].name for sc in comp], "p-values:", comp_p_values
-
-        for alpha in sorted(comp_p_values):
-            edges_comp = set()
-            M_comp = dict()
-            for sc1 in comp:
-                M_comp[sc1] = dict()
-                for sc2 in comp:
-                    if sc1 == sc2:
-                        M_surv[sc1][sc2] = 0
-                        continue
-
-                    M_comp[sc1][sc2] = 0
-                    if p_values[(sc1, sc2)] <= alpha:
-                        if better_solver[(sc1, sc2)]:
-                            M_comp[sc1][sc2] = 1
-                        else:
-                            M_comp[sc1][sc2] = 0
-                    else:
-                        M_comp[sc1][sc2] = 1
-
-                    if M_comp[sc1][sc2] == 1:
-                        edges_comp.add((sc1, sc2))
+        if len(comp) < 2: continue
+        comp_p_values = numpy.array([[p_values[(sc1, sc2)] for sc2 in comp] for sc1 in comp], dtype=float)
+        numpy.fill_diagonal(comp_p_values, 1)
+        if numpy.isnan(comp_p_values).any(): continue
 
-            l_comp = ranking_from_graph(M_comp, edges_comp, set(comp), comp)
-
-            if len(l_comp) == len(comp):
-                flattened = [i[0] for i in l_comp]
-                comp.sort(key=lambda x: flattened.index(x))
-                #print "alpha", alpha, "SCs: ", [[sc_by_id[sc].name for sc in c] for c in l_comp]
-                break
+        wins = dict((sc1, sum(1 for sc2 in comp if sc1 != sc2 and better_solver[(sc1, sc2)])) for sc1 in comp)
+        if sorted(wins.values()) == range(len(comp)):
+            comp.sort(key=lambda sc: wins[sc], reverse=True)
 
     return [[sc_by_id[sc] for sc in comp_surv] for comp_surv in
             l_surv], survival_winner, M_surv, p_values, tests_performed, dot_code, count_values_tied
 
 
+# maximum number of run comparisons of a block of solver configurations
+# in careful_raw_scores, bounds the size of the temporary arrays
+CAREFUL_BLOCK_SIZE = 1 << 22
+
+
+def _aligned_runs(results, instance_ids, solver_config_ids):
+    """ Packs the PAR1 times and censor flags of the runs in `results` into
+        (instances * runs) x solver configurations arrays. The i-th runs of
+        the solver configurations on an instance share a row, `valid` marks
+        the entries that hold a run.
+        Returns the tuple (times, censored, valid).
+    """
+    num_runs = max([len(results[i][s]) for i in instance_ids for s in solver_config_ids] or [0])
+    shape = (len(instance_ids), num_runs, len(solver_config_ids))
+    times = numpy.zeros(shape)
+    censored = numpy.zeros(shape, dtype=bool)
+    valid = numpy.zeros(shape, dtype=bool)
+    for i, idInstance in enumerate(instance_ids):
+        for j, idSolverConfig in enumerate(solver_config_ids):
+            runs = results[idInstance][idSolverConfig]
+            times[i, :len(runs), j] = [r.penalized_time1 for r in runs]
+            censored[i, :len(runs), j] = [r.censored for r in runs]
+            valid[i, :len(runs), j] = True
+    shape = (len(instance_ids) * num_runs, len(solver_config_ids))
+    return times.reshape(shape), censored.reshape(shape), valid.reshape(shape)
+
+
+def careful_raw_scores(times, censored, valid, alpha):
+    """ Raw scores of the careful ranking as solver configurations x solver
+        configurations array. raw[i, j] is the number of paired runs solver
+        configuration i won against j minus the number it lost. A run
+        wins against a censored run and an uncensored run against another
+        one if its time is below the tie zone (e - alpha * sqrt(e), where e
+        is the mean of both times). The arguments are the arrays returned by
+        _aligned_runs.
+    """
+    rows, num_solvers = times.shape
+    raw = numpy.zeros((num_solvers, num_solvers), dtype=int)
+    block = max(1, CAREFUL_BLOCK_SIZE // max(1, rows * num_solvers))
+    t2, c2, v2 = times[:, None, :], censored[:, None, :], valid[:, None, :]
+    for start in xrange(0, num_solvers, block):
+        t1 = times[:, start:start + block, None]
+        c1 = censored[:, start:start + block, None]
+        v1 = valid[:, start:start + block, None]
+        e = (t1 + t2) / 2.0
+        tie_zone = e - alpha * numpy.sqrt(e)
+        uncensored = ~c1 & ~c2
+        wins = v1 & v2 & ((~c1 & c2) | (uncensored & (t1 < tie_zone)))
+        losses = v1 & v2 & ((c1 & ~c2) | (uncensored & (t2 < tie_zone)))
+        raw[start:start + block] = wins.sum(axis=0) - losses.sum(axis=0)
+    numpy.fill_diagonal(raw, 0)
+    return raw
+
+
 def careful_ranking(db, experiment, instances, solver_configs, results, cost="resultTime", noise=1.0, break_ties=False):
     instance_ids = [i.idInstance for i in instances]
     solver_config_ids = [s.idSolverConfig for s in solver_configs]
@@ -718,65 +684,19 @@ def careful_ranking(db, experiment, instances, solver_configs, results, cost="re
         sc_by_id[sc.idSolverConfig] = sc
 
     alpha = math.sqrt(noise / 2.0)
+    raw_matrix = careful_raw_scores(*_aligned_runs(results, instance_ids, solver_config_ids), alpha=alpha)
     raw = dict()
-    for s1 in solver_config_ids:
-        for s2 in solver_config_ids:
-            if (s1, s2) in raw: continue
-            raw[(s1, s2)] = 0
-            raw[(s2, s1)] = 0
-            if s1 == s2: continue
-            #print "Comparing ", sc_by_id[s1].name, " and ", sc_by_id[s2].name
+    for i, s1 in enumerate(solver_config_ids):
+        for j, s2 in enumerate(solver_config_ids):
+            raw[(s1, s2)] = int(raw_matrix[i, j])
 
-            for idInstance in instance_ids:
-                for r1, r2 in izip(results[idInstance][s1], results[idInstance][s2]):
-                    #print (str(r1.penalized_time1) + ("+" if r1.censored else "")), "vs.", (str(r2.penalized_time1) + ("+" if r2.censored else "")),
-
-                    if r1.censored and r2.censored:
-                        #print " .. tied"
-                        continue
-                    elif r1.censored and not r2.censored:
-                        #print " uncensored wins"
-                        raw[(s2, s1)] += 1
-                        raw[(s1, s2)] -= 1
-                        continue
-                    elif not r1.censored and r2.censored:
-                        #print " uncensored wins"
-                        raw[(s1, s2)] += 1
-                        raw[(s2, s1)] -= 1
-                        continue
-
-                    e1 = (r1.penalized_time1 + r2.penalized_time1) / 2.0
-                    delta = alpha * math.sqrt(e1)
-                    #print "Tiezone: [", e1 - delta, ",", e1 + delta, "]",
-                    if r1.penalized_time1 < e1 - delta:
-                        #print r1.penalized_time1, "<", e1 - delta
-                        raw[(s1, s2)] += 1
-                        raw[(s2, s1)] -= 1
-                    elif r2.penalized_time1 < e1 - delta:
-                        #print r2.penalized_time1, "<", e1 - delta
-                        raw[(s2, s1)] += 1
-                        raw[(s1, s2)] -= 1
-                        #else:
-                        #print " .. tied"
-
-    edges = set()
-
-    vertices = set(solver_config_ids)
+    adjacency = raw_matrix >= 0
+    numpy.fill_diagonal(adjacency, False)
     M = dict()
-    for s1 in solver_config_ids:
-        M[s1] = dict()
-        for s2 in solver_config_ids:
-            if s1 == s2:
-                M[s1][s2] = 0
-                continue
-            M[s1][s2] = 1 if raw[(s1, s2)] >= 0 else 0
-            if M[s1][s2] == 1:
-                edges.add((s1, s2))
-                #elif M[s1][s2] == 0.5:
-                #    edges.add((s1, s2))
-                #    edges.add((s2, s1))
-
-    l = ranking_from_graph(M, edges, vertices, solver_config_ids)
+    for i, s1 in enumerate(solver_config_ids):
+        M[s1] = dict((s2, int(adjacency[i, j])) for j, s2 in enumerate(solver_config_ids))
+
+    l = [[solver_config_ids[i] for i in comp] for comp in graph_ranking(adjacency)]
 
     if break_ties:
         tie_break = dict()
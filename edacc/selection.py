@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.selection
+    ---------------
+
+    Filters of the ExperimentResults table by the instances and solver
+    configurations the user selected. Short ID lists are passed as IN lists.
+    If the selection contains all instances (solver configurations) of the
+    experiment, the filter is left out because jobs only exist for the
+    instances and solver configurations of their experiment. Other long
+    lists are loaded into a temporary table of the session's connection and
+    the query selects from it, so the statements stay small and MySQL can
+    use the (Experiment, SolverConfig, Instance) indexes.
+
+    Selection tables are named after a hash of their IDs and kept per
+    connection (least recently used ones are dropped), so repeated queries
+    with the same selection reuse them. MySQL can only refer to a temporary
+    table once per statement, so every statement may only filter once by
+    the same selection.
+
+    The forms pass selections as repeated query arguments (i, sc and i1,
+    i2, ... for instance groups). Large selections can be stored under a
+    short ID instead (store_selection), which requests pass as
+    selection=<ID>. The stored selections are files in
+    config.SELECTION_DIR, one directory per database, and are never
+    changed because the ID is a hash of their content. Selections that
+    weren't used for config.SELECTION_MAX_AGE seconds and the least recently
+    used ones beyond config.SELECTION_MAX_FILES per database are deleted
+    (cleanup_selections). For the same reason
+    memoized views use the ID instead of the IDs it stands for as cache key
+    (cache_key, args_cache_key).
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from threading import RLock
+
+from sqlalchemy.sql import select, and_, table, column
+
+from edacc import config, lru
+
+# query arguments that hold instance or solver configuration IDs
+SELECTION_ARGUMENT = re.compile(r'^(i\d*|sc)$')
+SELECTION_ID = re.compile(r'^[0-9a-f]{16}$')
+
+# seconds between two cleanups of the stored selections of a database by a process
+CLEANUP_INTERVAL = 60 * 60
+
+_lock = RLock()
+# database name -> time of the last cleanup of its stored selections
+_cleanups = dict()
+# (database name, selection ID) -> stored selection
+_selections = lru.LRUCache(lambda: config.SELECTION_CACHE_SIZE)
+
+
+def _experiment_ids(db, session, experiment_id, kind):
+    if kind == 'instances':
+        t = db.metadata.tables['Experiment_has_Instances']
+        s = select([t.c['Instances_idInstance']], t.c['Experiment_idExperiment'] == experiment_id)
+    else:
+        t = db.metadata.tables['SolverConfig']
+        s = select([t.c['idSolverConfig']], t.c['Experiment_idExperiment'] == experiment_id)
+    return set(r[0] for r in session.connection().execute(s))
+
+
+def selection_table(session, kind, ids):
+    """ Returns a select of the IDs from a temporary table of the session's
+        connection, creating the table if the connection doesn't have it yet.
+    """
+    connection = session.connection()
+    ids = sorted(set(ids))
+    name = 'selection_%s_%s' % (kind, hashlib.md5(','.join(str(i) for i in ids)).hexdigest()[:16])
+    tables = connection.info.get('selection_tables')
+    if tables is None:
+        tables = connection.info['selection_tables'] = \
+            lru.LRUCache(lambda: config.SELECTION_TABLES_PER_CONNECTION, by_database=False)
+    selection = table(name, column('id'))
+    # get marks a table the connection has as recently used
+    if not tables.get(name):
+        # MEMORY tables aren't transactional, the rows survive a rollback like the table itself
+        connection.execute('DROP TEMPORARY TABLE IF EXISTS %s' % name)
+        connection.execute('CREATE TEMPORARY TABLE %s (id INT NOT NULL PRIMARY KEY) ENGINE=MEMORY' % name)
+        for start in xrange(0, len(ids), config.SELECTION_INSERT_BATCH_SIZE):
+            connection.execute(selection.insert(),
+                               [{'id': i} for i in ids[start:start + config.SELECTION_INSERT_BATCH_SIZE]])
+        for dropped, _ in tables.put(name, True):
+            connection.execute('DROP TEMPORARY TABLE IF EXISTS %s' % dropped)
+    return select([selection.c.id])
+
+
+def id_filter(db, session, experiment_id, id_column, kind, ids):
+    """ Returns the filter clause id_column IN ids (kind is 'instances' or
+        'solver_configs') or None if it is not needed because ids are all
+        IDs of the kind in the experiment.
+    """
+    ids = list(ids)
+    if len(ids) <= config.SELECTION_IN_LIST_LIMIT:
+        return id_column.in_(ids)
+    if set(ids) == _experiment_ids(db, session, experiment_id, kind):
+        return None
+    if session.connection().dialect.name != 'mysql':
+        return id_column.in_(ids)
+    return id_column.in_(selection_table(session, kind, ids))
+
+
+def results_filter(db, session, experiment_id, instance_ids=None, solver_config_ids=None):
+    """ Returns the clause that restricts the ExperimentResults table to the
+        jobs of the experiment on the given instances and solver
+        configurations (None: all of them). Use it in statements executed
+        with `session`.
+    """
+    t = db.metadata.tables['ExperimentResults']
+    clauses = [t.c['Experiment_idExperiment'] == experiment_id]
+    if instance_ids is not None:
+        clauses.append(id_filter(db, session, experiment_id, t.c['Instances_idInstance'], 'instances',
+                                 instance_ids))
+    if solver_config_ids is not None:
+        clauses.append(id_filter(db, session, experiment_id, t.c['SolverConfig_idSolverConfig'],
+                                 'solver_configs', solver_config_ids))
+    return and_(*[c for c in clauses if c is not None])
+
+
+def _selection_file(database, selection_id):
+    return os.path.join(config.SELECTION_DIR, database, selection_id + '.json')
+
+
+def _touch(filename):
+    """ Marks the stored selection file as used. """
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+
+
+def cleanup_selections(database):
+    """ Deletes the stored selections of the database that weren't used for
+        config.SELECTION_MAX_AGE seconds and the least recently used ones
+        beyond config.SELECTION_MAX_FILES.
+    """
+    directory = os.path.join(config.SELECTION_DIR, database)
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    except OSError:
+        return
+    files = []
+    for name in names:
+        try:
+            files.append((os.path.getmtime(os.path.join(directory, name)), name))
+        except OSError:
+            pass
+    files.sort(reverse=True)
+    oldest = time.time() - config.SELECTION_MAX_AGE
+    for n, (modified, name) in enumerate(files):
+        if n >= config.SELECTION_MAX_FILES or modified < oldest:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def store_selection(database, ids_by_argument):
+    """ Stores the selection, a dictionary that maps query argument names
+        (i, sc, i1, ...) to lists of IDs, and returns its ID. Raises
+        ValueError if the IDs aren't integers or there are more than
+        config.SELECTION_MAX_IDS of them.
+    """
+    ids_by_argument = dict((name, [int(i) for i in ids]) for name, ids in ids_by_argument.iteritems()
+                           if SELECTION_ARGUMENT.match(name))
+    if sum(len(ids) for ids in ids_by_argument.itervalues()) > config.SELECTION_MAX_IDS:
+        raise ValueError('Selections can contain at most %d IDs' % config.SELECTION_MAX_IDS)
+    content = json.dumps(ids_by_argument, sort_keys=True, separators=(',', ':'))
+    selection_id = hashlib.sha1(content).hexdigest()[:16]
+    filename = _selection_file(database, selection_id)
+    if not os.path.exists(filename):
+        try:
+            os.makedirs(os.path.dirname(filename))
+        except OSError:
+            pass
+        # write to a temporary file first, concurrent readers never see a partial selection
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.rename(temporary, filename)
+        with _lock:
+            cleanup = time.time() - _cleanups.get(database, 0) > CLEANUP_INTERVAL
+            if cleanup: _cleanups[database] = time.time()
+        if cleanup: cleanup_selections(database)
+    else:
+        _touch(filename)
+    _selections.put((database, selection_id), ids_by_argument)
+    return selection_id
+
+
+def load_selection(database, selection_id):
+    """ Returns the stored selection with the given ID as dictionary
+        argument name -> list of IDs or None if there is no such selection.
+    """
+    if not SELECTION_ID.match(selection_id or ''): return None
+    key = (database, selection_id)
+    filename = _selection_file(database, selection_id)
+    ids_by_argument = _selections.get(key)
+    if ids_by_argument is not None:
+        _touch(filename)
+        return ids_by_argument
+    try:
+        with open(filename) as f:
+            ids_by_argument = json.load(f)
+    except (IOError, ValueError):
+        return None
+    _touch(filename)
+    ids_by_argument = dict((str(name), ids) for name, ids in ids_by_argument.iteritems())
+    _selections.put(key, ids_by_argument)
+    return ids_by_argument
+
+
+def expand_arguments(args, ids_by_argument):
+    """ Returns the list of (name, value) pairs of the query arguments args
+        (a MultiDict) with the selection argument replaced by the arguments
+        of the stored selection ids_by_argument.
+    """
+    items = [(name, value) for name, value in args.items(multi=True)
+             if name != 'selection' and name not in ids_by_argument]
+    for name in sorted(ids_by_argument):
+        items.extend((name, str(i)) for i in ids_by_argument[name])
+    return items
+
+
+def cache_key(ids, name, stored_selection):
+    """ Returns the cache key of the IDs passed as query argument `name`:
+        the ID of the stored selection they came from or the IDs themselves
+        if the request didn't pass them as stored selection.
+        stored_selection is the tuple (selection ID, stored selection) of
+        the request or None.
+    """
+    if stored_selection is not None:
+        selection_id, ids_by_argument = stored_selection
+        if name in ids_by_argument and set(ids) == set(ids_by_argument[name]):
+            return 'selection:%s:%s' % (selection_id, name)
+    return ids
+
+
+def args_cache_key(args, stored_selection):
+    """ Returns the cache key of the query arguments args (a MultiDict), the
+        arguments of a stored selection are replaced by its ID.
+    """
+    if stored_selection is None: return args
+    selection_id, ids_by_argument = stored_selection
+    return tuple(sorted((name, value) for name, value in args.items(multi=True) if name not in ids_by_argument)) + \
+           (('selection', selection_id),)
+
+
+def query_string(database, args):
+    """ Returns the query arguments args (a MultiDict) as query string for
+        the plot and download links of a page. Selections of more than
+        config.SELECTION_URL_MAX_IDS IDs are stored and passed by their ID.
+    """
+    items = args.items(multi=True)
+    ids_by_argument = dict()
+    for name, value in items:
+        if SELECTION_ARGUMENT.match(name):
+            ids_by_argument.setdefault(name, []).append(value)
+    if sum(len(ids) for ids in ids_by_argument.itervalues()) > config.SELECTION_URL_MAX_IDS:
+        try:
+            selection_id = store_selection(database, ids_by_argument)
+        except (ValueError, OSError, IOError):
+            # pass the IDs inline if the selection can't be stored, e.g. SELECTION_DIR isn't writable
+            pass
+        else:
+            items = [(name, value) for name, value in items if name not in ids_by_argument] + \
+                    [('selection', selection_id)]
+    return "&".join(['='.join(list(t)) for t in items])
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.snapshot
+    --------------
+
+    Export of a single experiment into a local SQLite database file, called
+    snapshot. Snapshots contain the experiment's results, solver
+    configurations, instance metadata (without the instance files), properties
+    and result/status codes and can be served read-only by the web frontend
+    without a MySQL server, see models.add_database and
+    config.DEFAULT_SNAPSHOTS.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import os
+
+from sqlalchemy import create_engine, MetaData, schema, types
+from sqlalchemy.dialects.mysql import BIT
+from sqlalchemy.sql import select
+
+# Tables that are exported completely. They are small and referenced by
+# the experiment's data.
+FULL_TABLES = ('DBConfiguration', 'ResultCodes', 'StatusCodes', 'Property', 'PropertyValueType',
+               'instanceClass', 'CompetitionCategory', 'gridQueue')
+
+# (table, column, referenced table, referenced column): a row of table is
+# exported if its value of column is one of the exported values of the
+# referenced column. The experiment itself is the root of these relations
+# and referenced tables have to be listed before the tables referencing them.
+EXPORT_RELATIONS = (
+    ('ExperimentResults', 'Experiment_idExperiment', 'Experiment', 'idExperiment'),
+    ('ExperimentResult_has_Property', 'idExperimentResults', 'ExperimentResults', 'idJob'),
+    ('ExperimentResult_has_PropertyValue', 'idExperimentResult_has_Property',
+     'ExperimentResult_has_Property', 'idExperimentResult_has_Property'),
+    ('Experiment_has_Instances', 'Experiment_idExperiment', 'Experiment', 'idExperiment'),
+    ('Instances', 'idInstance', 'Experiment_has_Instances', 'Instances_idInstance'),
+    ('Instance_has_Property', 'idInstance', 'Instances', 'idInstance'),
+    ('Instances_has_instanceClass', 'Instances_idInstance', 'Instances', 'idInstance'),
+    ('SolverConfig', 'Experiment_idExperiment', 'Experiment', 'idExperiment'),
+    ('SolverConfig_has_Parameters', 'SolverConfig_idSolverConfig', 'SolverConfig', 'idSolverConfig'),
+    ('SolverBinaries', 'idSolverBinary', 'SolverConfig', 'SolverBinaries_idSolverBinary'),
+    ('Solver', 'idSolver', 'SolverBinaries', 'idSolver'),
+    ('Parameters', 'Solver_idSolver', 'Solver', 'idSolver'),
+    ('ParameterGraph', 'Solver_idSolver', 'Solver', 'idSolver'),
+    ('ConfigurationScenario', 'Experiment_idExperiment', 'Experiment', 'idExperiment'),
+    ('ConfigurationScenario_has_Parameters', 'ConfigurationScenario_idConfigurationScenario',
+     'ConfigurationScenario', 'idConfigurationScenario'),
+)
+
+# Large binary columns that are not exported, the columns are NULL in snapshots
+EXCLUDED_COLUMNS = {
+    'Instances': ('instance',),
+    'Solver': ('code', 'description_pdf'),
+    'SolverBinaries': ('binaryArchive',),
+}
+
+# Indexes created in snapshots, matching the access patterns of the analysis
+# and plotting functions
+SNAPSHOT_INDEXES = (
+    ('ExperimentResults', ('Experiment_idExperiment', 'SolverConfig_idSolverConfig', 'Instances_idInstance')),
+    ('ExperimentResults', ('Experiment_idExperiment', 'Instances_idInstance')),
+    ('ExperimentResults', ('Experiment_idExperiment', 'date_modified')),
+    ('ExperimentResult_has_Property', ('idExperimentResults', 'idProperty')),
+    ('ExperimentResult_has_PropertyValue', ('idExperimentResult_has_Property',)),
+    ('Experiment_has_Instances', ('Experiment_idExperiment', 'Instances_idInstance')),
+    ('Instance_has_Property', ('idInstance', 'idProperty')),
+    ('Instances_has_instanceClass', ('Instances_idInstance',)),
+    ('SolverConfig', ('Experiment_idExperiment',)),
+    ('SolverConfig_has_Parameters', ('SolverConfig_idSolverConfig', 'Parameters_idParameter')),
+)
+
+# number of key values per query and number of rows per insert statement
+CHUNK_SIZE = 1000
+
+
+def portable_type(column_type):
+    """ Returns a generic SQLAlchemy type instance that can be used in SQLite
+        for the given (MySQL) column type.
+    """
+    if isinstance(column_type, types.Boolean):
+        return types.Boolean()
+    if isinstance(column_type, (types.Integer, BIT)):
+        return types.Integer()
+    if isinstance(column_type, (types.Float, types.Numeric)):
+        return types.Float()
+    if isinstance(column_type, types.DateTime):
+        return types.DateTime()
+    if isinstance(column_type, types.Date):
+        return types.Date()
+    if isinstance(column_type, types.Time):
+        return types.Time()
+    if isinstance(column_type, types.String):
+        return types.Text()
+    return types.LargeBinary()
+
+
+def create_schema(source_metadata, engine):
+    """ Creates all tables of `source_metadata` in the database of `engine`,
+        including foreign keys and the indexes in SNAPSHOT_INDEXES.
+        All columns but the primary keys are nullable. Returns the new
+        metadata.
+    """
+    metadata = MetaData(bind=engine)
+    for source_table in source_metadata.sorted_tables:
+        columns = []
+        for column in source_table.columns:
+            foreign_keys = [schema.ForeignKey(fk.target_fullname) for fk in column.foreign_keys]
+            columns.append(schema.Column(column.name, portable_type(column.type), *foreign_keys,
+                                         primary_key=column.primary_key, nullable=True,
+                                         autoincrement=False))
+        schema.Table(source_table.name, metadata, *columns)
+
+    for table_name, column_names in SNAPSHOT_INDEXES:
+        if table_name not in metadata.tables: continue
+        table = metadata.tables[table_name]
+        if not all(name in table.c for name in column_names): continue
+        schema.Index('idx_%s_%s' % (table_name, '_'.join(column_names)), *[table.c[name] for name in column_names])
+
+    metadata.create_all()
+    return metadata
+
+
+def copy_rows(source_connection, source_table, destination_connection, destination_table, whereclause=None):
+    """ Copies the rows of `source_table` matching `whereclause` into
+        `destination_table` and returns them. Columns listed in
+        EXCLUDED_COLUMNS are left NULL.
+    """
+    excluded = EXCLUDED_COLUMNS.get(source_table.name, ())
+    columns = [c for c in source_table.columns if c.name not in excluded]
+    rows = source_connection.execute(select(columns, whereclause)).fetchall()
+    for start in xrange(0, len(rows), CHUNK_SIZE):
+        destination_connection.execute(destination_table.insert(),
+                                       [dict((c.name, row[c.name]) for c in columns)
+                                        for row in rows[start:start + CHUNK_SIZE]])
+    return rows
+
+
+def export_experiment(db, experiment_id, filename):
+    """ Exports the experiment with the given ID from the EDACC database `db`
+        into a new SQLite database file `filename`. An existing file with this
+        name is replaced. Returns a dictionary with the number of exported
+        rows per table.
+    """
+    if db.session.query(db.Experiment).get(experiment_id) is None:
+        raise ValueError("Experiment with ID %d does not exist" % experiment_id)
+
+    if os.path.exists(filename):
+        os.remove(filename)
+    engine = create_engine('sqlite:///' + os.path.abspath(filename))
+    metadata = create_schema(db.metadata, engine)
+
+    source_connection = db.read_session().connection()
+    destination_connection = engine.connect()
+    transaction = destination_connection.begin()
+    try:
+        exported_rows = {}
+        for table_name in FULL_TABLES:
+            if table_name not in db.metadata.tables: continue
+            exported_rows[table_name] = copy_rows(source_connection, db.metadata.tables[table_name],
+                                                  destination_connection, metadata.tables[table_name])
+
+        experiment_table = db.metadata.tables['Experiment']
+        exported_rows['Experiment'] = copy_rows(source_connection, experiment_table,
+                                                destination_connection, metadata.tables['Experiment'],
+                                                experiment_table.c['idExperiment'] == experiment_id)
+
+        for table_name, column, referenced_table, referenced_column in EXPORT_RELATIONS:
+            if table_name not in db.metadata.tables: continue
+            source_table = db.metadata.tables[table_name]
+            keys = sorted(set(row[referenced_column] for row in exported_rows.get(referenced_table, [])
+                              if row[referenced_column] is not None))
+            rows = []
+            for start in xrange(0, len(keys), CHUNK_SIZE):
+                rows += copy_rows(source_connection, source_table, destination_connection,
+                                  metadata.tables[table_name],
+                                  source_table.c[column].in_(keys[start:start + CHUNK_SIZE]))
+            exported_rows[table_name] = rows
+
+        transaction.commit()
+    except:
+        transaction.rollback()
+        raise
+    finally:
+        destination_connection.close()
+        engine.dispose()
+
+    return dict((table_name, len(rows)) for table_name, rows in exported_rows.iteritems())
@@ -9,13 +9,35 @@
     :license: MIT, see LICENSE for details.
 """
 
-from rpy2 import robjects
-from rpy2.robjects.packages import importr
+import numpy
 
-r_stats = importr('stats')
-importr('splines')
-importr('survival')
-importr('surv2sample')
+from edacc import instrumentation
+
+
+def _load_r():
+    """ Starts the embedded R interpreter and loads the R packages used
+        by the functions of this module.
+    """
+    from rpy2 import robjects
+    from rpy2.robjects.packages import importr
+
+    r_stats = importr('stats')
+    importr('splines')
+    importr('survival')
+    importr('surv2sample')
+    return robjects, r_stats
+
+
+def _r():
+    """ Returns the tuple (robjects, r_stats). R is only loaded on first use
+        so processes that never compute statistics don't pay for it.
+    """
+    return instrumentation.load_backend('R (statistics)', _load_r)
+
+
+# maximum number of CDF comparisons of a block of vectors in
+# prob_domination_matrix, bounds the size of the temporary arrays
+DOMINATION_BLOCK_SIZE = 1 << 22
 
 
 def prob_domination(v1, v2):
@@ -29,23 +51,43 @@ def prob_domination(v1, v2):
 
         2) :math:`\exists t: P(RT_A \le t) > P(RT_B \le t)`
     """
+    return int(prob_domination_matrix([v1, v2])[0, 1])
 
-    ecdf1 = robjects.r.ecdf(robjects.FloatVector(v1))
-    ecdf2 = robjects.r.ecdf(robjects.FloatVector(v2))
-    paired = zip([ecdf1(x)[0] for x in v1 + v2], [ecdf2(x)[0] for x in v1 + v2])
 
-    if all(a >= b for a, b in paired) and any(a > b for a, b in paired):
-        return 1
-    if all(b >= a for a, b in paired) and any(b > a for a, b in paired):
-        return -1
+def prob_domination_matrix(vectors):
+    """ Calculates the probabilistic domination relation (see
+        prob_domination) of all pairs of the runtimes vectors at once.
+        Returns a k x k integer array D for k vectors where D[a, b] is 1 if
+        vector a dominates vector b, -1 if b dominates a and 0 if there are
+        crossovers. Rows and columns of empty vectors are 0.
+    """
+    vectors = [numpy.sort(numpy.asarray(v, dtype=float)) for v in vectors]
+    k = len(vectors)
+    points = numpy.concatenate(vectors) if k else numpy.zeros(0)
+    # ecdf[a, t]: empirical CDF of vector a at every point of all vectors
+    ecdf = numpy.zeros((k, len(points)))
+    for a, v in enumerate(vectors):
+        if len(v): ecdf[a] = numpy.searchsorted(v, points, side='right') / float(len(v))
 
-    return 0
+    a_ge_b = numpy.zeros((k, k), dtype=bool)
+    a_gt_b = numpy.zeros((k, k), dtype=bool)
+    block = max(1, DOMINATION_BLOCK_SIZE // max(1, k * len(points)))
+    for start in xrange(0, k, block):
+        rows = ecdf[start:start + block, None, :]
+        a_ge_b[start:start + block] = (rows >= ecdf[None, :, :]).all(axis=2)
+        a_gt_b[start:start + block] = (rows > ecdf[None, :, :]).any(axis=2)
+    domination = (a_ge_b & a_gt_b).astype(int) - (a_ge_b.T & a_gt_b.T).astype(int)
+    empty = numpy.array([len(v) == 0 for v in vectors], dtype=bool)
+    domination[empty, :] = 0
+    domination[:, empty] = 0
+    return domination
 
 
 def spearman_correlation(x, y):
     """ Calculates the spearman rank correlation coefficient.
         Returns a tuple (rho, p-value)
     """
+    robjects, r_stats = _r()
     try:
         r = r_stats.cor_test(robjects.FloatVector(x), robjects.FloatVector(y),
                              method='spearman')
@@ -59,6 +101,7 @@ def pearson_correlation(x, y):
     """ Calculates the pearson correlation coefficient.
         Returns a tuple (rho, p-value)
     """
+    robjects, r_stats = _r()
     try:
         r = r_stats.cor_test(robjects.FloatVector(x), robjects.FloatVector(y),
                              method='pearson')
@@ -68,10 +111,135 @@ def pearson_correlation(x, y):
     return cor, p_value
 
 
+def aligned_run_matrix(result_matrix, solver_configs, instances, attribute='penalized_time1'):
+    """ Returns a runs x solver configurations float array of the given
+        attribute of the runs in the result matrix (see
+        Experiment.get_result_matrix). The i-th runs of the solver
+        configurations on an instance form a row, instances with differing
+        numbers of runs contribute as many rows as the solver configuration
+        with the fewest runs on the instance has.
+    """
+    rows = []
+    for instance in instances:
+        runs = [result_matrix[instance.idInstance][sc.idSolverConfig] for sc in solver_configs]
+        for run in xrange(min(len(r) for r in runs) if runs else 0):
+            rows.append([getattr(r[run], attribute) for r in runs])
+    return numpy.array(rows, dtype=float).reshape((len(rows), len(solver_configs)))
+
+
+def _rank_columns(values):
+    """ Ranks the values of each column, ties get their average rank. """
+    ranks = numpy.empty(values.shape)
+    for j in xrange(values.shape[1]):
+        _, inverse = numpy.unique(values[:, j], return_inverse=True)
+        counts = numpy.bincount(inverse)
+        ranks[:, j] = (numpy.cumsum(counts) - (counts - 1) / 2.0)[inverse]
+    return ranks
+
+
+def correlation_matrix(values, method='spearman'):
+    """ Calculates the spearman rank or pearson correlation coefficients of
+        all pairs of columns of the n x k array `values` at once.
+        Returns a tuple (k x k array of coefficients, k x k array of
+        two-sided p-values). The p-values are based on the t-distribution
+        with n - 2 degrees of freedom. Coefficients that are undefined
+        (constant or non-finite columns, n < 2) are 0.0 with p-value 1.0.
+    """
+    values = numpy.asarray(values, dtype=float)
+    n, k = values.shape
+    if method == 'spearman':
+        values = _rank_columns(values)
+    elif method != 'pearson':
+        raise ValueError('Unknown correlation method %s' % method)
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        centered = values - values.mean(axis=0) if n else values
+        norms = numpy.sqrt((centered ** 2).sum(axis=0))
+        coefficients = centered.T.dot(centered) / numpy.outer(norms, norms)
+    defined = numpy.isfinite(coefficients)
+    coefficients = numpy.where(defined, numpy.clip(coefficients, -1.0, 1.0), 0.0)
+    numpy.fill_diagonal(coefficients, 1.0)
+
+    p_values = numpy.ones((k, k))
+    if n > 2:
+        from scipy import stats
+
+        with numpy.errstate(divide='ignore'):
+            t = numpy.abs(coefficients) * numpy.sqrt((n - 2) / numpy.maximum(1.0 - coefficients ** 2, 0.0))
+        p_values = numpy.where(defined, 2 * stats.t.sf(t, n - 2), 1.0)
+    numpy.fill_diagonal(p_values, 0.0 if n > 2 else 1.0)
+    return coefficients, p_values
+
+
+def _rank_biserial_correlations(values_by_solver):
+    """ Point biserial correlations of all pairs of solvers on a single
+        instance. For solvers a and b, the runs of both are ranked together
+        (ties get their average rank) and correlated with the indicator of
+        the runs of a, like scipy.stats.pointbiserialr. The ranks are not
+        computed per pair but derived from the per-value run counts of the
+        solvers: the rank sum of a's runs is n_a(n_a+1)/2 plus the
+        Mann-Whitney count of pairs won by a, the rank variance follows from
+        the tie group sizes.
+        Returns the tuple (k x k array of coefficients, k x k array of
+        two-sided p-values), undefined coefficients are NaN.
+    """
+    from scipy import special
+
+    k = len(values_by_solver)
+    sizes = numpy.array([len(v) for v in values_by_solver])
+    values = numpy.concatenate([numpy.asarray(v, dtype=float) for v in values_by_solver] + [numpy.zeros(0)])
+    distinct, value_index = numpy.unique(values, return_inverse=True)
+    counts = numpy.bincount(numpy.repeat(numpy.arange(k), sizes) * len(distinct) + value_index,
+                            minlength=k * len(distinct)).reshape((k, len(distinct))).astype(float)
+
+    less = numpy.cumsum(counts, axis=1) - counts
+    n_a, n_b = sizes[:, None].astype(float), sizes[None, :].astype(float)
+    n = n_a + n_b
+    rank_sums = n_a * (n_a + 1) / 2.0 + counts.dot((less + 0.5 * counts).T)
+    cubes = numpy.sum(counts ** 3 - counts, axis=1)
+    squares = counts ** 2
+    ties = cubes[:, None] + cubes[None, :] + 3 * (squares.dot(counts.T) + counts.dot(squares.T))
+
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        variance = (n ** 2 - 1) / 12.0 - ties / (12.0 * n)
+        mean_difference = rank_sums / n_a - (n * (n + 1) / 2.0 - rank_sums) / n_b
+        coefficients = mean_difference * numpy.sqrt(n_a * n_b) / (n * numpy.sqrt(variance))
+        coefficients[~(variance > 0)] = numpy.nan
+        coefficients = numpy.clip(coefficients, -1.0, 1.0)
+        df = n - 2
+        t_squared = coefficients ** 2 * (df / ((1.0 - coefficients) * (1.0 + coefficients)))
+        p_values = special.betainc(0.5 * df, 0.5, numpy.fmin(df / (df + t_squared), 1.0))
+    p_values[numpy.abs(coefficients) == 1.0] = 0.0
+    return coefficients, p_values
+
+
+def point_biserial_matrix(samples, alpha=0.05):
+    """ Mean point biserial correlations of the runtime distributions of all
+        pairs of solvers, see the paper "Statistical Methodology for
+        Comparison of SAT Solvers" by M. Nikolić.
+        `samples` holds for each instance a list with the list of runtimes of
+        each solver on the instance. Entry [a, b] of the returned k x k array
+        is the mean correlation over the instances where the difference of
+        the solvers is significant (p-value < alpha), 0.0 if there are none.
+        A negative value means that solver a is faster than b.
+    """
+    k = len(samples[0]) if samples else 0
+    sums = numpy.zeros((k, k))
+    num = numpy.zeros((k, k), dtype=int)
+    for values_by_solver in samples:
+        coefficients, p_values = _rank_biserial_correlations(values_by_solver)
+        significant = p_values < alpha
+        sums += numpy.where(significant, coefficients, 0.0)
+        num += significant
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return numpy.where(num > 0, sums / num, 0.0)
+
+
 def kolmogorow_smirnow_2sample_test(x, y):
     """ Calculates the Kolmogorow-Smirnow two-sample statistic
         Returns a tuple (value, p-value)
     """
+    robjects, r_stats = _r()
     r = r_stats.ks_test(robjects.FloatVector(x), robjects.FloatVector(y),
                         alternative='two.sided')
     return r[0][0], r[1][0]
@@ -81,12 +249,14 @@ def wilcox_test(x, y):
     """ Calculates the two sample Wilcoxon test statistic (aka Mann-Whitney)
         Returns a tuple (value, p-value)
     """
+    robjects, r_stats = _r()
     r = r_stats.wilcox_test(robjects.FloatVector(x), robjects.FloatVector(y),
                             alternative='two.sided', paired=False)
     return r[0][0], r[2][0]
 
 
 def surv_test(x, y, x_censored, y_censored, alpha=0.05):
+    robjects, _ = _r()
     combined_data = x + y
     sample_indicators = [1] * len(x) + [2] * len(y)
     censored = [0 if censored else 1 for censored in x_censored] + [0 if censored else 1 for censored in y_censored]
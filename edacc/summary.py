@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.summary
+    -------------
+
+    Per (solver configuration, instance) summaries of the results of an
+    experiment: number of runs, completed and successful runs and the costs
+    needed to calculate the min/mean/median/max and penalized average cost.
+
+    Summaries are kept in memory per experiment and cost and are updated
+    incrementally: only jobs whose date_modified is not older than the newest
+    modification seen so far are read again and only the summaries of the
+    affected (solver configuration, instance) pairs are recalculated.
+    Only these per pair figures are kept, not the jobs, and the summaries of
+    a process are limited by their estimated memory use.
+    Views that only need these figures should use get_summary instead of
+    reading and aggregating all runs of the experiment on every request.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+from collections import namedtuple
+from threading import RLock
+
+import numpy
+from sqlalchemy import func
+from sqlalchemy.sql import select, and_
+
+from edacc import config, lru
+from edacc.constants import STATUS_PROCESSING
+
+# Summary of a single job. cost is None for jobs that did not finish yet,
+# limit is the job's CPU or walltime limit if the cost is a time and None
+# otherwise.
+JobRow = namedtuple('JobRow', ['idJob', 'idSolverConfig', 'idInstance', 'status', 'resultCode',
+                               'result_code_description', 'cost', 'limit', 'successful'])
+
+# (database name, experiment ID, cost) -> ExperimentSummary
+_summaries = lru.LRUCache(lambda: config.SUMMARY_CACHE_BYTES, size=lambda summary: summary.nbytes)
+
+MEASURES = ('mean', 'median', 'min', 'max', 'par1', 'par10', None)
+
+# Estimated memory used by a summary and by a cell besides their NumPy arrays
+SUMMARY_BYTES = 4096
+CELL_BYTES = 640
+
+
+class SummaryCell(object):
+    """ Summary of the runs of a solver configuration on an instance.
+        A run is successful if its result code starts with 1, costs are
+        only known for runs that finished (status > 0). costs and
+        successful_costs are sorted NumPy arrays, first_job is the JobRow
+        of the run with the lowest ID.
+    """
+    __slots__ = ('runs', 'completed', 'successful', 'costs', 'successful_costs', 'failed_limit_sum', 'first_job')
+
+    def __init__(self, jobs):
+        jobs = sorted(jobs, key=lambda j: j.idJob)
+        self.runs = len(jobs)
+        self.completed = sum(1 for j in jobs if j.status not in STATUS_PROCESSING)
+        self.successful = sum(1 for j in jobs if j.successful)
+        self.costs = numpy.array(sorted(j.cost for j in jobs if j.cost is not None), dtype=float)
+        self.successful_costs = numpy.array(sorted(j.cost for j in jobs if j.successful and j.cost is not None),
+                                            dtype=float)
+        failed_limits = [j.limit for j in jobs if not j.successful]
+        if any(limit is None for limit in failed_limits):
+            self.failed_limit_sum = float('inf')
+        else:
+            self.failed_limit_sum = float(sum(failed_limits))
+        self.first_job = jobs[0] if jobs else None
+
+    @property
+    def nbytes(self):
+        """ Estimated memory used by the cell. """
+        return CELL_BYTES + self.costs.nbytes + self.successful_costs.nbytes
+
+    def par(self, factor, penalty=None):
+        """ Penalized average cost of all runs. Unsuccessful runs count as
+            `factor` times their limit or, if given, `factor` times `penalty`.
+            Returns 0.0 if there are no runs.
+        """
+        if self.runs == 0: return 0.0
+        num_failed = self.runs - self.successful
+        if num_failed == 0:
+            failed_sum = 0.0
+        elif penalty is not None:
+            failed_sum = penalty * num_failed * factor
+        else:
+            failed_sum = self.failed_limit_sum * factor
+        return (float(self.successful_costs.sum()) + failed_sum) / self.runs
+
+    def measure(self, measure, penalty=None):
+        """ Returns the given measure ('mean', 'median', 'min', 'max',
+            'par1' or 'par10') of the runs or None if there are no finished
+            runs to calculate a mean, median, min or max of.
+        """
+        if measure == 'par1':
+            return self.par(1, penalty)
+        elif measure in ('par10', None):
+            return self.par(10, penalty)
+        if measure not in MEASURES:
+            raise ValueError('Unknown measure %s' % measure)
+        n = len(self.costs)
+        if n == 0: return None
+        if measure == 'mean':
+            return float(self.costs.sum()) / n
+        elif measure == 'median':
+            return float(self.costs[(n - 1) // 2] + self.costs[n // 2]) / 2.0
+        elif measure == 'min':
+            return float(self.costs[0])
+        return float(self.costs[-1])
+
+
+EMPTY_CELL = SummaryCell([])
+
+
+class ExperimentSummary(object):
+    """ Summaries of all (solver configuration, instance) pairs of an
+        experiment for the given cost ('resultTime', 'wallTime', 'cost' or
+        the ID of a result property). Only the SummaryCells are kept, the
+        jobs of a cell are read again when one of them changes.
+    """
+
+    def __init__(self, experiment_id, cost):
+        self.experiment_id = experiment_id
+        self.cost = cost
+        self.lock = RLock()
+        self.num_jobs = None
+        self.last_modified = None
+        self.cells = {}
+        # number of runs and estimated memory of the cells
+        self.runs = 0
+        self.cells_nbytes = 0
+        # (measure, penalty, solver config IDs, instance IDs) -> MeasureMatrix
+        # of the current jobs
+        self.matrices = {}
+        self.matrices_nbytes = 0
+
+    @property
+    def nbytes(self):
+        """ Estimated memory used by the summary and its cached matrices. """
+        return SUMMARY_BYTES + self.cells_nbytes + self.matrices_nbytes
+
+    def _from_table(self, db):
+        """ Returns the table expression to select from and the cost and
+            limit columns.
+        """
+        table = db.metadata.tables['ExperimentResults']
+        table_result_codes = db.metadata.tables['ResultCodes']
+        if self.cost in ('resultTime', 'wallTime', 'cost'):
+            limit_column = {'resultTime': table.c['CPUTimeLimit'],
+                            'wallTime': table.c['wallClockTimeLimit']}.get(self.cost)
+            return table.join(table_result_codes), table.c[self.cost], limit_column
+        table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
+        table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
+        from_table = table.join(table_has_prop, and_(table_has_prop.c['idProperty'] == int(self.cost),
+                                                     table_has_prop.c['idExperimentResults'] == table.c['idJob'])) \
+            .join(table_has_prop_value).join(table_result_codes)
+        return from_table, table_has_prop_value.c['value'], None
+
+    def _load(self, db, whereclause=None):
+        table = db.metadata.tables['ExperimentResults']
+        table_result_codes = db.metadata.tables['ResultCodes']
+        from_table, cost_column, limit_column = self._from_table(db)
+        columns = [table.c['idJob'], table.c['SolverConfig_idSolverConfig'], table.c['Instances_idInstance'],
+                   table.c['status'], table.c['resultCode'], table_result_codes.c['description'], cost_column]
+        if limit_column is not None: columns.append(limit_column)
+        conditions = [table.c['Experiment_idExperiment'] == self.experiment_id]
+        if whereclause is not None: conditions.append(whereclause)
+        s = select(columns, and_(*conditions), from_obj=from_table)
+        rows = []
+        for r in db.read_session().connection().execute(s):
+            status = int(r[3])
+            cost = None if status <= 0 or r[6] is None else float(r[6])
+            limit = float(r[7]) if limit_column is not None and r[7] is not None else None
+            rows.append(JobRow(r[0], r[1], r[2], status, int(r[4]), r[5], cost, limit, str(r[4]).startswith('1')))
+        return rows
+
+    def _load_cells(self, db, keys):
+        """ Reads all jobs of the given (solver configuration, instance) pairs. """
+        table = db.metadata.tables['ExperimentResults']
+        rows = self._load(db, and_(table.c['SolverConfig_idSolverConfig'].in_(set(k[0] for k in keys)),
+                                   table.c['Instances_idInstance'].in_(set(k[1] for k in keys))))
+        return [r for r in rows if (r.idSolverConfig, r.idInstance) in keys]
+
+    def _apply(self, rows, keys=None, reset=False):
+        """ Replaces the cells of the given keys (default: the cells of the
+            rows) by summaries of the rows, which have to be all jobs of
+            these cells. Cells without rows are removed.
+        """
+        cell_jobs = {}
+        for row in rows:
+            cell_jobs.setdefault((row.idSolverConfig, row.idInstance), []).append(row)
+        if keys is None: keys = cell_jobs.keys()
+        if reset:
+            cells, runs, cells_nbytes = {}, 0, 0
+        else:
+            cells, runs, cells_nbytes = dict(self.cells), self.runs, self.cells_nbytes
+        for key in keys:
+            old = cells.pop(key, None)
+            if old is not None:
+                runs -= old.runs
+                cells_nbytes -= old.nbytes
+            if key in cell_jobs:
+                cell = cells[key] = SummaryCell(cell_jobs[key])
+                runs += cell.runs
+                cells_nbytes += cell.nbytes
+        # replaced at once, readers never see a partially updated summary
+        self.cells = cells
+        self.runs, self.cells_nbytes = runs, cells_nbytes
+        self.matrices, self.matrices_nbytes = {}, 0
+
+    def update(self, db):
+        """ Reads the jobs modified since the last update from the database
+            and updates the affected summaries. If jobs were deleted, the
+            whole summary is rebuilt. Returns True if anything changed.
+        """
+        table = db.metadata.tables['ExperimentResults']
+        from_table, _, _ = self._from_table(db)
+        with self.lock:
+            s = select([func.count(table.c['idJob']), func.max(table.c['date_modified'])],
+                       table.c['Experiment_idExperiment'] == self.experiment_id, from_obj=from_table)
+            num_jobs, last_modified = db.read_session().connection().execute(s).fetchone()
+            if self.num_jobs == num_jobs and self.last_modified == last_modified:
+                return False
+
+            if self.last_modified is None:
+                self._apply(self._load(db), reset=True)
+            else:
+                # jobs modified within the same second as the last seen
+                # modification may not have been read yet
+                modified = self._load(db, table.c['date_modified'] >= self.last_modified)
+                keys = set((r.idSolverConfig, r.idInstance) for r in modified)
+                if keys:
+                    self._apply(self._load_cells(db, keys), keys)
+                # the cells that were not read again still count deleted jobs
+                # and jobs that moved to another cell
+                if self.runs != num_jobs:
+                    self._apply(self._load(db), reset=True)
+            self.num_jobs = self.runs
+            self.last_modified = last_modified
+            return True
+
+    def get(self, solver_config_id, instance_id):
+        """ Returns the SummaryCell of the given solver configuration
+            and instance.
+        """
+        return self.cells.get((solver_config_id, instance_id), EMPTY_CELL)
+
+
+    def measure_matrix(self, measure, solver_config_ids, instance_ids, penalty=None):
+        """ Returns the MeasureMatrix of the given measure (see
+            SummaryCell.measure) of the solver configurations on the
+            instances. The matrix is kept until the jobs change.
+        """
+        key = (measure, penalty, tuple(solver_config_ids), tuple(instance_ids))
+        matrix = self.matrices.get(key)
+        if matrix is None:
+            with self.lock:
+                matrices = self.matrices
+                matrix = matrices.get(key)
+                if matrix is None:
+                    matrix = MeasureMatrix(self.cells, measure, solver_config_ids, instance_ids, penalty)
+                    matrices[key] = matrix
+                    self.matrices_nbytes += matrix.values.nbytes + matrix.runs.nbytes
+        return matrix
+
+
+class MeasureMatrix(object):
+    """ Solver configurations x instances matrix of a measure of the runs.
+        values[s, i] is the measure of the runs of the s-th solver
+        configuration on the i-th instance (NaN where SummaryCell.measure
+        would be None) and runs[s, i] the number of runs.
+    """
+
+    def __init__(self, cells, measure, solver_config_ids, instance_ids, penalty=None):
+        if measure not in MEASURES:
+            raise ValueError('Unknown measure %s' % measure)
+        self.solver_config_ids = list(solver_config_ids)
+        self.instance_ids = list(instance_ids)
+        shape = (len(self.solver_config_ids), len(self.instance_ids))
+
+        matrix_cells = [cells.get((sc_id, i_id), EMPTY_CELL) for sc_id in self.solver_config_ids
+                        for i_id in self.instance_ids]
+        values = [c.measure(measure, penalty) for c in matrix_cells]
+        self.values = numpy.array([numpy.nan if v is None else v for v in values], dtype=float).reshape(shape)
+        self.runs = numpy.array([c.runs for c in matrix_cells], dtype=int).reshape(shape)
+
+
+def get_summary(db, experiment_id, cost='resultTime'):
+    """ Returns the up to date ExperimentSummary of the given experiment and
+        cost. The summaries of a process use at most about
+        config.SUMMARY_CACHE_BYTES of memory, the least recently used ones
+        are dropped first.
+    """
+    key = (db.database, experiment_id, str(cost))
+    with _summaries.lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = ExperimentSummary(experiment_id, str(cost))
+            _summaries.put(key, summary)
+    summary.update(db)
+    # the summary and its matrices may have grown
+    _summaries.resize(key)
+    return summary
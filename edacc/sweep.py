@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+    edacc.sweep
+    -----------
+
+    Cutoff and penalty factor sweeps of the solver ranking. The finished runs
+    of the ranked solver configurations are fetched once (get_sweep_runs)
+    and the number of successful runs, penalized averages (PAR-X) and the
+    ranking by number of successful runs are computed for all cutoffs
+    (fixed limits) and penalty factors from the sorted costs
+    (SweepRuns.sweep), like ranking.number_of_solved_instances_ranking and
+    ranking.get_ranking_data compute them for a single fixed limit.
+
+    :license: MIT, see LICENSE for details.
+"""
+
+import numpy
+from sqlalchemy.sql import select, and_, not_
+
+from edacc import selection
+
+
+class SweepRuns(object):
+    """ Column arrays of the finished runs of a ranking. `candidate` marks
+        the successful runs (status 1, result code starting with 1) which
+        are successful at any cutoff that is not below their cost. `limit`
+        is the run's own limit, the penalty base of unsuccessful runs if
+        there is no cutoff.
+    """
+
+    def __init__(self, solver_config, instance, cost, limit, candidate):
+        self.solver_config = numpy.asarray(solver_config, dtype=int)
+        self.instance = numpy.asarray(instance, dtype=int)
+        self.cost = numpy.asarray(cost, dtype=float)
+        self.limit = numpy.asarray(limit, dtype=float)
+        self.candidate = numpy.asarray(candidate, dtype=bool)
+
+    def sweep(self, solver_config_ids, cutoffs, par_factors):
+        """ Returns a Sweep of the solver configurations for all cutoffs (None:
+            the runs' own limits) and penalty factors.
+        """
+        num_cutoffs, num_solvers = len(cutoffs), len(solver_config_ids)
+        solved = numpy.zeros((num_cutoffs, num_solvers), dtype=int)
+        solved_cost = numpy.zeros((num_cutoffs, num_solvers))
+        penalty = numpy.zeros((num_cutoffs, num_solvers))
+        finished = numpy.zeros(num_solvers, dtype=int)
+        limited = numpy.array([c is not None for c in cutoffs], dtype=bool)
+        cutoff_values = numpy.array([c if c is not None else 0.0 for c in cutoffs], dtype=float)
+
+        for j, idSolverConfig in enumerate(solver_config_ids):
+            runs = self.solver_config == idSolverConfig
+            finished[j] = numpy.count_nonzero(runs)
+            costs = numpy.sort(self.cost[runs & self.candidate])
+            cumulated = numpy.concatenate(([0.0], numpy.cumsum(costs)))
+            solved[:, j] = numpy.searchsorted(costs, numpy.where(limited, cutoff_values, numpy.inf), side='right')
+            solved_cost[:, j] = cumulated[solved[:, j]]
+            # unsuccessful runs count with the cutoff or, without one, their own limit
+            own_limits = self.limit[runs & ~self.candidate].sum()
+            penalty[:, j] = numpy.where(limited, cutoff_values * (finished[j] - solved[:, j]), own_limits)
+
+        par = numpy.zeros((len(par_factors), num_cutoffs, num_solvers))
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            for k, factor in enumerate(par_factors):
+                par[k] = numpy.where(finished > 0, (solved_cost + factor * penalty) / finished, 0.0)
+
+        # rank by number of successful runs, ties by cumulated cost of the successful runs
+        ranks = numpy.empty((num_cutoffs, num_solvers), dtype=int)
+        for c in xrange(num_cutoffs):
+            order = numpy.lexsort((numpy.arange(num_solvers), numpy.where(solved[c] > 0, solved_cost[c], 0.0),
+                                   -solved[c]))
+            ranks[c, order] = numpy.arange(1, num_solvers + 1)
+        return Sweep(list(solver_config_ids), list(cutoffs), list(par_factors), solved, par, ranks)
+
+    def instance_matrices(self, solver_config_ids, instance_ids, cutoff=None):
+        """ Returns the instances x solver configurations arrays (number of
+            successful runs, cumulated cost of the successful runs, cumulated
+            penalty base of the unsuccessful runs, number of runs) at the
+            given cutoff (None: the runs' own limits).
+        """
+        shape = (len(instance_ids), len(solver_config_ids))
+        sc_index = dict((sc_id, n) for n, sc_id in enumerate(solver_config_ids))
+        instance_index = dict((i_id, n) for n, i_id in enumerate(instance_ids))
+        index = numpy.array([(instance_index.get(i, -1), sc_index.get(sc, -1))
+                             for sc, i in zip(self.solver_config, self.instance)], dtype=int).reshape((-1, 2))
+        known = numpy.all(index >= 0, axis=1)
+        cell = index[known, 0] * shape[1] + index[known, 1]
+        successful = self.candidate[known]
+        if cutoff is not None:
+            successful = successful & (self.cost[known] <= cutoff)
+            penalty = numpy.empty(len(cell))
+            penalty.fill(cutoff)
+        else:
+            penalty = self.limit[known]
+
+        def cell_sums(weights):
+            return numpy.bincount(cell, weights=weights, minlength=shape[0] * shape[1]).reshape(shape)
+
+        return (cell_sums(successful.astype(float)), cell_sums(numpy.where(successful, self.cost[known], 0.0)),
+                cell_sums(numpy.where(successful, 0.0, penalty)), cell_sums(numpy.ones(len(cell))))
+
+
+class Sweep(object):
+    """ Result of a sweep: `solved` and `ranks` are cutoffs x solver
+        configurations arrays, `par` is a penalty factors x cutoffs x solver
+        configurations array.
+    """
+
+    def __init__(self, solver_config_ids, cutoffs, par_factors, solved, par, ranks):
+        self.solver_config_ids = solver_config_ids
+        self.cutoffs = cutoffs
+        self.par_factors = par_factors
+        self.solved = solved
+        self.par = par
+        self.ranks = ranks
+
+    def rank_stability(self):
+        """ Returns the tuple (best ranks, worst ranks, rank correlations) of
+            the ranks over the cutoffs. The rank correlations are the
+            spearman correlations of the ranking at each cutoff with the
+            ranking at the first cutoff.
+        """
+        n = len(self.solver_config_ids)
+        if n < 2 or not self.cutoffs:
+            return self.ranks.min(axis=0), self.ranks.max(axis=0), numpy.ones(len(self.cutoffs))
+        squared_differences = ((self.ranks - self.ranks[0]) ** 2).sum(axis=1)
+        correlations = 1.0 - 6.0 * squared_differences / (n * (n ** 2 - 1))
+        return self.ranks.min(axis=0), self.ranks.max(axis=0), correlations
+
+
+def get_sweep_runs(db, experiment, solver_config_ids, instance_ids, cost):
+    """ Fetches the finished runs of the solver configurations on the instances
+        of the experiment with a single query. cost is 'resultTime' or
+        'wallTime'.
+    """
+    table = db.metadata.tables['ExperimentResults']
+    limit_column = table.c['CPUTimeLimit'] if cost == 'resultTime' else table.c['wallClockTimeLimit']
+    s = select([table.c['SolverConfig_idSolverConfig'], table.c['Instances_idInstance'], table.c[cost], limit_column,
+                table.c['status'], table.c['resultCode']],
+               and_(selection.results_filter(db, db.read_session(), experiment.idExperiment, instance_ids,
+                                             solver_config_ids),
+                    not_(table.c['status'].in_((-1, 0)))))
+
+    columns = ([], [], [], [], [])
+    for r in db.read_session().connection().execute(s):
+        for column, v in zip(columns, (r[0], r[1], r[2] or 0.0, r[3],
+                                       r.status == 1 and str(r.resultCode).startswith('1'))):
+            column.append(v)
+    return SweepRuns(*columns)
@@ -90,10 +90,107 @@ class RankingTestCase(unittest.TestCase):
         assert second[6] == 0.0
         assert second[7] == 2.0
 
+    def test_instance_solution_status(self):
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        status = experiment.get_instance_solution_status(db)
+        assert not status['partially_solved'] and not status['unsolved']
+        assert sorted(status['fully_solved'].values()) == [(10*10, 10*10)] * 10
+        assert sorted(i.idInstance for i in experiment.get_solved_instances(db, status)) == \
+               sorted(status['fully_solved'])
+        assert experiment.get_unsolved_instances(db, status) == []
+
+    def test_results_filter(self):
+        from edacc import selection
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        instance_ids = [i.idInstance for i in experiment.instances]
+        solver_config_ids = [sc.idSolverConfig for sc in experiment.solver_configurations]
+        in_list_limit, config.SELECTION_IN_LIST_LIMIT = config.SELECTION_IN_LIST_LIMIT, 2
+        try:
+            # all instances, a temporary selection table and an IN list
+            for instances, solver_configs in ((instance_ids, solver_config_ids), (instance_ids[:5], None),
+                                              (instance_ids[:1], solver_config_ids[:2])):
+                f = selection.results_filter(db, db.session, experiment.idExperiment, instances, solver_configs)
+                assert db.session.query(db.ExperimentResult).filter(f).count() == \
+                       len(instances) * len(solver_configs or solver_config_ids) * 10
+        finally:
+            config.SELECTION_IN_LIST_LIMIT = in_list_limit
+
+    def test_instance_catalogue(self):
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        catalogue = experiment.get_instance_catalogue(db)
+        assert len(catalogue) == 10
+        assert [i.get_name() for i in catalogue.get_instances()] == \
+               sorted(i.get_name() for i in experiment.instances)
+        assert sorted(catalogue.by_id) == sorted(i.idInstance for i in experiment.instances)
+        assert experiment.get_instance_catalogue(db) is catalogue
+
     def tearDown(self):
         clean_database(self.db)
         self.db.session.remove()
 
+class RankingKernelTestCase(unittest.TestCase):
+    def test_careful_raw_scores(self):
+        from collections import namedtuple
+        from edacc import ranking
+        Run = namedtuple('Run', ['penalized_time1', 'censored'])
+        results = {1: {10: [Run(1.0, False), Run(5.0, True)], 11: [Run(9.0, False), Run(5.0, True)],
+                       12: [Run(5.0, True)]},
+                   2: {10: [Run(4.0, False)], 11: [Run(4.5, False), Run(1.0, False)], 12: []}}
+        raw = ranking.careful_raw_scores(*ranking._aligned_runs(results, [1, 2], [10, 11, 12]), alpha=0.5)
+        # 1.0 beats 9.0, 4.0 and 4.5 are tied, the censored runs tie and lose against uncensored ones
+        assert raw.tolist() == [[0, 1, 1], [-1, 0, 1], [-1, -1, 0]]
+
+    def test_graph_ranking(self):
+        import numpy
+        from edacc import ranking
+        adjacency = numpy.zeros((5, 5), dtype=bool)
+        for i, j in [(3, 1), (1, 3), (1, 0), (4, 0), (0, 2), (2, 0)]:
+            adjacency[i, j] = True
+        assert ranking.graph_ranking(adjacency) == [[1, 3], [4], [0, 2]]
+        assert ranking.ranking_from_graph(None, [(12, 11)], set([11, 12]), [11, 12]) == [[12], [11]]
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from edacc import models
+        self.db = db = models.add_database("edacc", "edaccteam", TEST_DATABASE, TEST_DATABASE)
+        clean_database(db)
+        fixtures.setup_ranking_fixture(db)
+        self.snapshot_file = tempfile.mktemp(suffix=".sqlite")
+
+    def test_export_and_serve_snapshot(self):
+        from edacc import models, snapshot, ranking
+        db = self.db
+        experiment = db.session.query(db.Experiment).first()
+        row_counts = snapshot.export_experiment(db, experiment.idExperiment, self.snapshot_file)
+        assert row_counts['Experiment'] == 1
+        assert row_counts['ExperimentResults'] == 10*10*10
+
+        snapshot_db = models.add_database(None, None, TEST_DATABASE + "Snapshot", "Snapshot",
+                                          snapshot=self.snapshot_file)
+        try:
+            assert snapshot_db.read_only
+            snapshot_experiment = snapshot_db.session.query(snapshot_db.Experiment).first()
+            assert snapshot_experiment.name == experiment.name
+            assert snapshot_db.session.query(snapshot_db.ExperimentResult).count() == 10*10*10
+            ranked = ranking.number_of_solved_instances_ranking(snapshot_db, snapshot_experiment,
+                                                                snapshot_experiment.instances)
+            assert [sc.name for sc in ranked] == \
+                   [sc.name for sc in ranking.number_of_solved_instances_ranking(db, experiment, experiment.instances)]
+        finally:
+            snapshot_db.session.remove()
+            models.remove_database(TEST_DATABASE + "Snapshot")
+
+    def tearDown(self):
+        import os
+        clean_database(self.db)
+        self.db.session.remove()
+        if os.path.exists(self.snapshot_file):
+            os.remove(self.snapshot_file)
+
 class StatisticsTestCase(unittest.TestCase):
     def test_probabilistic_domination(self):
         from edacc.statistics import prob_domination
@@ -119,6 +216,32 @@ class StatisticsTestCase(unittest.TestCase):
         assert prob_domination(v1, v2) == 1
         assert prob_domination(v2, v1) == -1
 
+    def test_probabilistic_domination_matrix(self):
+        from edacc.statistics import prob_domination_matrix
+        d = prob_domination_matrix([[1, 2, 3, 4, 4.5], [1, 2, 3, 4, 5], [1, 2, 2, 1, 1, 1.5], [3, 0.5], []])
+        assert d.tolist() == [[0, 1, -1, -1, 0],
+                              [-1, 0, -1, -1, 0],
+                              [1, 1, 0, 0, 0],
+                              [1, 1, 0, 0, 0],
+                              [0, 0, 0, 0, 0]]
+        # comparing one vector per block gives the same relation
+        import edacc.statistics
+        block_size, edacc.statistics.DOMINATION_BLOCK_SIZE = edacc.statistics.DOMINATION_BLOCK_SIZE, 1
+        try:
+            assert (prob_domination_matrix([[1, 2, 3, 4, 4.5], [1, 2, 3, 4, 5], [1, 2, 2, 1, 1, 1.5], [3, 0.5], []])
+                    == d).all()
+        finally:
+            edacc.statistics.DOMINATION_BLOCK_SIZE = block_size
+
+    def test_domination_values(self):
+        from collections import namedtuple
+        from edacc.views.analysis import domination_values
+        Run = namedtuple('Run', ['status', 'resultTime'])
+        # the memory-out run (status 22) has no CPU time, like in ExperimentResult.get_time
+        runs = [Run(1, 1.5), Run(21, 10.0), Run(22, 0.5), Run(-3, None)]
+        assert domination_values(runs, 'resultTime') == [1.5, 10.0]
+        assert domination_values(runs, 'wallTime') == [1.5, 10.0, 0.5]
+
     def test_spearman_correlation(self):
         from edacc.statistics import spearman_correlation
         rho, p = spearman_correlation([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0], [2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
@@ -129,6 +252,25 @@ class StatisticsTestCase(unittest.TestCase):
         rho, p = pearson_correlation([1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0])
         assert rho == 1.0 and p <= 1e-10
 
+    def test_correlation_matrix(self):
+        from edacc.statistics import correlation_matrix
+        values = [[1.0, 2.0, 7.0, 3.0], [2.0, 3.0, 6.0, 3.0], [3.0, 3.0, 5.0, 3.0], [4.0, 5.0, 4.0, 3.0],
+                  [5.0, 6.0, 1.0, 3.0]]
+        rho, p = correlation_matrix(values)
+        assert float_eq(rho[0][1], 0.97468, eps=1e-5) and float_eq(rho[0][2], -1.0) and rho[1][1] == 1.0
+        assert rho[0][3] == 0.0 and p[0][3] == 1.0 and p[0][2] <= 1e-10 and p[0][1] < 0.01
+        rho, p = correlation_matrix(values, method='pearson')
+        assert float_eq(rho[0][1], 0.96225, eps=1e-5) and float_eq(rho[0][2], -0.96152, eps=1e-5)
+
+    def test_point_biserial_matrix(self):
+        from edacc.statistics import point_biserial_matrix
+        # instance 1: ranks 1-4 vs. 5-7 (r = -0.86603, p = 0.01172), instance 2: tied runs
+        samples = [[[1.0, 2.0, 2.5, 3.0], [4.0, 5.0, 6.0], []], [[1.0, 1.0], [1.0, 1.0], [1.0]]]
+        r = point_biserial_matrix(samples)
+        assert float_eq(r[0][1], -0.86603, eps=1e-5) and float_eq(r[1][0], 0.86603, eps=1e-5)
+        assert r[0][2] == 0.0 and r[0][0] == 0.0
+        assert point_biserial_matrix(samples, alpha=0.01)[0][1] == 0.0
+
     def test_kolmogorow_smirnow_2sample_test(self):
         from edacc.statistics import kolmogorow_smirnow_2sample_test
         D, p = kolmogorow_smirnow_2sample_test([1.0, 2.0, 3.0, 4.0], [5.0, 6.0, 7.0, 8.0])
@@ -191,6 +333,325 @@ class UtilsTestCase(unittest.TestCase):
         assert ("instance", "-i", "", False, 2) in params
         assert ("seed", "", "", False, 4) in params
 
+class InstrumentationTestCase(unittest.TestCase):
+    def test_load_backend(self):
+        from edacc import instrumentation
+        calls = []
+        def loader():
+            calls.append(1)
+            return "backend"
+        assert not instrumentation.is_loaded("test backend")
+        assert instrumentation.load_backend("test backend", loader) == "backend"
+        assert instrumentation.load_backend("test backend", loader) == "backend"
+        assert len(calls) == 1
+        assert instrumentation.is_loaded("test backend")
+        assert "test backend" in instrumentation.get_statistics()['backend_load_times']
+
+    def test_pool_statistics(self):
+        from edacc import instrumentation
+        stats = instrumentation.PoolStatistics("test", 2, 2)
+        stats.record_wait(0.5)
+        stats.record_checkout()
+        stats.record_wait(1.5)
+        stats.record_checkout()
+        stats.record_checkin()
+        stats.record_timeout(2.0)
+        d = stats.as_dict()
+        assert d['checkouts'] == 2 and d['timeouts'] == 1
+        assert float_eq(d['avg_wait'], 4.0 / 3) and float_eq(d['max_wait'], 2.0)
+        assert float_eq(d['saturation'], 0.25) and float_eq(d['max_saturation'], 0.5)
+        assert float_eq(instrumentation.PoolStatistics("test", 4, -1).saturation(2), 0.5)
+
+    def test_replica_lag(self):
+        from edacc.models import EDACCDatabase
+        class Result(object):
+            def __init__(self, row): self.row = row
+            def fetchone(self): return self.row
+        class Engine(object):
+            row = None
+            def execute(self, statement): return Result(self.row)
+        db = EDACCDatabase.__new__(EDACCDatabase)
+        db.database, db.replica_engine, db.replica = TEST_DATABASE, Engine(), {'max_lag': 60}
+        # a server that isn't replicating has an unknown lag and isn't used ...
+        db._replica_lag = db._replica_lag_checked = None
+        assert db.get_replica_lag() is None and not db.replica_is_fresh()
+        # ... unless it is explicitly configured as not replicating
+        db._replica_lag_checked, db.replica['not_replicating'] = None, True
+        assert db.get_replica_lag() == 0 and db.replica_is_fresh()
+        db._replica_lag_checked, db.replica_engine.row = None, {'Seconds_Behind_Master': 120}
+        assert not db.replica_is_fresh()
+
+class SummaryTestCase(unittest.TestCase):
+    def test_summary_cell(self):
+        from edacc.summary import JobRow, SummaryCell
+        cell = SummaryCell([JobRow(2, 1, 1, 21, -21, 'timeout', 10.0, 10.0, False),
+                            JobRow(1, 1, 1, 1, 11, 'SAT', 2.0, 10.0, True),
+                            JobRow(3, 1, 1, 0, 0, 'running', None, 10.0, False)])
+        assert cell.runs == 3 and cell.completed == 2 and cell.successful == 1
+        assert cell.first_job.idJob == 1
+        assert float_eq(cell.measure('mean'), 6.0) and float_eq(cell.measure('median'), 6.0)
+        assert cell.measure('min') == 2.0 and cell.measure('max') == 10.0
+        assert float_eq(cell.measure('par1'), 22.0 / 3) and float_eq(cell.measure('par10'), 202.0 / 3)
+        assert float_eq(cell.measure('par10', penalty=1.0), 22.0 / 3)
+        assert SummaryCell([]).measure('par10') == 0.0 and SummaryCell([]).measure('mean') is None
+
+    def test_incremental_update(self):
+        from edacc.summary import JobRow, ExperimentSummary
+        summary = ExperimentSummary(1, 'resultTime')
+        summary._apply([JobRow(1, 1, 1, 0, 0, 'running', None, 10.0, False),
+                        JobRow(2, 1, 2, 1, 11, 'SAT', 3.0, 10.0, True)], reset=True)
+        cells = summary.cells
+        summary._apply([JobRow(1, 1, 1, 1, 10, 'UNSAT', 4.0, 10.0, True)])
+        assert summary.get(1, 1).successful == 1 and summary.get(1, 1).costs.tolist() == [4.0]
+        assert summary.get(1, 2) is cells[(1, 2)]
+        assert cells[(1, 1)].successful == 0
+        assert summary.get(2, 1).runs == 0
+        assert summary.runs == 2 and summary.nbytes > summary.get(1, 2).nbytes
+        summary._apply([], keys=[(1, 2)])
+        assert summary.get(1, 2).runs == 0 and summary.runs == 1 and (1, 2) not in summary.cells
+
+    def test_measure_matrix(self):
+        import numpy
+        from edacc.summary import JobRow, ExperimentSummary
+        summary = ExperimentSummary(1, 'resultTime')
+        summary._apply([JobRow(1, 1, 1, 1, 11, 'SAT', 2.0, 10.0, True),
+                        JobRow(2, 1, 1, 21, -21, 'timeout', 10.0, 10.0, False),
+                        JobRow(3, 1, 1, 1, 11, 'SAT', 3.0, 10.0, True),
+                        JobRow(4, 2, 1, 0, 0, 'running', None, 10.0, False)], reset=True)
+        matrix = summary.measure_matrix('median', [1, 2, 3], [1])
+        assert matrix.values[0, 0] == 3.0 and numpy.isnan(matrix.values[1, 0]) and numpy.isnan(matrix.values[2, 0])
+        assert matrix.runs.tolist() == [[3], [1], [0]]
+        assert summary.measure_matrix('median', [1, 2, 3], [1]) is matrix
+        par10 = summary.measure_matrix('par10', [1, 2], [1])
+        assert float_eq(par10.values[0, 0], 105.0 / 3) and float_eq(par10.values[1, 0], 100.0)
+        summary._apply([JobRow(4, 2, 1, 1, 11, 'SAT', 1.0, 10.0, True)])
+        assert summary.measure_matrix('median', [1, 2, 3], [1]).values[1, 0] == 1.0
+
+class LRUTestCase(unittest.TestCase):
+    def test_lru_cache(self):
+        from edacc import lru
+        cache = lru.LRUCache(lambda: 2)
+        cache.put((TEST_DATABASE, 1), 'a')
+        cache.put((TEST_DATABASE, 2), 'b')
+        assert cache.get((TEST_DATABASE, 1)) == 'a'
+        # the least recently used entry is dropped
+        assert cache.put(('other', 3), 'c') == [((TEST_DATABASE, 2), 'b')]
+        lru.drop_database(TEST_DATABASE)
+        assert len(cache) == 1 and ('other', 3) in cache
+        sized = lru.LRUCache(lambda: 10, size=len, by_database=False)
+        sized.put('a', 'x' * 6)
+        sized.put('b', 'x' * 3)
+        assert sized.put('c', 'x' * 4) == [('a', 'x' * 6)] and sized.get('b') == 'xxx'
+
+class PlotDataTestCase(unittest.TestCase):
+    def test_encode_column(self):
+        from edacc import plot_data
+        column = plot_data.encode_column([3, 5, 6, 10], 'int32', delta=True)
+        assert column['encoding'] == 'delta' and column['data'] == [3, 2, 1, 4]
+        assert list(plot_data.decode_column(column)) == [3, 5, 6, 10]
+        column = plot_data.encode_column([1.5, None, float('inf')], delta=True)
+        assert column['encoding'] == 'plain' and column['data'] == [1.5, None, None]
+        column = plot_data.encode_column([1.5, 0.25, -2.0], format='base64')
+        assert list(plot_data.decode_column(column)) == [1.5, 0.25, -2.0]
+
+class DownsamplingTestCase(unittest.TestCase):
+    def test_scatter_mask(self):
+        import random
+        from edacc import downsampling
+        random.seed(1)
+        xs = [random.expovariate(1.0) for _ in xrange(5000)] + [10.0]
+        ys = [random.expovariate(1.0) for _ in xrange(5000)] + [1.0]
+        mask = downsampling.scatter_mask(xs, ys, 500, x_limit=5.0)
+        assert sum(mask) <= 500 + sum(1 for x in xs if x >= 5.0) + 4
+        assert mask[5000] and all(mask[i] for i in xrange(len(xs)) if xs[i] >= 5.0)
+        assert mask[ys.index(max(ys))] and mask[ys.index(min(ys))]
+        assert list(mask) == list(downsampling.scatter_mask(xs, ys, 500, x_limit=5.0))
+        assert all(downsampling.scatter_mask(xs, ys, 0))
+
+    def test_polyline_mask(self):
+        from edacc import downsampling
+        xs = range(1, 1001)
+        ys = [x * 0.01 for x in xs]
+        mask = downsampling.polyline_mask(xs, ys, 0.5, (0, 1000), (0, 10), 1000, 1000)
+        assert list(mask).count(True) == 2 and mask[0] and mask[-1]
+        ys[500] = 20.0
+        mask = downsampling.polyline_mask(xs, ys, 0.5, (0, 1000), (0, 20), 1000, 1000)
+        assert mask[500]
+
+class DistributionsTestCase(unittest.TestCase):
+    def test_ecdf(self):
+        from edacc import distributions
+        xs, ps = distributions.ecdf([3.0, 1.0, 2.0, 2.0])
+        assert list(xs) == [1.0, 2.0, 3.0] and list(ps) == [0.25, 0.75, 1.0]
+        xs, ps = distributions.ecdf(range(1, 1001), max_points=10, log=True)
+        assert len(xs) == 10 and xs[0] == 1 and xs[-1] == 1000 and float_eq(xs[3], 10.0, eps=1e-9)
+        assert float_eq(ps[3], 0.01) and ps[-1] == 1.0
+
+    def test_gaussian_kde(self):
+        import numpy
+        from edacc import distributions
+        values = numpy.random.RandomState(0).normal(5.0, 2.0, 2000)
+        xs, densities = distributions.gaussian_kde(values, bw=0.5)
+        assert float_eq(numpy.trapz(densities, xs), 1.0, eps=1e-3)
+        # exact estimate at some grid points
+        for x, d in zip(xs[::64], densities[::64]):
+            exact = numpy.exp(-0.5 * ((x - values) / 0.5) ** 2).sum() / (len(values) * 0.5 * numpy.sqrt(2 * numpy.pi))
+            assert float_eq(d, exact, eps=2e-3)
+        assert float_eq(distributions.bandwidth([1.0, 2.0, 3.0, 4.0]), 0.9 * (1.5 / 1.34) * 4 ** -0.2)
+
+    def test_restart_strategy(self):
+        from edacc import distributions
+        assert distributions.restart_strategy([10.0, 1.0, 1.0, 10.0]) == (1.0, 2.0, 5.5)
+        assert distributions.restart_strategy([]) is None
+
+class CactusTestCase(unittest.TestCase):
+    def test_series(self):
+        from edacc.cactus import CactusRuns
+        runs = CactusRuns([1, 1, 1, 1, 1, 2], [10, 10, 10, 11, 12, 10], [0, 1, 2, 0, 0, 0],
+                          [True, True, False, True, False, True], [3.0, 1.0, 50.0, 2.0, float('nan'), 7.0],
+                          [100.0] * 6)
+        assert runs.num_solved(1, [10, 11, 12]) == 3
+        assert runs.series(1, [10, 11, 12], 'all') == ([1.0, 2.0, 3.0], [10, 11, 10])
+        assert runs.series(1, [10, 11, 12], 'average') == ([2.0, 2.0], [10, 11])
+        assert runs.series(1, [10, 11, 12], 'median') == ([2.0, 2.0], [10, 11])
+        values, instances = runs.series(1, [10, 11, 12], 'penalized_average')
+        assert instances == [11, 10, 12] and float_eq(values[1], 104.0 / 3) and values[2] == 100.0
+        assert runs.series(1, [10, 11], 1) == ([1.0], [10])
+        assert runs.series(3, [10], 'average') == ([], [])
+
+class BorgExplorerTestCase(unittest.TestCase):
+    def test_inverse_digamma(self):
+        import numpy
+        from edacc.plugins import borgexplorer
+        borgexplorer.load_backends()
+        ys = numpy.array([[0.1, 0.5, 1.0], [2.0, 10.0, 100.0]])
+        assert numpy.allclose(borgexplorer.inverse_digamma(borgexplorer.scipy.special.digamma(ys)), ys)
+        assert float_eq(borgexplorer.inverse_digamma(borgexplorer.scipy.special.digamma(3.0)), 3.0, eps=1e-9)
+
+    def test_duplicate_components(self):
+        import numpy
+        from edacc.plugins import borgexplorer
+        components = numpy.array([[0.1, 0.2], [0.3, 0.4], [0.1, 0.2], [0.5, 0.1], [0.1, 0.2]])
+        assert list(borgexplorer.duplicate_components(components)) == [True, False, True, False, False]
+
+class SweepTestCase(unittest.TestCase):
+    def test_sweep(self):
+        from edacc.sweep import SweepRuns
+        runs = SweepRuns([1, 1, 1, 2, 2, 2], [7] * 6, [1.0, 5.0, 100.0, 2.0, 3.0, 4.0], [100.0] * 6,
+                         [True, True, False, True, True, False])
+        result = runs.sweep([1, 2, 3], [None, 4.0, 2.0], [1, 10])
+        assert result.solved.tolist() == [[2, 2, 0], [1, 2, 0], [1, 1, 0]]
+        # solver 2 is better at cutoff 4.0, ties are broken by the cumulated cost
+        assert result.ranks.tolist() == [[2, 1, 3], [2, 1, 3], [1, 2, 3]]
+        assert float_eq(result.par[1, 0, 0], (6.0 + 1000.0) / 3) and float_eq(result.par[0, 1, 1], 9.0 / 3)
+        assert result.par[0, 0, 2] == 0.0
+        best, worst, correlations = result.rank_stability()
+        assert best.tolist() == [1, 1, 3] and worst.tolist() == [2, 2, 3] and correlations.tolist() == [1.0, 1.0, 0.5]
+
+class BootstrapTestCase(unittest.TestCase):
+    def test_bootstrap_ranking(self):
+        import numpy
+        from edacc.sweep import SweepRuns
+        from edacc.bootstrap import bootstrap_ranking
+        # solver 2 solves every instance faster, solver 1 fails on instance 12
+        runs = SweepRuns([1, 1, 1, 2, 2, 2], [10, 11, 12, 10, 11, 12], [5.0, 6.0, 100.0, 1.0, 2.0, 3.0],
+                         [100.0] * 6, [True, True, False, True, True, True])
+        matrices = runs.instance_matrices([1, 2], [10, 11, 12])
+        assert matrices[0].tolist() == [[1, 1], [1, 1], [0, 1]] and matrices[2].tolist() == [[0, 0], [0, 0], [100, 0]]
+        result = bootstrap_ranking([1, 2], *matrices, par_factor=10, resamples=300, seed=1)
+        lower, upper = result.intervals['solved']
+        assert lower[0] <= 2 <= upper[0] and lower[1] == upper[1] == 3
+        assert result.inversion_probability(1, 2) > 0.9 and result.inversion_probability(2, 1) == 0.0
+        again = bootstrap_ranking([1, 2], *matrices, par_factor=10, resamples=300, seed=1)
+        assert numpy.array_equal(result.below, again.below)
+        assert numpy.array_equal(result.intervals['par'][1], again.intervals['par'][1])
+        # identical instances leave no uncertainty
+        same = SweepRuns([1, 1, 2, 2], [10, 11, 10, 11], [2.0, 2.0, 3.0, 3.0], [10.0] * 4, [True] * 4)
+        lower, upper = bootstrap_ranking([1, 2], *same.instance_matrices([1, 2], [10, 11])).intervals['par1']
+        assert lower.tolist() == upper.tolist() == [2.0, 3.0]
+
+class SelectionTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.selection_dir, config.SELECTION_DIR = config.SELECTION_DIR, tempfile.mkdtemp()
+
+    def test_stored_selection(self):
+        import shutil
+        from werkzeug import MultiDict
+        from edacc import selection
+        args = MultiDict([('cost', 'resultTime'), ('i', '3'), ('i', '1'), ('sc', '7')])
+        query = selection.query_string(TEST_DATABASE, args)
+        assert query == 'cost=resultTime&i=3&i=1&sc=7'
+        url_max_ids, config.SELECTION_URL_MAX_IDS = config.SELECTION_URL_MAX_IDS, 2
+        try:
+            query = selection.query_string(TEST_DATABASE, args)
+        finally:
+            config.SELECTION_URL_MAX_IDS = url_max_ids
+        selection_id = query.split('selection=')[1]
+        assert query.startswith('cost=resultTime&') and len(selection_id) == 16
+        selection._selections.clear()
+        ids_by_argument = selection.load_selection(TEST_DATABASE, selection_id)
+        assert ids_by_argument == {'i': [3, 1], 'sc': [7]}
+        assert selection.expand_arguments(MultiDict([('selection', selection_id)]), ids_by_argument) == \
+               [('i', '3'), ('i', '1'), ('sc', '7')]
+        assert selection.load_selection(TEST_DATABASE, '../' + selection_id) is None
+        stored = (selection_id, ids_by_argument)
+        assert selection.cache_key([1, 3], 'i', stored) == 'selection:%s:i' % selection_id
+        assert selection.cache_key([1], 'i', stored) == [1] and selection.cache_key([1, 3], 'i', None) == [1, 3]
+        assert selection.args_cache_key(MultiDict([('cost', 'resultTime'), ('i', '3'), ('i', '1'), ('sc', '7')]),
+                                        stored) == (('cost', 'resultTime'), ('selection', selection_id))
+        shutil.rmtree(config.SELECTION_DIR)
+
+    def test_unwritable_selection_dir(self):
+        import os
+        from werkzeug import MultiDict
+        from edacc import selection
+        # a file in place of the directory, the selection can't be stored and is passed inline
+        open(os.path.join(config.SELECTION_DIR, TEST_DATABASE), 'w').close()
+        ids = range(config.SELECTION_URL_MAX_IDS + 1)
+        args = MultiDict([('i', str(i)) for i in ids])
+        assert selection.query_string(TEST_DATABASE, args) == '&'.join('i=%d' % i for i in ids)
+        os.remove(os.path.join(config.SELECTION_DIR, TEST_DATABASE))
+
+    def test_selection_cleanup(self):
+        import os, shutil, time
+        from edacc import selection
+        max_ids, config.SELECTION_MAX_IDS = config.SELECTION_MAX_IDS, 3
+        try:
+            self.assertRaises(ValueError, selection.store_selection, TEST_DATABASE, {'i': [1, 2, 3, 4]})
+        finally:
+            config.SELECTION_MAX_IDS = max_ids
+        old_id = selection.store_selection(TEST_DATABASE, {'i': [1]})
+        new_id = selection.store_selection(TEST_DATABASE, {'i': [2]})
+        past = time.time() - config.SELECTION_MAX_AGE - 1
+        os.utime(selection._selection_file(TEST_DATABASE, old_id), (past, past))
+        selection.cleanup_selections(TEST_DATABASE)
+        assert not os.path.exists(selection._selection_file(TEST_DATABASE, old_id))
+        assert os.path.exists(selection._selection_file(TEST_DATABASE, new_id))
+        shutil.rmtree(config.SELECTION_DIR)
+
+    def tearDown(self):
+        config.SELECTION_DIR = self.selection_dir
+
+class ParameterGraphTestCase(unittest.TestCase):
+    GRAPH = '<?xml version="1.0"?><parameterGraph xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">' \
+            '<parameters><domain xsi:type="realDomain"><low>0.5</low><high>2.0</high></domain><name>alpha</name>' \
+            '</parameters><parameters><domain xsi:type="categoricalDomain"><categories>a</categories>' \
+            '<categories>b</categories></domain><name>mode</name></parameters></parameterGraph>'
+
+    def test_parameter_graph(self):
+        from edacc import parameter_graph
+        graph = parameter_graph.get_parameter_graph(TEST_DATABASE, 1, self.GRAPH)
+        assert graph.get_domain('alpha') == 'realDomain' and graph.get_domain('seed') is None
+        assert (graph.get('alpha').low, graph.get('alpha').high) == (0.5, 2.0)
+        assert graph.get('mode').categories == ['a', 'b']
+        assert parameter_graph.get_parameter_graph(TEST_DATABASE, 1, self.GRAPH) is graph
+        changed = parameter_graph.get_parameter_graph(TEST_DATABASE, 1, self.GRAPH.replace('2.0', '3.0'))
+        assert changed is not graph and changed.get('alpha').high == 3.0
+        from edacc import lru
+        lru.drop_database(TEST_DATABASE)
+        assert not parameter_graph._graphs
+
 class AnalysisTestCase(unittest.TestCase):
     def setUp(self):
         from edacc import models, config
@@ -13,7 +13,7 @@ from flask import Blueprint
 from flask import render_template as render
 from flask import request, session, url_for, redirect
 
-from edacc import config, models
+from edacc import config, models, instrumentation
 from edacc.views.helpers import require_admin
 
 admin = Blueprint('admin', __name__, template_folder='static')
@@ -89,6 +89,20 @@ def databases_remove(database):
     return redirect(url_for('admin.databases'))
 
 
+@admin.route('/admin/instrumentation/')
+@require_admin
+def instrumentation_statistics():
+    """ Show timings collected by this web frontend process, e.g. how long
+        the lazily loaded R, scipy and pygame backends took to load and the
+        connection pool usage of each database.
+    """
+    statistics = instrumentation.get_statistics()
+    backend_load_times = sorted(statistics['backend_load_times'].iteritems())
+    pools = sorted(statistics['pools'].itervalues(), key=lambda p: p['database'].lower())
+    return render('/admin/instrumentation.html', backend_load_times=backend_load_times,
+                  pools=pools)
+
+
 @admin.route('/admin/login/', methods=['GET', 'POST'])
 def admin_login():
     """ Admin login form """
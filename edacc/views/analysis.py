@@ -14,19 +14,18 @@ import numpy
 import StringIO
 import csv
 
-from sqlalchemy.orm import joinedload
 from sqlalchemy import or_, func, and_, not_
 from sqlalchemy.sql import expression, select
 
 from flask import Blueprint
 from flask import render_template as render, g, session
 from flask import abort, request, jsonify, Response
-from werkzeug import Headers, secure_filename
+from werkzeug import Headers, MultiDict, secure_filename
 
-from edacc import models, forms, ranking, statistics, algorithms
+from edacc import models, forms, ranking, statistics, algorithms, sweep, bootstrap, config, selection
 from edacc.web import cache
-from edacc.views.helpers import require_phase, require_login, is_admin
-from edacc.constants import RANKING, ANALYSIS1, ANALYSIS2, OWN_RESULTS
+from edacc.views.helpers import require_phase, require_login, is_admin, selection_cache_key
+from edacc.constants import RANKING, ANALYSIS1, ANALYSIS2, OWN_RESULTS, STATUS_FINISHED
 from edacc.views import plot
 from edacc.forms import EmptyQuery
 
@@ -49,7 +48,7 @@ def careful_solver_ranking(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
     form = forms.RankingForm(request.args)
-    form.i.query = experiment.get_instances(db) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
 
     if form.i.data:
         if form.cost.data == 'None': form.cost.data = experiment.defaultCost
@@ -84,7 +83,7 @@ def survival_solver_ranking(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
     form = forms.RankingForm(request.args)
-    form.i.query = experiment.get_instances(db) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
 
     if form.i.data:
         if form.cost.data == 'None': form.cost.data = experiment.defaultCost
@@ -119,7 +118,7 @@ def solver_ranking(database, experiment_id):
 
     form = forms.RankingForm(request.args)
     if form.cost.data == 'None': form.cost.data = experiment.defaultCost
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.sc.query = experiment.solver_configurations or EmptyQuery()
     if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
         form.sc.query = filter(lambda sc: sc.solver_binary.solver.user == g.User, form.sc.query) or EmptyQuery()
@@ -140,6 +139,37 @@ def solver_ranking(database, experiment_id):
 
         CACHE_TIME = 7 * 24 * 60 * 60
         #CACHE_TIME = 1
+        @cache.memoize(timeout=CACHE_TIME)
+        def cached_sweep_csv(database, experiment_id, solver_config_ids, instance_ids, cost, cutoffs, par_factors,
+                             last_modified_job, job_count, user_id):
+            """ CSV of the ranking for each cutoff (limit, empty: the runs' own limits) and the
+                stability of the ranks over the cutoffs.
+            """
+            runs = sweep.get_sweep_runs(db, experiment, solver_config_ids, instance_ids, cost)
+            result = runs.sweep(solver_config_ids, cutoffs, par_factors)
+            sc_by_id = dict((sc.idSolverConfig, sc) for sc in solver_configs)
+
+            csv_response = StringIO.StringIO()
+            csv_writer = csv.writer(csv_response)
+            csv_writer.writerow(['cutoff', '#', 'Solver', '# of successful runs'] +
+                                ['penalized avg. cost %g' % f for f in par_factors])
+            for c, cutoff in enumerate(cutoffs):
+                for j in numpy.argsort(result.ranks[c]):
+                    csv_writer.writerow([cutoff if cutoff is not None else '', result.ranks[c, j],
+                                         sc_by_id[solver_config_ids[j]].get_name(), result.solved[c, j]] +
+                                        [round(result.par[k, c, j], 4) for k in xrange(len(par_factors))])
+
+            best_ranks, worst_ranks, correlations = result.rank_stability()
+            csv_writer.writerow([])
+            csv_writer.writerow(['Solver', 'best rank', 'worst rank'])
+            for j in numpy.argsort(result.ranks[0]):
+                csv_writer.writerow([sc_by_id[solver_config_ids[j]].get_name(), best_ranks[j], worst_ranks[j]])
+            csv_writer.writerow([])
+            csv_writer.writerow(['cutoff', 'rank correlation with own limits'])
+            for cutoff, correlation in zip(cutoffs, correlations):
+                csv_writer.writerow([cutoff if cutoff is not None else '', round(correlation, 4)])
+            return csv_response.getvalue()
+
         @cache.memoize(timeout=CACHE_TIME)
         def cached_ranking(database, experiment_id, solver_config_ids, sc_names, last_modified_job, show_top,
                            job_count, form_i_data, form_par, form_avg_dev, form_careful_ranking,
@@ -256,21 +286,59 @@ def solver_ranking(database, experiment_id):
                 headers.add('Content-Type', 'text/plain')
                 return Response(response=table, headers=headers)
 
-            GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+            # bootstrap confidence intervals over the instances and the probability of each solver
+            # to swap places with the next one
+            confidence = dict()
+            if cost in ('resultTime', 'wallTime') and config.RANKING_BOOTSTRAP_RESAMPLES > 0:
+                instance_ids = [i.idInstance for i in form.i.data]
+                ranked_ids = [sc.idSolverConfig for sc in ranked_solvers]
+                runs = sweep.get_sweep_runs(db, experiment, ranked_ids, instance_ids, cost)
+                bootstrapped = bootstrap.bootstrap_ranking(ranked_ids,
+                                                           *runs.instance_matrices(ranked_ids, instance_ids,
+                                                                                   form_fixed_limit or None),
+                                                           par_factor=form_par_factor,
+                                                           resamples=config.RANKING_BOOTSTRAP_RESAMPLES,
+                                                           seed=config.RANKING_BOOTSTRAP_SEED)
+                for n, sc_id in enumerate(ranked_ids):
+                    confidence[sc_id] = dict((name, (lower[n], upper[n])) for name, (lower, upper) in
+                                             bootstrapped.intervals.iteritems())
+                    if n + 1 < len(ranked_ids):
+                        confidence[sc_id]['swap'] = bootstrapped.inversion_probability(sc_id, ranked_ids[n + 1])
+
+            GET_data = selection.query_string(database, request.args)
             return render('/analysis/ranking.html', database=database, db=db,
                           experiment=experiment, ranked_solvers=ranked_solvers,
                           careful_rank=careful_rank, survival_rank=survival_rank,
                           data=ranking_data, form=form, instance_properties=db.get_instance_properties(),
-                          GET_data=GET_data,
+                          GET_data=GET_data, confidence=confidence,
                           faulty_solvers_ids=faulty_solvers_ids)
 
-        last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+        # the cache key has to describe the database the ranking data is read from
+        last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
             .filter_by(experiment=experiment).first()
-        job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
+        job_count = db.read_session().query(db.ExperimentResult).filter_by(experiment=experiment).count()
+
+        if 'sweep' in request.args:
+            if form.cost.data not in ('resultTime', 'wallTime'): abort(400)
+            try:
+                cutoffs = sorted(set(float(c) for c in form.sweep_cutoffs.data.split(',') if c.strip()))
+                par_factors = [float(f) for f in form.sweep_par_factors.data.split(',') if f.strip()]
+            except ValueError:
+                abort(400)
+            headers = Headers()
+            headers.add('Content-Type', 'text/csv')
+            headers.add('Content-Disposition', 'attachment',
+                        filename=secure_filename(experiment.name + "_ranking_sweep.csv"))
+            return Response(response=cached_sweep_csv(database, experiment_id, solver_config_ids,
+                                                      [i.idInstance for i in form.i.data], form.cost.data,
+                                                      [None] + cutoffs, par_factors or [1.0], last_modified_job,
+                                                      job_count, session.get('idUser', None)),
+                            headers=headers)
 
         return cached_ranking(database, experiment_id, solver_config_ids,
                               ''.join(sc.get_name() for sc in solver_configs),
-                              last_modified_job, show_top, job_count, [i.idInstance for i in form.i.data],
+                              last_modified_job, show_top, job_count,
+                              selection_cache_key([i.idInstance for i in form.i.data], 'i'),
                               form.penalized_average_runtime.data, form.calculate_average_dev.data,
                               form.careful_ranking.data, form.careful_ranking_noise.data or 1.0,
                               form.survival_ranking.data,
@@ -292,7 +360,7 @@ def sota_solvers(database, experiment_id):
 
     form = forms.SOTAForm(request.args)
     if form.cost.data == 'None': form.cost.data = experiment.defaultCost
-    form.i.query = experiment.get_instances(db) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.sc.query = experiment.solver_configurations or EmptyQuery()
 
     if form.i.data:
@@ -309,20 +377,10 @@ def sota_solvers(database, experiment_id):
             ranking_data, vbs_uses_solver_count = ranking.get_ranking_data(db, experiment, ranked_solvers, form.i.data,
                                                                            False, False, form.cost.data)
             result_matrix, _, _ = experiment.get_result_matrix(db, form.sc.data, form.i.data, form.cost.data)
-            sc_correlation = dict((sc, dict()) for sc in form.sc.data)
-            for sc1 in form.sc.data:
-                for sc2 in form.sc.data:
-                    if sc1 == sc2: sc_correlation[sc1][sc2] = sc_correlation[sc2][sc1] = 1.0; continue
-                    if sc1 in sc_correlation and sc2 in sc_correlation[sc1]: continue
-                    v1 = []
-                    v2 = []
-                    for instance in form.i.data:
-                        for sc1run, sc2run in zip(result_matrix[instance.idInstance][sc1.idSolverConfig],
-                                                  result_matrix[instance.idInstance][sc2.idSolverConfig]):
-                            v1.append(sc1run.penalized_time1)
-                            v2.append(sc2run.penalized_time1)
-                    sc_correlation[sc1][sc2] = statistics.spearman_correlation(v1, v2)[0]
-                    sc_correlation[sc2][sc1] = sc_correlation[sc1][sc2]
+            coefficients, _ = statistics.correlation_matrix(
+                statistics.aligned_run_matrix(result_matrix, form.sc.data, form.i.data))
+            sc_correlation = dict((sc1, dict((sc2, float(coefficients[i, j])) for j, sc2 in enumerate(form.sc.data)))
+                                  for i, sc1 in enumerate(form.sc.data))
 
             solved_instances = experiment.get_solved_instance_ids_by_solver_id(db, form.i.data, form.sc.data)
             solved_instance_ids = set()
@@ -346,7 +404,7 @@ def sota_solvers(database, experiment_id):
                 unique_params_by_sc[sc] = unique_params + '&' + '&'.join(
                     "i=%d" % (i,) for i in unique_solver_contribs[sc])
 
-            GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+            GET_data = selection.query_string(database, request.args)
 
             return render("/analysis/sota_solvers.html", database=database, db=db, form=form,
                           instance_properties=db.get_instance_properties(), experiment=experiment,
@@ -363,7 +421,8 @@ def sota_solvers(database, experiment_id):
 
         return cached_sota_solvers(database, experiment_id, solver_config_ids,
                                    ''.join(sc.get_name() for sc in form.sc.data),
-                                   instance_ids, job_count, last_modified_job, session.get('idUser', None))
+                                   selection_cache_key(instance_ids, 'i'), job_count, last_modified_job,
+                                   session.get('idUser', None))
 
     return render("/analysis/sota_solvers.html", database=database, db=db, form=form,
                   instance_properties=db.get_instance_properties(), experiment=experiment,
@@ -385,7 +444,7 @@ def cactus_plot(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
     form = forms.CactusPlotForm(request.args)
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     result_properties = db.get_plotable_result_properties()
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
@@ -398,7 +457,7 @@ def cactus_plot(database, experiment_id):
                         ('median', 'All runs - median'),
                         ('random', 'Random run')] + zip(range(numRuns), ["#" + str(i) for i in range(numRuns)])
 
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     return render('/analysis/solved_instances.html', database=database,
                   experiment=experiment, db=db, form=form, GET_data=GET_data,
@@ -425,14 +484,14 @@ def result_property_comparison(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
     form = forms.RTDComparisonForm(request.args)
-    form.i.query = experiment.get_instances(db) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.solver_config1.query = experiment.solver_configurations or EmptyQuery()
     form.solver_config2.query = experiment.solver_configurations or EmptyQuery()
     result_properties = db.get_plotable_result_properties()
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     if form.solver_config1.data and form.solver_config2.data and form.i.data:
         instance_ids = [i.idInstance for i in form.i.data]
@@ -504,14 +563,14 @@ def property_distributions(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
     form = forms.RTDPlotsForm(request.args)
-    form.instance.query = experiment.get_instances(db) or EmptyQuery()
+    form.instance.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.sc.query = experiment.solver_configurations or EmptyQuery()
     result_properties = db.get_plotable_result_properties()
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
 
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     return render('/analysis/property_distributions.html', database=database,
                   experiment=experiment, db=db, form=form, GET_data=GET_data,
@@ -537,7 +596,7 @@ def scatter_2solver_1property(database, experiment_id):
     form = forms.TwoSolversOnePropertyScatterPlotForm(request.args)
     form.solver_config1.query = experiment.solver_configurations or EmptyQuery()
     form.solver_config2.query = experiment.solver_configurations or EmptyQuery()
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.run.choices = [('average', 'All runs - average'),
                         ('median', 'All runs - median'),
                         ('all', 'All runs')
@@ -545,7 +604,7 @@ def scatter_2solver_1property(database, experiment_id):
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
 
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     spearman_r, spearman_p_value = None, None
     pearson_r, pearson_p_value = None, None
@@ -600,13 +659,13 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
     form.instance_property.choices = instance_properties
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.run.choices = [('average', 'All runs - average'),
                         ('median', 'All runs - median'),
                         ('all', 'All runs')
                        ] + runs
 
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
     spearman_r, spearman_p_value = None, None
     pearson_r, pearson_p_value = None, None
     if form.solver_config.data and form.instance_property.data:
@@ -660,13 +719,13 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
                                      ('cost', 'Cost')] + result_properties
     form.result_property2.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                      ('cost', 'Cost')] + result_properties
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.run.choices = [('average', 'All runs - average'),
                         ('median', 'All runs - median'),
                         ('all', 'All runs')
                        ] + runs
 
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
     spearman_r, spearman_p_value = None, None
     pearson_r, pearson_p_value = None, None
     if form.solver_config.data:
@@ -708,13 +767,13 @@ def property_distribution(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
     form = forms.RTDPlotForm(request.args)
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.sc.query = experiment.solver_configurations or EmptyQuery()
     result_properties = db.get_plotable_result_properties()
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     return render('/analysis/property_distribution.html', database=database, experiment=experiment,
                   db=db, form=form, GET_data=GET_data,
@@ -739,7 +798,7 @@ def probabilistic_domination(database, experiment_id):
     form = forms.ProbabilisticDominationForm(request.args)
     form.solver_config1.query = experiment.solver_configurations or EmptyQuery()
     form.solver_config2.query = experiment.solver_configurations or EmptyQuery()
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     result_properties = db.get_plotable_result_properties() # plotable = numeric
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
@@ -748,50 +807,20 @@ def probabilistic_domination(database, experiment_id):
     if form.solver_config1.data and form.solver_config2.data:
         instances = db.session.query(db.Instance).filter(
             db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()
-        instance_ids = [i.idInstance for i in instances]
-        sc1 = form.solver_config1.data
-        sc2 = form.solver_config2.data
-
-        query = db.session.query(db.ExperimentResult)
-        query = query.enable_eagerloads(True).options(joinedload(db.ExperimentResult.properties))
-
-        sc1_results_by_instance_id = {}
-        sc2_results_by_instance_id = {}
-        for r in query.filter_by(experiment=experiment, solver_configuration=sc1).filter(
-                db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all():
-            if r.Instances_idInstance in sc1_results_by_instance_id:
-                sc1_results_by_instance_id[r.Instances_idInstance].append(r)
-            else:
-                sc1_results_by_instance_id[r.Instances_idInstance] = [r]
-
-        for r in query.filter_by(experiment=experiment, solver_configuration=sc2).filter(
-                db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all():
-            if r.Instances_idInstance in sc2_results_by_instance_id:
-                sc2_results_by_instance_id[r.Instances_idInstance].append(r)
-            else:
-                sc2_results_by_instance_id[r.Instances_idInstance] = [r]
-
         sc1_dom_sc2 = []
         sc2_dom_sc1 = []
         no_dom = []
 
-        for instance in instances:
-            if instance.idInstance not in sc1_results_by_instance_id: continue
-            if instance.idInstance not in sc2_results_by_instance_id: continue
-            res1 = [r.get_property_value(form.result_property.data, db) for r in
-                    sc1_results_by_instance_id[instance.idInstance]]
-            res2 = [r.get_property_value(form.result_property.data, db) for r in
-                    sc2_results_by_instance_id[instance.idInstance]]
-            res1 = filter(lambda r: r is not None, res1)
-            res2 = filter(lambda r: r is not None, res2)
-            if len(res1) > 0 and len(res2) > 0:
-                d = statistics.prob_domination(res1, res2)
-                if d == 1:
-                    sc1_dom_sc2.append(instance)
-                elif d == -1:
-                    sc2_dom_sc1.append(instance)
-                else:
-                    no_dom.append(instance)
+        for instance, d, has_results in iter_domination_matrices(
+                db, experiment, [form.solver_config1.data, form.solver_config2.data], instances,
+                form.result_property.data):
+            if not has_results.all(): continue
+            if d[0, 1] == 1:
+                sc1_dom_sc2.append(instance)
+            elif d[0, 1] == -1:
+                sc2_dom_sc1.append(instance)
+            else:
+                no_dom.append(instance)
 
         num_total = max(max(len(sc1_dom_sc2), len(sc2_dom_sc1)), len(no_dom))
 
@@ -805,6 +834,105 @@ def probabilistic_domination(database, experiment_id):
                   experiment=experiment, form=form, instance_properties=db.get_instance_properties())
 
 
+def domination_values(runs, result_property):
+    """ Returns the values of the runs the probabilistic domination is
+        computed from. Like ExperimentResult.get_time, CPU times are only
+        taken from runs with status 1 or 21, the other result properties
+        from all runs with a value.
+    """
+    if result_property == 'resultTime':
+        return [r.resultTime for r in runs if r.status in (STATUS_FINISHED, 21) and r.resultTime is not None]
+    return [r.resultTime for r in runs if r.resultTime is not None]
+
+
+def iter_domination_matrices(db, experiment, solver_configs, instances, result_property):
+    """ Yields a tuple (instance, probabilistic domination matrix of the
+        solver configurations on the instance, boolean array telling which
+        solver configurations have results on the instance) for each
+        instance, see statistics.prob_domination_matrix. The results of all
+        solver configurations and instances are read with a single query,
+        the matrices are computed one instance at a time.
+    """
+    result_matrix, _, _ = experiment.get_result_matrix(db, solver_configs, instances, result_property)
+    for instance in instances:
+        values = [domination_values(result_matrix[instance.idInstance][sc.idSolverConfig], result_property)
+                  for sc in solver_configs]
+        yield (instance, statistics.prob_domination_matrix(values),
+               numpy.array([len(v) > 0 for v in values], dtype=bool))
+
+
+@analysis.route('/<database>/experiment/<int:experiment_id>/probabilistic-domination-matrix/')
+@require_phase(phases=ANALYSIS2)
+@require_login
+def probabilistic_domination_matrix(database, experiment_id):
+    """
+        Displays the probabilistic domination relation of all pairs of the
+        selected solver configurations: for each pair (A, B) the number of
+        instances where A prob. dominates B and the number of instances with
+        crossovers in the RTD's CDF. The instances of a pair are listed by
+        the probabilistic_domination page.
+    """
+    db = models.get_database(database) or abort(404)
+    experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+
+    form = forms.ProbabilisticDominationMatrixForm(request.args)
+    form.sc.query = experiment.solver_configurations or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
+    result_properties = db.get_plotable_result_properties() # plotable = numeric
+    result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
+    form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
+                                    ('cost', 'Cost')] + result_properties
+
+    if form.sc.data and form.i.data:
+        solver_configs = form.sc.data
+        instances = form.i.data
+
+        @cache.memoize(7 * 24 * 60 * 60)
+        def cached_domination_counts(database, experiment_id, solver_config_ids, instance_ids, result_property,
+                                     job_count, last_modified_job):
+            dominates = numpy.zeros((len(solver_configs), len(solver_configs)), dtype=int)
+            crossovers = numpy.zeros((len(solver_configs), len(solver_configs)), dtype=int)
+            # add up each instance's matrix as it is computed
+            for _, d, has_results in iter_domination_matrices(db, experiment, solver_configs, instances,
+                                                              result_property):
+                compared = numpy.outer(has_results, has_results)
+                numpy.fill_diagonal(compared, False)
+                dominates += (d == 1) & compared
+                crossovers += (d == 0) & compared
+            return dominates.tolist(), crossovers.tolist()
+
+        last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
+            .filter_by(experiment=experiment).first()
+        job_count = db.read_session().query(db.ExperimentResult).filter_by(experiment=experiment).count()
+        dominates, crossovers = cached_domination_counts(database, experiment_id,
+                                                         [sc.idSolverConfig for sc in solver_configs],
+                                                         selection_cache_key([i.idInstance for i in instances], 'i'),
+                                                         form.result_property.data, job_count, last_modified_job)
+
+        if request.args.has_key('csv'):
+            csv_response = StringIO.StringIO()
+            csv_writer = csv.writer(csv_response)
+            csv_writer.writerow(['dominates / crossovers'] + [sc.name for sc in solver_configs])
+            for sc, dominates_row, crossovers_row in zip(solver_configs, dominates, crossovers):
+                csv_writer.writerow([sc.name] + ['%d / %d' % (d, c) for d, c in zip(dominates_row, crossovers_row)])
+            csv_response.seek(0)
+            headers = Headers()
+            headers.add('Content-Type', 'text/csv')
+            headers.add('Content-Disposition', 'attachment',
+                        filename=secure_filename(experiment.name + "_probabilistic_domination.csv"))
+            return Response(response=csv_response.read(), headers=headers)
+
+        instances_data = selection.query_string(database, MultiDict([('i', str(i.idInstance)) for i in instances]))
+        return render('/analysis/probabilistic_domination_matrix.html', database=database, db=db,
+                      experiment=experiment, form=form, solver_configs=solver_configs, dominates=dominates,
+                      crossovers=crossovers, instances_data=instances_data,
+                      GET_data=selection.query_string(database, request.args),
+                      instance_properties=db.get_instance_properties())
+
+    return render('/analysis/probabilistic_domination_matrix.html', database=database, db=db,
+                  experiment=experiment, form=form, instance_properties=db.get_instance_properties())
+
+
 @analysis.route('/<database>/experiment/<int:experiment_id>/box-plots/')
 @require_phase(phases=ANALYSIS2)
 @require_login
@@ -817,12 +945,12 @@ def box_plots(database, experiment_id):
 
     form = forms.BoxPlotForm(request.args)
     form.solver_configs.query = experiment.solver_configurations or EmptyQuery()
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     result_properties = db.get_plotable_result_properties()
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     return render('/analysis/box_plots.html', database=database, db=db,
                   experiment=experiment, form=form, GET_data=GET_data,
@@ -841,7 +969,7 @@ def runtime_matrix_plot(database, experiment_id):
     result_properties = zip([p.idProperty for p in result_properties], [p.name for p in result_properties])
     form.result_property.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                                     ('cost', 'Cost')] + result_properties
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
     if request.args.get('measure') is None: GET_data += "&measure=par10"
 
     return render('/analysis/runtime_matrix_plot.html', database=database, db=db,
@@ -856,17 +984,15 @@ def parameter_plot_1d(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
     if not experiment.configurationExp: abort(404)
 
-    cs_params = [param for param in experiment.configuration_scenario.parameters if param.configurable and \
-                                                                                    experiment.configuration_scenario.get_parameter_domain(
-                                                                                        param.parameter.name) in (
-                                                                                    'realDomain', 'integerDomain',
-                                                                                    'ordinalDomain',
-                                                                                    'categoricalDomain')]
+    graph = experiment.configuration_scenario.get_parameter_graph()
+    cs_params = [param for param in experiment.configuration_scenario.parameters if param.configurable and
+                 graph is not None and graph.get_domain(param.parameter.name) in
+                 ('realDomain', 'integerDomain', 'ordinalDomain', 'categoricalDomain')]
 
     form = forms.ParameterPlot1DForm(request.args)
     form.parameter.choices = [(p.parameter.idParameter, p.parameter.name) for p in cs_params]
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
+    GET_data = selection.query_string(database, request.args)
 
     max_runtime = None
     if form.i.data:
@@ -902,17 +1028,15 @@ def parameter_plot_2d(database, experiment_id):
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
     if not experiment.configurationExp: abort(404)
 
-    cs_params = [param for param in experiment.configuration_scenario.parameters if param.configurable and \
-                                                                                    experiment.configuration_scenario.get_parameter_domain(
-                                                                                        param.parameter.name) in (
-                                                                                    'realDomain', 'integerDomain',
-                                                                                    'ordinalDomain',
-                                                                                    'categoricalDomain')]
+    graph = experiment.configuration_scenario.get_parameter_graph()
+    cs_params = [param for param in experiment.configuration_scenario.parameters if param.configurable and
+                 graph is not None and graph.get_domain(param.parameter.name) in
+                 ('realDomain', 'integerDomain', 'ordinalDomain', 'categoricalDomain')]
 
     form = forms.ParameterPlot2DForm(request.args)
     form.parameter1.choices = [(p.parameter.idParameter, p.parameter.name) for p in cs_params]
     form.parameter2.choices = reversed([(p.parameter.idParameter, p.parameter.name) for p in cs_params])
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
 
     table = db.metadata.tables['ExperimentResults']
     to_expr = (experiment.costPenalty if experiment.defaultCost == 'cost' else table.c['CPUTimeLimit'] if experiment.defaultCost == 'resultTime' else table.c['wallClockTimeLimit'])
@@ -927,13 +1051,13 @@ def parameter_plot_2d(database, experiment_id):
                from_obj=table).group_by(table.c['Instances_idInstance'])
     instance_avg = db.session.connection().execute(s)
 
-    avg_by_instance = dict((instance.idInstance, 0) for instance in experiment.get_instances(db))
+    avg_by_instance = dict((instance.idInstance, 0) for instance in form.i.query)
     for avg in instance_avg:
         avg_by_instance[avg[0]] = avg[1]
 
     form.i.query.sort(key=lambda i: avg_by_instance[i.idInstance])
 
-    GET_data = "&".join(['='.join(list(t)) for t in request.args.items(multi=True)])
+    GET_data = selection.query_string(database, request.args)
 
     max_runtime = None
     if form.i.data:
@@ -28,14 +28,46 @@ from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 
 from werkzeug import Headers, secure_filename
-from flask import abort, Blueprint, Response
+from flask import abort, Blueprint, Response, request
 
-from edacc import models
+from edacc import models, selection
+from edacc.views.helpers import require_phase, require_login
+from edacc.constants import RANKING
 
 api = Blueprint('api', __name__, template_folder='static')
 
 # TODO: restricted access
 
+@api.route('/api/<database>/selection/', methods=['POST'])
+@require_phase(phases=RANKING)
+@require_login
+def store_selection(database):
+    """ Stores the instance and solver configuration IDs posted as i, sc
+        (and i1, i2, ... for instance groups) and returns the ID that can be
+        passed as selection=<ID> instead of them. Like the analysis pages
+        that create selections, this requires a login to competition
+        databases.
+    """
+    models.get_database(database) or abort(404)
+    ids_by_argument = dict((name, request.form.getlist(name)) for name in request.form
+                           if selection.SELECTION_ARGUMENT.match(name))
+    try:
+        selection_id = selection.store_selection(database, ids_by_argument)
+    except ValueError:
+        abort(400)
+    except (OSError, IOError):
+        abort(503)
+    return json_dumps({'selection': selection_id})
+
+
+@api.route('/api/<database>/selection/<selection_id>/')
+def get_selection(database, selection_id):
+    models.get_database(database) or abort(404)
+    ids_by_argument = selection.load_selection(database, selection_id)
+    if ids_by_argument is None: abort(404)
+    return json_dumps(ids_by_argument)
+
+
 @api.route('/api/<database>/experiment-result/<int:id>/')
 def get_experiment_result(database, id):
     db = models.get_database(database) or abort(404)
@@ -104,7 +136,8 @@ def configuration_runs(database, experiment_id):
     parameter_instances = db.session.query(db.ParameterInstance).options(joinedload('parameter')).filter(
         db.ParameterInstance.SolverConfig_idSolverConfig.in_(solver_config_ids)).all()
 
-    instances_by_id = dict((i.idInstance, i) for i in experiment.get_instances(db))
+    instance_catalogue = experiment.get_instance_catalogue(db)
+    instances_by_id = instance_catalogue.by_id
     instance_properties = [p for p in db.session.query(db.Property) if p.is_instance_property()]
 
     parameter_values = dict()
@@ -114,8 +147,8 @@ def configuration_runs(database, experiment_id):
             parameter_values[pv.SolverConfig_idSolverConfig] = dict()
         parameter_values[pv.SolverConfig_idSolverConfig][pv.Parameters_idParameter] = pv.value
 
-    results, _, _ = experiment.get_result_matrix(db, experiment.solver_configurations, experiment.get_instances(db),
-                                                 cost=experiment.defaultCost)
+    results, _, _ = experiment.get_result_matrix(db, experiment.solver_configurations,
+                                                 instance_catalogue.get_instances(), cost=experiment.defaultCost)
 
     csv_response = StringIO.StringIO()
     csv_writer = csv.writer(csv_response)
@@ -22,6 +22,7 @@ except ImportError:
         from json import dumps as json_dumps
 
 import numpy
+import re
 import StringIO
 import tempfile
 import tarfile
@@ -29,15 +30,14 @@ import time
 import os
 
 from PIL import Image
-from scipy.stats.mstats import mquantiles
 import flask
 from flask import Blueprint
 from flask import render_template as render
 from flask import Response, abort, g, request, redirect, url_for
 from werkzeug import Headers, secure_filename
 
-from edacc import utils, models
-from sqlalchemy.orm import joinedload, joinedload_all
+from edacc import utils, models, summary
+from sqlalchemy.orm import joinedload, joinedload_all, lazyload
 from sqlalchemy import func, text as sqla_text
 from sqlalchemy.sql import not_
 from edacc.constants import *
@@ -46,6 +46,7 @@ from edacc.views.helpers import require_login, is_admin
 from edacc import forms
 from edacc.forms import EmptyQuery
 from edacc import monitor, clientMonitor
+from edacc.web import cache
 from edacc import config
 from edacc import config_visualisation
 
@@ -186,7 +187,7 @@ def experiment_instances(database, experiment_id):
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    instances = experiment.get_instances(db)
+    instances = experiment.get_instance_catalogue(db).get_instances()
     instance_properties = db.get_instance_properties()
 
     if request.args.has_key('csv'):
@@ -219,10 +220,14 @@ def download_instances(database, experiment_id):
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    instances = experiment.get_instances(db)
+    instance_catalogue = experiment.get_instance_catalogue(db)
+    # the class paths come from the catalogue, don't join the instance classes
+    instances = db.session.query(db.Instance).options(lazyload('instance_classes')) \
+        .filter(db.Instance.experiments.contains(experiment)).all()
     for instance in instances:
         instance_blob, compressed = instance.get_compressed_instance(db)
-        instance_path = os.path.join(config.TEMP_DIR, 'tarballs', str(g.unique_id), *(instance.get_class_hierarchy()))
+        instance_path = os.path.join(config.TEMP_DIR, 'tarballs', str(g.unique_id),
+                                     *(instance_catalogue.get(instance.idInstance).get_class_hierarchy()))
         try:
             os.makedirs(instance_path)
         except:
@@ -280,7 +285,7 @@ def experiment_results(database, experiment_id):
     form.cost.choices = [('resultTime', 'CPU Time'), ('wallTime', 'Wall Clock Time'),
                          ('cost', 'Cost')] + result_properties
     if form.cost.data == 'None': form.cost.data = experiment.defaultCost
-    form.i.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.i.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     form.solver_configs.query = solver_configs or EmptyQuery()
 
     if form.i.data:
@@ -304,7 +309,7 @@ def experiment_results(database, experiment_id):
         instances_dict = dict((i.idInstance, i) for i in instances)
         solver_configs_dict = dict((sc.idSolverConfig, sc) for sc in solver_configs)
 
-        results_by_instance, S, C = experiment.get_result_matrix(db, solver_configs, instances, cost=form_cost)
+        results_summary = summary.get_summary(db, experiment.idExperiment, form_cost)
 
         times_by_solver = dict((sc_id, list()) for sc_id in solver_configs_dict.iterkeys())
         cv_by_solver = dict((sc_id, list()) for sc_id in solver_configs_dict.iterkeys())
@@ -313,39 +318,27 @@ def experiment_results(database, experiment_id):
         best_sc_by_instance_id = {}
         for idInstance in instances_dict.iterkeys():
             row = []
-            if idInstance not in results_by_instance: continue
-            rs = results_by_instance[idInstance]
             best_sc_by_instance_id[idInstance] = None
             best_sc_time = None
 
             for solver_config in solver_configs:
                 idSolverConfig = solver_config.idSolverConfig
-                jobs = rs.get(idSolverConfig, [])
+                cell = results_summary.get(idSolverConfig, idInstance)
 
-                completed = C[idInstance][idSolverConfig]
-                successful = S[idInstance][idSolverConfig]
-                runtimes = [j.resultTime for j in jobs if j.resultTime is not None]
+                completed = cell.completed
+                successful = cell.successful
+                runtimes = cell.costs
 
                 time_measure = None
                 coeff_variation = None
                 quartile_coeff_dispersion = None
                 if len(runtimes) > 0 or form.display_measure.data in (
                     'par10', 'par1') or form.display_measure.data is None:
-                    if form.display_measure.data == 'mean':
-                        time_measure = numpy.average(runtimes)
-                    elif form.display_measure.data == 'median':
-                        time_measure = numpy.median(runtimes)
-                    elif form.display_measure.data == 'min':
-                        time_measure = min(runtimes)
-                    elif form.display_measure.data == 'max':
-                        time_measure = max(runtimes)
-                    elif form.display_measure.data == 'par1':
-                        time_measure = numpy.average([j.penalized_time1 for j in jobs] or [0])
-                    elif form.display_measure.data == 'par10' or form.display_measure.data is None:
-                        time_measure = numpy.average([j.penalized_time10 for j in jobs] or [0])
+                    time_measure = cell.measure(form.display_measure.data)
 
                     times_by_solver[idSolverConfig].append(time_measure)
                     if form.calculate_dispersion.data:
+                        from scipy.stats.mstats import mquantiles
                         coeff_variation = numpy.std(runtimes) / numpy.average(runtimes)
                         quantiles = mquantiles(runtimes, [0.25, 0.5, 0.75])
                         quartile_coeff_dispersion = (quantiles[2] - quantiles[0]) / quantiles[1]
@@ -375,9 +368,9 @@ def experiment_results(database, experiment_id):
                             'successful': successful,
                             'completed': completed,
                             'bg_color': bg_color,
-                            'total': len(jobs),
+                            'total': cell.runs,
                             # needed for alternative presentation if there's only 1 run:
-                            'first_job': (None if len(jobs) == 0 else jobs[0]),
+                            'first_job': cell.first_job,
                             'solver_config': solver_config,
                 })
             results.append({'instance': instances_dict[idInstance], 'times': row, 'best_time': best_sc_time})
@@ -476,10 +469,11 @@ def experiment_results_full_csv(database, experiment_id):
 
     solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
 
-    results, _, _ = experiment.get_result_matrix(db, solver_configs, experiment.instances,
+    instances = experiment.get_instance_catalogue(db).get_instances()
+    results, _, _ = experiment.get_result_matrix(db, solver_configs, instances,
                                                  cost=request.args.get('cost', 'resultTime'))
-    name_by_instance = dict((i.idInstance, i.name) for i in experiment.instances)
-    md5_by_instance = dict((i.idInstance, i.md5) for i in experiment.instances)
+    name_by_instance = dict((i.idInstance, i.name) for i in instances)
+    md5_by_instance = dict((i.idInstance, i.md5) for i in instances)
 
     csv_response = StringIO.StringIO()
     csv_writer = csv.writer(csv_response)
@@ -568,7 +562,9 @@ def experiment_results_by_solver(database, experiment_id):
             ),
             from_obj=table.join(table_result_codes).join(table_instances)).order_by(table.c['run'])"""
 
-        results, _, _ = experiment.get_result_matrix(db, [solver_config], experiment.instances, form.cost.data)
+        instance_catalogue = experiment.get_instance_catalogue(db)
+        instances = instance_catalogue.get_instances()
+        results, _, _ = experiment.get_result_matrix(db, [solver_config], instances, form.cost.data)
 
         mean_by_instance = {}
         par10_by_instance = {} # penalized average runtime (timeout * 10 for unsuccessful runs) by instance
@@ -576,14 +572,12 @@ def experiment_results_by_solver(database, experiment_id):
         std_by_instance = {}
         runs_by_instance = {}
         jobs_by_instance = {}
-        name_by_instance = dict((i.idInstance, i.name) for i in experiment.instances)
-        md5_by_instance = dict((i.idInstance, i.md5) for i in experiment.instances)
-        for i in experiment.instances:
+        name_by_instance = dict((i.idInstance, i.name) for i in instances)
+        md5_by_instance = dict((i.idInstance, i.md5) for i in instances)
+        for i in instances:
             runs_by_instance[i.idInstance] = results[i.idInstance][solver_config.idSolverConfig]
 
-        instance_by_id = {}
-        for instance in experiment.get_instances(db):
-            instance_by_id[instance.idInstance] = instance
+        instance_by_id = instance_catalogue.by_id
 
         for instance in runs_by_instance.keys():
             total_time, count = 0.0, 0
@@ -665,7 +659,7 @@ def experiment_results_by_instance(database, experiment_id):
 
     form = forms.ResultByInstanceForm(request.args)
     if form.cost.data == 'None': form.cost.data = experiment.defaultCost
-    form.instance.query = sorted(experiment.get_instances(db), key=lambda i: i.get_name()) or EmptyQuery()
+    form.instance.query = experiment.get_instance_catalogue(db).get_instances() or EmptyQuery()
     num_runs = experiment.get_max_num_runs(db)
 
     results = []
@@ -709,6 +703,7 @@ def experiment_results_by_instance(database, experiment_id):
                     mean = numpy.average(runtimes)
                     median = numpy.median(runtimes)
                     cv = numpy.std(runtimes) / mean
+                    from scipy.stats.mstats import mquantiles
                     quantiles = mquantiles(runtimes, [0.25, 0.5, 0.75])
                     qcd = (quantiles[2] - quantiles[0]) / quantiles[1]
 
@@ -896,6 +891,23 @@ def experiment_stats_ajax(database, experiment_id):
     })
 
 
+def _running_time_column(conn):
+    """ Returns the SQL expression of the seconds since a job was started. """
+    if conn.dialect.name == 'sqlite':
+        return "CAST(strftime('%%s', 'now') - strftime('%%s', ExperimentResults.startTime) AS INTEGER)"
+    return "TIMESTAMPDIFF(SECOND, ExperimentResults.startTime, NOW())"
+
+
+def _execute(conn, query, params):
+    """ Executes the query with format style parameters (%s, literal % as
+        %%) with the paramstyle of the connection, e.g. the qmark style (?)
+        of SQLite snapshots.
+    """
+    if conn.dialect.paramstyle == 'qmark':
+        query = re.sub('%([%s])', lambda m: '?' if m.group(1) == 's' else '%', query)
+    return conn.execute(query, tuple(params))
+
+
 @frontend.route('/<database>/experiment/<int:experiment_id>/experiment-results-csv/')
 @require_phase(phases=OWN_RESULTS.union(ALL_RESULTS))
 @require_login
@@ -934,15 +946,15 @@ def experiment_results_csv(database, experiment_id):
                       """ % (
             prop.name.replace("%", "%%"), prop.name.replace("%", "%%"), prop.name.replace("%", "%%"), prop.idProperty)
 
-    conn = db.session.connection()
-    base_query = """SELECT SQL_CALC_FOUND_ROWS ExperimentResults.idJob,
+    conn = db.read_session().connection()
+    base_query = """SELECT ExperimentResults.idJob,
                        SolverConfig.name, Instances.name, Instances.md5,
                        ExperimentResults.run, ExperimentResults.resultTime, ExperimentResults.wallTime, ExperimentResults.cost,
                        ExperimentResults.seed, ExperimentResults.status,
                        ExperimentResults.resultCode,
                        StatusCodes.description, ResultCodes.description,
                        CASE
-                           WHEN status=0 THEN TIMESTAMPDIFF(SECOND, ExperimentResults.startTime, NOW())
+                           WHEN status=0 THEN """ + _running_time_column(conn) + """
                            ELSE 0
                        END as runningTime,
                        ExperimentResults.CPUTimeLimit, ExperimentResults.wallClockTimeLimit, ExperimentResults.memoryLimit,
@@ -964,10 +976,10 @@ def experiment_results_csv(database, experiment_id):
 
     # if competition db, show only own solvers unless phase is 6 or 7
     if not is_admin() and db.is_competition() and db.competition_phase() in OWN_RESULTS:
-        res = conn.execute(base_query + """ AND Solver.User_idUser = %s """, (experiment_id, g.User.idUser))
+        res = _execute(conn, base_query + """ AND Solver.User_idUser = %s """, (experiment_id, g.User.idUser))
         jobs = res.fetchall()
     else:
-        res = conn.execute(base_query, (experiment_id, ))
+        res = _execute(conn, base_query, (experiment_id, ))
         jobs = res.fetchall()
 
     csv_response = StringIO.StringIO()
@@ -1085,19 +1097,30 @@ def experiment_progress_ajax(database, experiment_id):
         order = order[:-2]
 
     limit = ""
+    limit_params = []
     if request.args.get('iDisplayStart', '') != '' and int(request.args.get('iDisplayLength', -1)) != -1:
         limit = "LIMIT %s, %s"
-        params.append(int(request.args.get('iDisplayStart')))
-        params.append(int(request.args.get('iDisplayLength')))
+        limit_params.append(int(request.args.get('iDisplayStart')))
+        limit_params.append(int(request.args.get('iDisplayLength')))
 
-    conn = db.session.connection()
-    res = conn.execute("""SELECT SQL_CALC_FOUND_ROWS ExperimentResults.idJob,
+    conn = db.read_session().connection()
+    from_clause = """FROM ExperimentResults
+                    LEFT JOIN ResultCodes ON ExperimentResults.resultCode=ResultCodes.resultCode
+                    LEFT JOIN StatusCodes ON ExperimentResults.status=StatusCodes.statusCode
+                    LEFT JOIN SolverConfig ON ExperimentResults.SolverConfig_idSolverConfig = SolverConfig.idSolverConfig
+                    LEFT JOIN SolverBinaries ON SolverBinaries.idSolverBinary = SolverConfig.SolverBinaries_idSolverBinary
+                    LEFT JOIN Solver ON Solver.idSolver = SolverBinaries.idSolver
+                    LEFT JOIN Instances ON ExperimentResults.Instances_idInstance = Instances.idInstance
+                    LEFT JOIN gridQueue ON gridQueue.idgridQueue=ExperimentResults.computeQueue
+                    """ + prop_joins + """
+                 WHERE """ + where_clause
+    res = _execute(conn, """SELECT ExperimentResults.idJob,
                        SolverConfig.name, Instances.name,
                        ExperimentResults.run, ExperimentResults.resultTime, ExperimentResults.wallTime, ExperimentResults.cost,
                        ExperimentResults.seed,
                        StatusCodes.description,
                        CASE
-                           WHEN status=0 THEN TIMESTAMPDIFF(SECOND, ExperimentResults.startTime, NOW())
+                           WHEN status=0 THEN """ + _running_time_column(conn) + """
                            ELSE 0
                        END as runningTime,
                        ResultCodes.description, ExperimentResults.status,
@@ -1106,24 +1129,16 @@ def experiment_progress_ajax(database, experiment_id):
                        ExperimentResults.computeNode, ExperimentResults.computeNodeIP, ExperimentResults.priority,
                        gridQueue.name
                        """ + (',' if prop_columns else '') + prop_columns + """
-                 FROM ExperimentResults
-                    LEFT JOIN ResultCodes ON ExperimentResults.resultCode=ResultCodes.resultCode
-                    LEFT JOIN StatusCodes ON ExperimentResults.status=StatusCodes.statusCode
-                    LEFT JOIN SolverConfig ON ExperimentResults.SolverConfig_idSolverConfig = SolverConfig.idSolverConfig
-                    LEFT JOIN SolverBinaries ON SolverBinaries.idSolverBinary = SolverConfig.SolverBinaries_idSolverBinary
-                    LEFT JOIN Solver ON Solver.idSolver = SolverBinaries.idSolver
-                    LEFT JOIN Instances ON ExperimentResults.Instances_idInstance = Instances.idInstance
-                    LEFT JOIN gridQueue ON gridQueue.idgridQueue=ExperimentResults.computeQueue
-                    """ + prop_joins + """
-                 WHERE """ + where_clause + " " + order + " " + limit, tuple(params))
+                 """ + from_clause + " " + order + " " + limit, params + limit_params)
 
     jobs = res.fetchall()
 
-    res = conn.execute("SELECT FOUND_ROWS()")
+    # a separate count instead of MySQL's SQL_CALC_FOUND_ROWS, which SQLite snapshots don't have
+    res = _execute(conn, "SELECT COUNT(*) " + from_clause, params)
     numFiltered = res.fetchone()[0]
-    res = conn.execute("""SELECT COUNT(ExperimentResults.idJob)
+    res = _execute(conn, """SELECT COUNT(ExperimentResults.idJob)
                        FROM ExperimentResults WHERE Experiment_idExperiment = %s""",
-                       experiment.idExperiment)
+                       (experiment.idExperiment, ))
     numTotal = res.fetchone()[0]
 
     aaData = []
@@ -1231,8 +1246,9 @@ def configuration_results_csv(database, experiment_id):
     csv_response = StringIO.StringIO()
     csv_writer = csv.writer(csv_response)
     csv_writer.writerow(['Name', '#Results', 'Cost'] + [p.name for p in configurable_parameters])
+    graph = experiment.configuration_scenario.get_parameter_graph()
     csv_writer.writerow(
-        [''] * 3 + [experiment.configuration_scenario.get_parameter_domain(p.name) for p in configurable_parameters])
+        [''] * 3 + [graph.get_domain(p.name) if graph is not None else None for p in configurable_parameters])
     for solver_config in solver_configs:
         if results_by_solver[solver_config.idSolverConfig]:
             if cost == 'cpu':
@@ -1474,6 +1490,24 @@ def experiment_result(database, experiment_id):
                   verifierOutput_text=verifierOutput_text, database=database, db=db)
 
 
+def instance_solution_status(database, db, experiment):
+    """ Returns Experiment.get_instance_solution_status of the experiment, cached
+        until a job of the experiment is added or modified or the instances
+        of the experiment change.
+    """
+    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+        .filter_by(experiment=experiment).first()
+    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
+    instances_fingerprint = experiment.get_instance_catalogue(db).fingerprint
+
+    @cache.memoize(7 * 24 * 60 * 60)
+    def cached_instance_solution_status(database, experiment_id, last_modified_job, job_count, instances_fingerprint):
+        return experiment.get_instance_solution_status(db)
+
+    return cached_instance_solution_status(database, experiment.idExperiment, last_modified_job, job_count,
+                                           instances_fingerprint)
+
+
 @frontend.route('/<database>/experiment/<int:experiment_id>/unsolved-instances/')
 @require_phase(phases=[5, 6, 7])
 @require_login
@@ -1481,10 +1515,12 @@ def unsolved_instances(database, experiment_id):
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    unsolved_instances = experiment.get_unsolved_instances(db)
+    status = instance_solution_status(database, db, experiment)
+    unsolved_instances = experiment.get_unsolved_instances(db, status)
 
     return render('unsolved_instances.html', database=database, db=db, experiment=experiment,
-                  unsolved_instances=unsolved_instances, instance_properties=db.get_instance_properties())
+                  unsolved_instances=unsolved_instances, run_counts=status['unsolved'],
+                  instance_properties=db.get_instance_properties())
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/solved-instances/')
@@ -1494,10 +1530,14 @@ def solved_instances(database, experiment_id):
     db = models.get_database(database) or abort(404)
     experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
 
-    solved_instances = experiment.get_solved_instances(db)
+    status = instance_solution_status(database, db, experiment)
+    solved_instances = experiment.get_solved_instances(db, status)
+    run_counts = dict(status['partially_solved'])
+    run_counts.update(status['fully_solved'])
 
     return render('solved_instances.html', database=database, db=db, experiment=experiment,
-                  solved_instances=solved_instances, instance_properties=db.get_instance_properties())
+                  solved_instances=solved_instances, run_counts=run_counts,
+                  instance_properties=db.get_instance_properties())
 
 
 @frontend.route('/<database>/experiment/<int:experiment_id>/result/<int:result_id>/download-solver-output')
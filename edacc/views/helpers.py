@@ -16,7 +16,7 @@ from functools import wraps
 from flask import abort, session, url_for, redirect, g, request, flash
 import pbkdf2
 
-from edacc import config, models, config
+from edacc import config, models, config, selection
 
 # decorates a decorator function to be able to specify parameters :-)
 decorator_with_args = lambda decorator: lambda *args, **kwargs: \
@@ -143,3 +143,17 @@ def password_hash(password):
         SECRET_KEY as hexstring.
     """
     return pbkdf2.crypt(password, salt=config.SECRET_KEY, iterations=10000)
+
+
+def selection_cache_key(ids, name):
+    """ Returns the cache key memoized views use for the IDs of the query
+        argument `name` (see selection.cache_key).
+    """
+    return selection.cache_key(ids, name, getattr(g, 'stored_selection', None))
+
+
+def request_args_cache_key():
+    """ Returns the cache key memoized views use for the query arguments
+        of the request (see selection.args_cache_key).
+    """
+    return selection.args_cache_key(request.args, getattr(g, 'stored_selection', None))
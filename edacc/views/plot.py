@@ -11,25 +11,24 @@
     :license: MIT, see LICENSE for details.
 """
 
-import os
 import numpy
 import StringIO
 import csv
 import random
 
-from sqlalchemy import or_, not_, func
+from sqlalchemy import not_, func
 from sqlalchemy.sql import select, and_, functions, expression, alias
 from sqlalchemy.orm import joinedload_all
 import sqlalchemy.types
 
 from flask import Blueprint, render_template as render
-from flask import Response, abort, request, g
+from flask import Response, abort, request
 from werkzeug import Headers, secure_filename
 
-from edacc import plots, config, models
+from edacc import plots, plot_data, config, models, summary, downsampling, cactus, distributions, selection
 from edacc.web import cache
 from sqlalchemy.orm import joinedload
-from edacc.views.helpers import require_phase, require_login
+from edacc.views.helpers import require_phase, require_login, request_args_cache_key
 from edacc.constants import ANALYSIS1, ANALYSIS2
 from edacc import statistics
 
@@ -47,6 +46,8 @@ def get_request_plot_type():
         return 'rscript'
     elif request.args.has_key('csv'):
         return 'csv'
+    elif request.args.has_key('json'):
+        return 'json'
     else:
         return 'png'
 
@@ -60,18 +61,89 @@ def make_plot_response(function, *args, **kwargs):
         type = 'rscript'; mime = 'text/plain'
     else:
         type = 'png'; mime = 'image/png'
-    filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.' + type
 
     try:
-        function(*args, filename=filename, format=type, **kwargs)
+        data, _ = plots.render(function, type, *args, **kwargs)
     except Exception as exception:
-        plots.make_error_plot(text=str(exception), filename=filename, format='png')
+        data, _ = plots.render(plots.make_error_plot, 'png', text=str(exception))
         print str(exception)
     headers = Headers()
     headers.add('Content-Disposition', 'attachment', filename=secure_filename('data.' + type))
-    response = Response(response=open(filename, 'rb').read(), mimetype=mime, headers=headers)
-    os.remove(filename)
-    return response
+    return Response(response=data, mimetype=mime, headers=headers)
+
+
+def data_column(values, type='float64'):
+    """ Encodes the plot data column `values` as requested: delta encoded
+        (integer columns only) if the request has a delta argument and as
+        base64 binary array if it has a binary argument.
+    """
+    return plot_data.encode_column(values, type, delta=request.args.has_key('delta'),
+                                   format='base64' if request.args.has_key('binary') else 'list')
+
+
+def make_data_response(data):
+    """ Returns the plot data dictionary `data` as JSON response, gzip
+        compressed if the client accepts it.
+    """
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    headers = Headers()
+    # the body depends on Accept-Encoding, shared caches must not serve it to other clients
+    headers.add('Vary', 'Accept-Encoding')
+    if compress: headers.add('Content-Encoding', 'gzip')
+    return Response(response=plot_data.serialize(data, compress), mimetype='application/json', headers=headers)
+
+
+def scatter_data(points, **kwargs):
+    """ Returns the plot data of a scatter plot of the instance groups'
+        points [[(x, y, instance), ...], ...], further plot information
+        can be passed as keyword arguments.
+    """
+    data = dict(kwargs)
+    data['groups'] = [{'x': data_column([p[0] for p in ig]),
+                       'y': data_column([p[1] for p in ig]),
+                       'instance_id': data_column([p[2].idInstance for p in ig], 'int32')} for ig in points]
+    return data
+
+
+def distribution_data(ecdfs, property_name, log_property, **kwargs):
+    """ Returns the plot data of the empirical CDFs [(sc, (xs, ps)), ...] of
+        a property distribution plot, further plot information can be passed
+        as keyword arguments.
+    """
+    data = dict(kwargs)
+    data.update({'property': property_name, 'log': log_property})
+    data['series'] = [{'solver_config_id': sc.idSolverConfig, 'name': str(sc),
+                       'x': data_column(xs), 'p': data_column(ps)} for sc, (xs, ps) in ecdfs]
+    return data
+
+
+def get_timeout_limit(db, exp, result_property):
+    """ Returns the smallest CPU time or walltime limit of the experiment's
+        jobs if the result property is a time, None otherwise.
+    """
+    if result_property == 'resultTime':
+        limit = db.read_session().query(func.min(db.ExperimentResult.CPUTimeLimit)).filter_by(experiment=exp).first()
+    elif result_property == 'wallTime':
+        limit = db.read_session().query(func.min(db.ExperimentResult.wallClockTimeLimit)) \
+            .filter_by(experiment=exp).first()
+    else:
+        return None
+    if limit is None or limit[0] is None or limit[0] < 0: return None
+    return float(limit[0])
+
+
+def downsample_scatter_points(db, exp, points, xscale, yscale, x_property=None, y_property=None):
+    """ Reduces the points of the instance groups of a scatter plot to about
+        max_points (request argument, default: config.SCATTER_MAX_POINTS,
+        0: no reduction) if the plot is rendered as an image. Extreme points
+        and points at or above the time limits of the x and y result
+        properties (timeouts) are kept. Data exports get all points.
+    """
+    if get_request_plot_type() not in ('png', 'pdf', 'eps'): return points
+    max_points = request.args.get('max_points', config.SCATTER_MAX_POINTS, type=int)
+    x_limit = get_timeout_limit(db, exp, x_property) if x_property is not None else None
+    y_limit = get_timeout_limit(db, exp, y_property) if y_property is not None else None
+    return downsampling.downsample_scatter(points, max_points, xscale == 'log', yscale == 'log', x_limit, y_limit)
 
 
 def filter_results(l1, l2):
@@ -86,17 +158,17 @@ def filter_results(l1, l2):
 def scatter_2solver_1property_points(db, exp, sc1, sc2, instances, result_property, run):
     instance_ids = [i.idInstance for i in instances]
 
-    results1 = db.session.query(db.ExperimentResult)
+    results1 = db.read_session().query(db.ExperimentResult)
     results1 = results1.enable_eagerloads(True).options(joinedload(db.ExperimentResult.solver_configuration))
     results1 = results1.options(joinedload(db.ExperimentResult.properties), joinedload(db.ExperimentResult.instance))
     results1 = results1.filter_by(experiment=exp, solver_configuration=sc1).order_by(db.ExperimentResult.run) \
-        .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all()
+        .filter(selection.results_filter(db, db.read_session(), exp.idExperiment, instance_ids)).all()
 
-    results2 = db.session.query(db.ExperimentResult)
+    results2 = db.read_session().query(db.ExperimentResult)
     results2 = results2.enable_eagerloads(True).options(joinedload(db.ExperimentResult.solver_configuration))
     results2 = results2.options(joinedload(db.ExperimentResult.properties), joinedload(db.ExperimentResult.instance))
     results2 = results2.filter_by(experiment=exp, solver_configuration=sc2).order_by(db.ExperimentResult.run) \
-        .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all()
+        .filter(selection.results_filter(db, db.read_session(), exp.idExperiment, instance_ids)).all()
 
     jobs_by_instance_id1 = dict((i.idInstance, list()) for i in instances)
     jobs_by_instance_id2 = dict((i.idInstance, list()) for i in instances)
@@ -166,18 +238,20 @@ def scatter_2solver_1property(database, experiment_id):
             If the value is an integer, the data of this specific run is used.
     result_property: id of a result property (Property table) or the special case
                      'cputime' for the time column of the ExperimentResult table.
+    json: return the points as columnar data (see edacc/plot_data.py) instead
+          of an image, optional arguments delta and binary select the encoding.
     """
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     s1 = int(request.args['solver_config1'])
     s2 = int(request.args['solver_config2'])
 
     instances = [
-        db.session.query(db.Instance).filter(db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()]
+        db.read_session().query(db.Instance).filter(db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()]
     instance_groups_count = int(request.args.get('instance_groups_count', 1))
     for i in xrange(1, instance_groups_count):
-        instances.append(db.session.query(db.Instance).filter(
+        instances.append(db.read_session().query(db.Instance).filter(
             db.Instance.idInstance.in_(map(int, request.args.getlist('i' + str(i))))).all())
 
     run = request.args['run']
@@ -185,10 +259,10 @@ def scatter_2solver_1property(database, experiment_id):
     yscale = request.args['yscale']
     result_property = request.args['result_property']
     if result_property not in ('resultTime', 'wallTime', 'cost'):
-        solver_prop = db.session.query(db.Property).get(int(result_property))
+        solver_prop = db.read_session().query(db.Property).get(int(result_property))
 
-    sc1 = db.session.query(db.SolverConfiguration).get(s1) or abort(404)
-    sc2 = db.session.query(db.SolverConfiguration).get(s2) or abort(404)
+    sc1 = db.read_session().query(db.SolverConfiguration).get(s1) or abort(404)
+    sc2 = db.read_session().query(db.SolverConfiguration).get(s2) or abort(404)
 
     points = []
     for instance_group in instances:
@@ -212,7 +286,12 @@ def scatter_2solver_1property(database, experiment_id):
         xlabel = sc1.get_name() + ' ' + solver_prop.name
         ylabel = sc2.get_name() + ' ' + solver_prop.name
 
-    if request.args.has_key('csv'):
+    render_points = downsample_scatter_points(db, exp, points, xscale, yscale, result_property, result_property)
+
+    if request.args.has_key('json'):
+        return make_data_response(scatter_data(points, title=title, xlabel=xlabel, ylabel=ylabel, max_x=max_x,
+                                               max_y=max_y, xscale=xscale, yscale=yscale, diagonal_line=True))
+    elif request.args.has_key('csv'):
         csv_response = StringIO.StringIO()
         csv_writer = csv.writer(csv_response)
         csv_writer.writerow(['Instance', xlabel, ylabel])
@@ -227,60 +306,52 @@ def scatter_2solver_1property(database, experiment_id):
             exp.name + "_scatter_" + sc1.get_name() + '_vs_' + sc2.get_name() + ".csv"))
         return Response(response=csv_response.read(), headers=headers)
     elif request.args.has_key('pdf'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.pdf'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf', xscale=xscale, yscale=yscale,
-                      diagonal_line=True)
+        data, _ = plots.render(plots.scatter, 'pdf', render_points, xlabel, ylabel, title, max_x, max_y, xscale=xscale,
+                               yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment',
                     filename=secure_filename(sc1.get_name() + '_vs_' + sc2.get_name() + '.pdf'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='application/pdf', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='application/pdf', headers=headers)
         return response
     elif request.args.has_key('eps'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.eps'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='eps', xscale=xscale, yscale=yscale,
-                      diagonal_line=True)
+        data, _ = plots.render(plots.scatter, 'eps', render_points, xlabel, ylabel, title, max_x, max_y, xscale=xscale,
+                               yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment',
                     filename=secure_filename(sc1.get_name() + '_vs_' + sc2.get_name() + '.eps'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='application/eps', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='application/eps', headers=headers)
         return response
     elif request.args.has_key('rscript'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.txt'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript', xscale=xscale,
-                      yscale=yscale, diagonal_line=True)
+        data, _ = plots.render(plots.scatter, 'rscript', render_points, xlabel, ylabel, title, max_x, max_y,
+                               xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment',
                     filename=secure_filename(sc1.get_name() + '_vs_' + sc2.get_name() + '.txt'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='text/plain', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='text/plain', headers=headers)
         return response
     else:
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.png'
-        pts = plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale, yscale=yscale,
-                            diagonal_line=True)
+        data, pts = plots.render(plots.scatter, 'png', render_points, xlabel, ylabel, title, max_x, max_y,
+                                 xscale=xscale, yscale=yscale, diagonal_line=True)
         pts2 = []
-        for j in xrange(len(points)):
-            pts2 += [(pts[j][i][0], pts[j][i][1], points[j][i][0], points[j][i][1], points[j][i][2]) for i in
-                     xrange(len(points[j]))]
+        for j in xrange(len(render_points)):
+            pts2 += [(pts[j][i][0], pts[j][i][1], render_points[j][i][0], render_points[j][i][1],
+                      render_points[j][i][2]) for i in xrange(len(render_points[j]))]
         if request.args.has_key('imagemap'):
             return render('/analysis/imagemap_2solver_1property.html', database=database, experiment=exp, points=pts2,
                           sc1=sc1, sc2=sc2)
         else:
-            response = Response(response=open(filename, 'rb').read(), mimetype='image/png')
-        os.remove(filename)
+            response = Response(response=data, mimetype='image/png')
         return response
 
 
 def scatter_1solver_instance_vs_result_property_points(db, exp, solver_config, instances, instance_property,
                                                        result_property, run):
     instance_ids = [i.idInstance for i in instances]
-    results = db.session.query(db.ExperimentResult)
+    results = db.read_session().query(db.ExperimentResult)
     results = results.enable_eagerloads(True).options(joinedload(db.ExperimentResult.solver_configuration)).options(
         joinedload(db.ExperimentResult.instance))
     results = results.filter_by(experiment=exp, solver_configuration=solver_config) \
-        .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all()
+        .filter(selection.results_filter(db, db.read_session(), exp.idExperiment, instance_ids)).all()
 
     jobs_by_instance_id = dict((i, list()) for i in instance_ids)
     for res in results:
@@ -334,7 +405,7 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
     against the instance property values, e.g. CPU time vs memory used.
     """
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     solver_config = int(request.args['solver_config'])
     run = request.args['run']
@@ -344,18 +415,18 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
     instance_property = request.args['instance_property']
 
     instances = [
-        db.session.query(db.Instance).filter(db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()]
+        db.read_session().query(db.Instance).filter(db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()]
     instance_groups_count = int(request.args.get('instance_groups_count', 1))
     for i in xrange(1, instance_groups_count):
-        instances.append(db.session.query(db.Instance).filter(
+        instances.append(db.read_session().query(db.Instance).filter(
             db.Instance.idInstance.in_(map(int, request.args.getlist('i' + str(i))))).all())
 
     if result_property not in ('resultTime', 'wallTime', 'cost'):
-        solver_prop = db.session.query(db.Property).get(int(result_property))
+        solver_prop = db.read_session().query(db.Property).get(int(result_property))
 
-    instance_prop = db.session.query(db.Property).get(int(instance_property))
+    instance_prop = db.read_session().query(db.Property).get(int(instance_property))
 
-    solver_config = db.session.query(db.SolverConfiguration).get(solver_config) or abort(404)
+    solver_config = db.read_session().query(db.SolverConfiguration).get(solver_config) or abort(404)
 
     points = []
     for instance_group in instances:
@@ -378,7 +449,12 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
     max_x = max([max([p[0] for p in ig] or [0]) for ig in points] or [0]) * 1.1
     max_y = max([max([p[1] for p in ig] or [0]) for ig in points] or [0]) * 1.1
 
-    if request.args.has_key('csv'):
+    render_points = downsample_scatter_points(db, exp, points, xscale, yscale, None, result_property)
+
+    if request.args.has_key('json'):
+        return make_data_response(scatter_data(points, title=title, xlabel=xlabel, ylabel=ylabel, max_x=max_x,
+                                               max_y=max_y, xscale=xscale, yscale=yscale, diagonal_line=False))
+    elif request.args.has_key('csv'):
         csv_response = StringIO.StringIO()
         csv_writer = csv.writer(csv_response)
         csv_writer.writerow(['Instance', xlabel, ylabel])
@@ -392,57 +468,52 @@ def scatter_1solver_instance_vs_result_property(database, experiment_id):
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + ".csv"))
         return Response(response=csv_response.read(), headers=headers)
     elif request.args.has_key('pdf'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.pdf'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf', xscale=xscale, yscale=yscale)
+        data, _ = plots.render(plots.scatter, 'pdf', render_points, xlabel, ylabel, title, max_x, max_y, xscale=xscale,
+                               yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.pdf'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='application/pdf', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='application/pdf', headers=headers)
         return response
     elif request.args.has_key('eps'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.eps'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='eps', xscale=xscale, yscale=yscale)
+        data, _ = plots.render(plots.scatter, 'eps', render_points, xlabel, ylabel, title, max_x, max_y, xscale=xscale,
+                               yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.eps'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='application/eps', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='application/eps', headers=headers)
         return response
     elif request.args.has_key('rscript'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.txt'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript', xscale=xscale,
-                      yscale=yscale, diagonal_line=True)
+        data, _ = plots.render(plots.scatter, 'rscript', render_points, xlabel, ylabel, title, max_x, max_y,
+                               xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.txt'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='text/plain', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='text/plain', headers=headers)
         return response
     else:
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.png'
-        pts = plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale, yscale=yscale)
+        data, pts = plots.render(plots.scatter, 'png', render_points, xlabel, ylabel, title, max_x, max_y,
+                                 xscale=xscale, yscale=yscale)
         pts2 = []
-        for j in xrange(len(points)):
-            pts2 += [(pts[j][i][0], pts[j][i][1], points[j][i][0], points[j][i][1], points[j][i][2]) for i in
-                     xrange(len(points[j]))]
+        for j in xrange(len(render_points)):
+            pts2 += [(pts[j][i][0], pts[j][i][1], render_points[j][i][0], render_points[j][i][1],
+                      render_points[j][i][2]) for i in xrange(len(render_points[j]))]
         if request.args.has_key('imagemap'):
             return render('/analysis/imagemap_instance_vs_result.html', database=database, experiment=exp, points=pts2,
                           sc=solver_config)
         else:
-            response = Response(response=open(filename, 'rb').read(), mimetype='image/png')
-        os.remove(filename)
+            response = Response(response=data, mimetype='image/png')
         return response
 
 
 def scatter_1solver_result_vs_result_property_plot(db, exp, solver_config, instances, result_property1,
                                                    result_property2, run):
     instance_ids = [i.idInstance for i in instances]
-    results = db.session.query(db.ExperimentResult)
+    results = db.read_session().query(db.ExperimentResult)
     results = results.enable_eagerloads(True).options(joinedload(db.ExperimentResult.solver_configuration)).options(
         joinedload(db.ExperimentResult.instance))
     results = results.filter_by(experiment=exp, solver_configuration=solver_config).order_by(db.ExperimentResult.run) \
-        .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)).all()
+        .filter(selection.results_filter(db, db.read_session(), exp.idExperiment, instance_ids)).all()
 
     jobs_by_instance_id = dict((i, list()) for i in instance_ids)
     for res in results:
@@ -497,7 +568,7 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
     other result property values.
     """
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     solver_config = int(request.args['solver_config'])
     run = request.args['run']
@@ -507,19 +578,19 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
     result_property2 = request.args['result_property2']
 
     instances = [
-        db.session.query(db.Instance).filter(db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()]
+        db.read_session().query(db.Instance).filter(db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()]
     instance_groups_count = int(request.args.get('instance_groups_count', 1))
     for i in xrange(1, instance_groups_count):
-        instances.append(db.session.query(db.Instance).filter(
+        instances.append(db.read_session().query(db.Instance).filter(
             db.Instance.idInstance.in_(map(int, request.args.getlist('i' + str(i))))).all())
 
     if result_property1 not in ('resultTime', 'wallTime', 'cost'):
-        solver_prop1 = db.session.query(db.Property).get(int(result_property1))
+        solver_prop1 = db.read_session().query(db.Property).get(int(result_property1))
 
     if result_property2 not in ('resultTime', 'wallTime', 'cost'):
-        solver_prop2 = db.session.query(db.Property).get(int(result_property2))
+        solver_prop2 = db.read_session().query(db.Property).get(int(result_property2))
 
-    solver_config = db.session.query(db.SolverConfiguration).get(solver_config) or abort(404)
+    solver_config = db.read_session().query(db.SolverConfiguration).get(solver_config) or abort(404)
 
     points = []
     for instance_group in instances:
@@ -550,7 +621,12 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
     max_x = max([max([p[0] for p in ig] or [0]) for ig in points] or [0]) * 1.1
     max_y = max([max([p[1] for p in ig] or [0]) for ig in points] or [0]) * 1.1
 
-    if request.args.has_key('csv'):
+    render_points = downsample_scatter_points(db, exp, points, xscale, yscale, result_property1, result_property2)
+
+    if request.args.has_key('json'):
+        return make_data_response(scatter_data(points, title=title, xlabel=xlabel, ylabel=ylabel, max_x=max_x,
+                                               max_y=max_y, xscale=xscale, yscale=yscale, diagonal_line=False))
+    elif request.args.has_key('csv'):
         csv_response = StringIO.StringIO()
         csv_writer = csv.writer(csv_response)
         csv_writer.writerow(['Instance', xlabel, ylabel])
@@ -564,46 +640,41 @@ def scatter_1solver_result_vs_result_property(database, experiment_id):
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.csv'))
         return Response(response=csv_response.read(), headers=headers)
     elif request.args.has_key('pdf'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.pdf'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='pdf', xscale=xscale, yscale=yscale)
+        data, _ = plots.render(plots.scatter, 'pdf', render_points, xlabel, ylabel, title, max_x, max_y, xscale=xscale,
+                               yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.pdf'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='application/pdf', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='application/pdf', headers=headers)
         return response
     elif request.args.has_key('eps'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.eps'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='eps', xscale=xscale, yscale=yscale)
+        data, _ = plots.render(plots.scatter, 'eps', render_points, xlabel, ylabel, title, max_x, max_y, xscale=xscale,
+                               yscale=yscale)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.eps'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='application/eps', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='application/eps', headers=headers)
         return response
     elif request.args.has_key('rscript'):
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.txt'
-        plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, format='rscript', xscale=xscale,
-                      yscale=yscale, diagonal_line=True)
+        data, _ = plots.render(plots.scatter, 'rscript', render_points, xlabel, ylabel, title, max_x, max_y,
+                               xscale=xscale, yscale=yscale, diagonal_line=True)
         headers = Headers()
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(
             exp.name + "_scatter_" + str(solver_config) + "_" + ylabel + "_vs_" + xlabel + '.txt'))
-        response = Response(response=open(filename, 'rb').read(), mimetype='text/plain', headers=headers)
-        os.remove(filename)
+        response = Response(response=data, mimetype='text/plain', headers=headers)
         return response
     else:
-        filename = os.path.join(config.TEMP_DIR, g.unique_id) + '.png'
-        pts = plots.scatter(points, xlabel, ylabel, title, max_x, max_y, filename, xscale=xscale, yscale=yscale)
+        data, pts = plots.render(plots.scatter, 'png', render_points, xlabel, ylabel, title, max_x, max_y,
+                                 xscale=xscale, yscale=yscale)
         pts2 = []
-        for j in xrange(len(points)):
-            pts2 += [(pts[j][i][0], pts[j][i][1], points[j][i][0], points[j][i][1], points[j][i][2]) for i in
-                     xrange(len(points[j]))]
+        for j in xrange(len(render_points)):
+            pts2 += [(pts[j][i][0], pts[j][i][1], render_points[j][i][0], render_points[j][i][1],
+                      render_points[j][i][2]) for i in xrange(len(render_points[j]))]
         if request.args.has_key('imagemap'):
             return render('/analysis/imagemap_result_vs_result.html', database=database, experiment=exp, points=pts2,
                           sc=solver_config)
         else:
-            response = Response(response=open(filename, 'rb').read(), mimetype='image/png')
-        os.remove(filename)
+            response = Response(response=data, mimetype='image/png')
         return response
 
 
@@ -616,11 +687,11 @@ def cactus_plot(database, experiment_id):
         experiment
     """
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+    last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
         .filter_by(experiment=exp).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=exp).count()
+    job_count = db.read_session().query(db.ExperimentResult).filter_by(experiment=exp).count()
 
     @cache.memoize(6 * 24 * 60 * 60)
     def cached_cactus_plot(database, experiment_id, request_args, job_count, last_modified_job, plot_type):
@@ -632,90 +703,42 @@ def cactus_plot(database, experiment_id):
         run = request.args.get('run', 'all')
         result_property = request.args.get('result_property') or 'resultTime'
 
-        results = db.session.query(db.ExperimentResult)
-        results = results.enable_eagerloads(True).options(joinedload(db.ExperimentResult.solver_configuration))
-        results = results.options(joinedload(db.ExperimentResult.properties))
-        results = results.filter_by(experiment=exp)
         instances = [[int(id) for id in request.args.getlist('i')]]
         for i in xrange(1, instance_groups_count):
             instances.append([int(id) for id in request.args.getlist('i' + str(i))])
 
         if result_property not in ('resultTime', 'wallTime', 'cost'):
-            solver_prop = db.session.query(db.Property).get(int(result_property))
+            solver_prop = db.read_session().query(db.Property).get(int(result_property))
 
-        solver_configs = [db.session.query(db.SolverConfiguration).get(int(id)) for id in request.args.getlist('sc')]
+        solver_config_ids = [int(id) for id in request.args.getlist('sc')]
+        solver_configs_by_id = dict((sc.idSolverConfig, sc) for sc in db.read_session().query(db.SolverConfiguration) \
+            .filter(db.SolverConfiguration.idSolverConfig.in_(solver_config_ids)).all()) if solver_config_ids else {}
+        solver_configs = [solver_configs_by_id[id] for id in solver_config_ids if id in solver_configs_by_id]
 
         solvers = []
         num_solved = dict()
 
         random_run = random.randint(0, exp.get_max_num_runs(db) - 1)
+        runs = cactus.get_cactus_runs(db, exp, solver_configs_by_id.keys(),
+                                      set(id for ig in instances for id in ig), result_property)
 
         for instance_group in xrange(instance_groups_count):
             for sc in solver_configs:
-                s = {'xs': [], 'ys': [], 'name': sc.get_name(), 'instance_group': instance_group, 'solver_config': sc}
-                sc_res = results.filter_by(solver_configuration=sc, status=1).filter(
-                    db.ExperimentResult.resultCode.like('1%')) \
-                    .filter(db.ExperimentResult.Instances_idInstance.in_(instances[instance_group]))
-                num_solved[sc] = sc_res.count()
-                if run == 'all':
-                    sc_results = filter(lambda j: j is not None,
-                                        [r.get_property_value(result_property, db) for r in sc_res.all()])
-                elif run in ('average', 'median'):
-                    sc_results = []
-                    for id in instances[instance_group]:
-                        res = sc_res.filter(db.ExperimentResult.Instances_idInstance == id).all()
-                        res = [r.get_property_value(result_property, db) for r in res]
-                        res = filter(lambda r: r is not None, res)
-                        if len(res) > 0:
-                            if run == 'average':
-                                sc_results.append(numpy.average(res))
-                            elif run == 'median':
-                                sc_results.append(numpy.median(res or [0]))
-                elif run == 'random':
-                    sc_results = [r.get_property_value(result_property, db) for r in
-                                  sc_res.filter_by(run=random_run).all()]
-                    sc_results = filter(lambda r: r is not None, sc_results)
-                elif run == 'penalized_average':
-                    sc_results = []
-                    for id in instances[instance_group]:
-                        res = sc_res.filter(db.ExperimentResult.Instances_idInstance == id).all()
-                        num_penalized = results.filter_by(solver_configuration=sc) \
-                            .filter(db.ExperimentResult.Instances_idInstance == id) \
-                            .filter(or_(db.ExperimentResult.status != 1,
-                                        not_(db.ExperimentResult.resultCode.like('1%')))).count()
-                        if result_property == 'resultTime':
-                            penalized_time = sum(
-                                [j.get_penalized_time(10) for j in res if not str(j.resultCode).startswith('1')])
-                            res_vals = [r.get_property_value(result_property, db) for r in res if
-                                        str(r.resultCode.startswith('1'))]
-                        elif result_property == 'wallTime':
-                            penalized_time = sum(
-                                [j.wallClockTimeLimit * 10 for j in res if not str(j.resultCode).startswith('1')])
-                            res_vals = [r.get_property_value(result_property, db) for r in res if
-                                        str(r.resultCode.startswith('1'))]
-                        else:
-                            penalized_time = 0
-                            res_vals = [r.get_property_value(result_property, db) for r in res]
-                        penalized_avg = (sum(res_vals) + penalized_time) / (num_penalized + len(res_vals))
-                        sc_results.append(penalized_avg)
-                else:
-                    run_number = int(run)
-                    res = sc_res.filter_by(run=run_number).all()
-                    res = [r.get_property_value(result_property, db) for r in res]
-                    sc_results = filter(lambda r: r is not None, res)
-
-                sc_results = sorted(sc_results)
+                s = {'xs': [], 'ys': [], 'instance_ids': [], 'name': sc.get_name(), 'instance_group': instance_group,
+                     'solver_config': sc}
+                num_solved[sc] = runs.num_solved(sc.idSolverConfig, instances[instance_group])
+                sc_results, instance_ids = runs.series(sc.idSolverConfig, instances[instance_group],
+                                                       random_run if run == 'random' else run)
+
                 if not log_property:
                     s['ys'].append(0)
                     s['xs'].append(0)
 
                 # sc_results = (y_1, y_2, ..., y_n) : y_1 <= y_2 <= ... <= y_n
                 # s = {(x, y) \in R² : y = sc_results[x], x = 1, ..., n }
-                i = 1
-                for r in sc_results:
-                    s['ys'].append(r)
-                    s['xs'].append(i)
-                    i += 1
+                s['ys'] += sc_results
+                s['xs'] += range(1, len(sc_results) + 1)
+                s['instance_ids'] = instance_ids
                 solvers.append(s)
 
         solvers.sort(key=lambda x: num_solved[x['solver_config']], reverse=True)
@@ -737,7 +760,21 @@ def cactus_plot(database, experiment_id):
             ylabel = solver_prop.name
             title = 'Number of solved instances within a given amount of ' + solver_prop.name
 
-        if plot_type == 'csv':
+        if plot_type == 'json':
+            data = {'title': title, 'ylabel': ylabel, 'max_x': max_x, 'max_y': max_y, 'min_y': min_y,
+                    'log_property': log_property, 'flip_axes': flip_axes,
+                    'colored_instance_groups': colored_instance_groups, 'solvers': []}
+            for s in solvers:
+                # without the origin point
+                n = len(s['instance_ids'])
+                data['solvers'].append({'name': s['name'], 'instance_group': s['instance_group'],
+                                        'solver_config_id': s['solver_config'].idSolverConfig,
+                                        'num_solved': num_solved[s['solver_config']],
+                                        'x': data_column(s['xs'][len(s['xs']) - n:], 'int32'),
+                                        'y': data_column(s['ys'][len(s['ys']) - n:]),
+                                        'instance_id': data_column(s['instance_ids'], 'int32')})
+            return data
+        elif plot_type == 'csv':
             csv_response = StringIO.StringIO()
             csv_writer = csv.writer(csv_response)
             for s in solvers:
@@ -751,11 +788,32 @@ def cactus_plot(database, experiment_id):
             headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_cactus.csv"))
             return Response(response=csv_response.read(), headers=headers)
         else:
-            return make_plot_response(plots.cactus, solvers, instance_groups_count, colored_instance_groups,
+            # the curves are drawn as points, so they are only reduced (to the points needed to draw them with
+            # at most max_error pixels deviation) in PNG plots with so many points that the markers overlap
+            max_error = request.args.get('max_error', config.CACTUS_MAX_ERROR, type=float)
+            max_points = request.args.get('max_points', config.CACTUS_MAX_POINTS, type=int)
+            render_solvers = solvers
+            if plot_type == 'png' and 0 < max_points < sum(len(s['xs']) for s in solvers):
+                value_range, count_range = (max(0.000001, min_y), max_y), (max(0.000001, min_y), max_x)
+                render_solvers = []
+                for s in solvers:
+                    if flip_axes:
+                        keep = downsampling.polyline_mask(s['ys'], s['xs'], max_error, value_range, count_range,
+                                                          1280, 800, log_x=log_property)
+                    else:
+                        keep = downsampling.polyline_mask(s['xs'], s['ys'], max_error, count_range, value_range,
+                                                          1280, 800, log_y=log_property)
+                    render_solvers.append(dict(s, xs=[x for x, k in zip(s['xs'], keep) if k],
+                                               ys=[y for y, k in zip(s['ys'], keep) if k]))
+            return make_plot_response(plots.cactus, render_solvers, instance_groups_count, colored_instance_groups,
                                       max_x, max_y, min_y, log_property, flip_axes, ylabel, title)
 
-    return cached_cactus_plot(database, experiment_id, request.args, job_count, last_modified_job,
-                              get_request_plot_type())
+    plot_type = get_request_plot_type()
+    if plot_type == 'json':
+        return make_data_response(cached_cactus_plot(database, experiment_id, request_args_cache_key(), job_count,
+                                                     last_modified_job, plot_type))
+    return cached_cactus_plot(database, experiment_id, request_args_cache_key(), job_count, last_modified_job,
+                              plot_type)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/rp-comparison-plot/')
@@ -763,11 +821,11 @@ def cactus_plot(database, experiment_id):
 @require_login
 def result_property_comparison_plot(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     instance_ids = [int(id) for id in request.args.getlist('i')] or abort(404)
-    s1 = db.session.query(db.SolverConfiguration).get(int(request.args['solver_config1'])) or abort(404)
-    s2 = db.session.query(db.SolverConfiguration).get(int(request.args['solver_config2'])) or abort(404)
+    s1 = db.read_session().query(db.SolverConfiguration).get(int(request.args['solver_config1'])) or abort(404)
+    s2 = db.read_session().query(db.SolverConfiguration).get(int(request.args['solver_config2'])) or abort(404)
     dim = int(request.args.get('dim', 700))
 
     log_property = request.args.has_key('log_property')
@@ -779,25 +837,36 @@ def result_property_comparison_plot(database, experiment_id):
     elif result_property == 'cost':
         result_property_name = 'Cost'
     else:
-        result_property = db.session.query(db.Property).get(int(result_property)).idProperty
-        result_property_name = db.session.query(db.Property).get(int(result_property)).name
+        result_property = db.read_session().query(db.Property).get(int(result_property)).idProperty
+        result_property_name = db.read_session().query(db.Property).get(int(result_property)).name
 
-    results1 = [r.get_property_value(result_property, db) for r in db.session.query(db.ExperimentResult)
+    runs1 = [(r.get_property_value(result_property, db), r.Instances_idInstance) for r in
+             db.read_session().query(db.ExperimentResult)
     .filter_by(experiment=exp,
                solver_configuration=s1)
     .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids))
     .order_by(db.ExperimentResult.Instances_idInstance, db.ExperimentResult.run).all()]
 
-    results2 = [r.get_property_value(result_property, db) for r in db.session.query(db.ExperimentResult)
+    runs2 = [(r.get_property_value(result_property, db), r.Instances_idInstance) for r in
+             db.read_session().query(db.ExperimentResult)
     .filter_by(experiment=exp,
                solver_configuration=s2)
     .filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids))
     .order_by(db.ExperimentResult.Instances_idInstance, db.ExperimentResult.run).all()]
 
-    results1 = filter(lambda r: r is not None, results1)
-    results2 = filter(lambda r: r is not None, results2)
-
-    if request.args.has_key('csv'):
+    runs1 = filter(lambda r: r[0] is not None, runs1)
+    runs2 = filter(lambda r: r[0] is not None, runs2)
+    results1 = [r[0] for r in runs1]
+    results2 = [r[0] for r in runs2]
+
+    if request.args.has_key('json'):
+        return make_data_response({
+            'solver_config1': str(s1), 'solver_config2': str(s2),
+            'result_property_name': result_property_name, 'log_property': log_property,
+            'results1': {'value': data_column(results1), 'instance_id': data_column([r[1] for r in runs1], 'int32')},
+            'results2': {'value': data_column(results2), 'instance_id': data_column([r[1] for r in runs2], 'int32')},
+        })
+    elif request.args.has_key('csv'):
         csv_response = StringIO.StringIO()
         csv_writer = csv.writer(csv_response)
         csv_writer.writerow([result_property_name + ' results of the two solver configurations'])
@@ -821,10 +890,10 @@ def result_property_comparison_plot(database, experiment_id):
 @require_login
 def property_distributions_plot(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
-    instance = db.session.query(db.Instance).filter_by(idInstance=int(request.args['instance'])).first() or abort(404)
-    solver_configs = [db.session.query(db.SolverConfiguration).get(int(id)) for id in request.args.getlist('sc')]
+    instance = db.read_session().query(db.Instance).filter_by(idInstance=int(request.args['instance'])).first() or abort(404)
+    solver_configs = [db.read_session().query(db.SolverConfiguration).get(int(id)) for id in request.args.getlist('sc')]
 
     log_property = request.args.has_key('log_property')
     result_property = request.args.get('result_property')
@@ -835,12 +904,12 @@ def property_distributions_plot(database, experiment_id):
     elif result_property == 'cost':
         result_property_name = 'Cost'
     else:
-        result_property = db.session.query(db.Property).get(int(result_property)).idProperty
-        result_property_name = db.session.query(db.Property).get(int(result_property)).name
+        result_property = db.read_session().query(db.Property).get(int(result_property)).idProperty
+        result_property_name = db.read_session().query(db.Property).get(int(result_property)).name
 
     results = []
     for sc in solver_configs:
-        sc_results = db.session.query(db.ExperimentResult) \
+        sc_results = db.read_session().query(db.ExperimentResult) \
             .options(joinedload_all('properties')) \
             .filter_by(experiment=exp, instance=instance,
                        solver_configuration=sc).all()
@@ -859,8 +928,13 @@ def property_distributions_plot(database, experiment_id):
         headers.add('Content-Type', 'text/csv')
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_rtds.csv"))
         return Response(response=csv_response.read(), headers=headers)
+
+    ecdfs = [(sc, distributions.ecdf(values, log=log_property)) for sc, values in results]
+    if request.args.has_key('json'):
+        return make_data_response(distribution_data(ecdfs, result_property_name, log_property,
+                                                    instance_id=instance.idInstance))
     else:
-        return make_plot_response(plots.property_distributions, results, result_property_name, log_property)
+        return make_plot_response(plots.property_distributions, ecdfs, result_property_name, log_property)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/rp-plot/')
@@ -868,15 +942,15 @@ def property_distributions_plot(database, experiment_id):
 @require_login
 def property_distribution(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
-    #sc = db.session.query(db.SolverConfiguration).get(int(request.args['solver_config'])) or abort(404)
-    solver_configs = db.session.query(db.SolverConfiguration).filter(
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
+    #sc = db.read_session().query(db.SolverConfiguration).get(int(request.args['solver_config'])) or abort(404)
+    solver_configs = db.read_session().query(db.SolverConfiguration).filter(
         db.SolverConfiguration.idSolverConfig.in_(int(id) for id in request.args.getlist('sc'))).all()
     solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
-    instances = db.session.query(db.Instance).filter(
+    instances = db.read_session().query(db.Instance).filter(
         db.Instance.idInstance.in_(int(id) for id in request.args.getlist('i'))).all()
     instance_ids = [i.idInstance for i in instances]
-    #instance = db.session.query(db.Instance).filter_by(idInstance=int(request.args['instance'])).first() or abort(404)
+    #instance = db.read_session().query(db.Instance).filter_by(idInstance=int(request.args['instance'])).first() or abort(404)
 
     log_property = request.args.has_key('log_property')
     restart_strategy = request.args.has_key('restart_strategy')
@@ -888,12 +962,12 @@ def property_distribution(database, experiment_id):
     elif result_property == 'cost':
         result_property_name = 'Cost'
     else:
-        result_property = db.session.query(db.Property).get(int(result_property)).idProperty
-        result_property_name = db.session.query(db.Property).get(int(result_property)).name
+        result_property = db.read_session().query(db.Property).get(int(result_property)).idProperty
+        result_property_name = db.read_session().query(db.Property).get(int(result_property)).name
 
     results_by_sc = dict()
     for sc in solver_configs:
-        results_by_sc[sc] = [r.get_property_value(result_property, db) for r in db.session.query(db.ExperimentResult) \
+        results_by_sc[sc] = [r.get_property_value(result_property, db) for r in db.read_session().query(db.ExperimentResult) \
             .options(joinedload_all('properties')) \
             .filter_by(experiment=exp,
                        solver_configuration=sc).filter(
@@ -912,9 +986,20 @@ def property_distribution(database, experiment_id):
         headers.add('Content-Type', 'text/csv')
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_rtd.csv"))
         return Response(response=csv_response.read(), headers=headers)
+
+    ecdfs = [(sc, distributions.ecdf(results_by_sc[sc], log=log_property)) for sc in solver_configs]
+    restart = None
+    if restart_strategy and len(solver_configs) == 1:
+        restart = distributions.restart_strategy(results_by_sc[solver_configs[0]])
+    if request.args.has_key('json'):
+        data = distribution_data(ecdfs, result_property_name, log_property, restart=restart)
+        for series, sc in zip(data['series'], solver_configs):
+            edges, densities = distributions.histogram(results_by_sc[sc], log=log_property)
+            series['histogram'] = {'edges': data_column(edges), 'density': data_column(densities)}
+        return make_data_response(data)
     else:
-        return make_plot_response(plots.property_distribution, results_by_sc, result_property_name, log_property,
-                                  restart_strategy)
+        return make_plot_response(plots.property_distribution, dict(ecdfs), result_property_name, log_property,
+                                  restart)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/kerneldensity-plot/')
@@ -922,10 +1007,10 @@ def property_distribution(database, experiment_id):
 @require_login
 def kerneldensity(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
-    solver_configs = db.session.query(db.SolverConfiguration).filter(
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
+    solver_configs = db.read_session().query(db.SolverConfiguration).filter(
         db.SolverConfiguration.idSolverConfig.in_(int(id) for id in request.args.getlist('sc'))).all()
-    instances = db.session.query(db.Instance).filter(
+    instances = db.read_session().query(db.Instance).filter(
         db.Instance.idInstance.in_(int(id) for id in request.args.getlist('i'))).all()
     instance_ids = [i.idInstance for i in instances]
 
@@ -939,12 +1024,12 @@ def kerneldensity(database, experiment_id):
     elif result_property == 'cost':
         result_property_name = 'Cost'
     else:
-        result_property = db.session.query(db.Property).get(int(result_property)).idProperty
-        result_property_name = db.session.query(db.Property).get(int(result_property)).name
+        result_property = db.read_session().query(db.Property).get(int(result_property)).idProperty
+        result_property_name = db.read_session().query(db.Property).get(int(result_property)).name
 
     results_by_sc = dict()
     for sc in solver_configs:
-        results_by_sc[sc] = [r.get_property_value(result_property, db) for r in db.session.query(db.ExperimentResult) \
+        results_by_sc[sc] = [r.get_property_value(result_property, db) for r in db.read_session().query(db.ExperimentResult) \
             .options(joinedload_all('properties')) \
             .filter_by(experiment=exp,
                        solver_configuration=sc).filter(
@@ -963,9 +1048,25 @@ def kerneldensity(database, experiment_id):
         headers.add('Content-Type', 'text/csv')
         headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_kerneldensity.csv"))
         return Response(response=csv_response.read(), headers=headers)
+
+    densities_by_sc = dict()
+    for sc in results_by_sc:
+        if log_property:
+            densities_by_sc[sc] = distributions.log_gaussian_kde(results_by_sc[sc])
+        else:
+            densities_by_sc[sc] = distributions.gaussian_kde(results_by_sc[sc])
+    restart = None
+    if restart_strategy and len(results_by_sc) == 1:
+        restart = distributions.restart_strategy(results_by_sc.values()[0])
+    if request.args.has_key('json'):
+        return make_data_response({'property': result_property_name, 'log': log_property, 'restart': restart,
+                                   'series': [{'solver_config_id': sc.idSolverConfig, 'name': str(sc),
+                                               'x': data_column(densities_by_sc[sc][0]),
+                                               'density': data_column(densities_by_sc[sc][1])}
+                                              for sc in densities_by_sc]})
     else:
-        return make_plot_response(plots.kerneldensity, results_by_sc, result_property_name, log_property,
-                                  restart_strategy)
+        return make_plot_response(plots.kerneldensity, densities_by_sc, result_property_name, log_property,
+                                  restart)
 
 
 @plot.route('/<database>/experiment/<int:experiment_id>/box-plots-plot/')
@@ -973,20 +1074,20 @@ def kerneldensity(database, experiment_id):
 @require_login
 def box_plots(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     instance_ids = map(int, request.args.getlist('i'))
     solver_config_ids = map(int, request.args.getlist('solver_configs'))
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+    last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
         .filter_by(experiment=exp).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=exp).count()
+    job_count = db.read_session().query(db.ExperimentResult).filter_by(experiment=exp).count()
 
     @cache.memoize(7 * 24 * 60 * 60)
     def cached_box_plot(database, experiment_id, instance_ids, solver_config_ids, job_count, last_modified_job,
                         result_property, plot_type):
-        instances = db.session.query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
-        solver_configs = db.session.query(db.SolverConfiguration).filter(
+        instances = db.read_session().query(db.Instance).filter(db.Instance.idInstance.in_(instance_ids)).all()
+        solver_configs = db.read_session().query(db.SolverConfiguration).filter(
             db.SolverConfiguration.idSolverConfig.in_(solver_config_ids)).all()
 
         if result_property == 'resultTime':
@@ -996,11 +1097,11 @@ def box_plots(database, experiment_id):
         elif result_property == 'cost':
             result_property_name = 'Cost'
         else:
-            result_property = db.session.query(db.Property).get(int(result_property)).idProperty
-            result_property_name = db.session.query(db.Property).get(int(result_property)).name
+            result_property = db.read_session().query(db.Property).get(int(result_property)).idProperty
+            result_property_name = db.read_session().query(db.Property).get(int(result_property)).name
 
         prop_value = dict((sc.idSolverConfig, dict()) for sc in solver_configs)
-        for run in db.session.query(db.ExperimentResult).options(joinedload_all('properties')) \
+        for run in db.read_session().query(db.ExperimentResult).options(joinedload_all('properties')) \
             .filter_by(experiment=exp).filter(db.ExperimentResult.Instances_idInstance.in_(instance_ids)) \
             .filter(db.ExperimentResult.SolverConfig_idSolverConfig.in_(solver_config_ids)).all():
             if not run.Instances_idInstance in prop_value[run.SolverConfig_idSolverConfig]:
@@ -1045,126 +1146,65 @@ def barplot(database, experiment_id, gt, eq, lt):
 @require_login
 def runtime_matrix_plot(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
     measure = request.args.get('measure', 'par10') or abort(404)
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+    last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
         .filter_by(experiment=exp).first()
     cost = request.args.get('result_property', 'resultTime')
 
-    #CACHE_TIME = 14*24*60*60
-    #@cache.memoize(timeout=CACHE_TIME)
-    def make_rtm_response(experiment_id, last_modified_job, measure, num_jobs, cost, csv=False, type='png'):
+    CACHE_TIME = 14 * 24 * 60 * 60
+    @cache.memoize(timeout=CACHE_TIME)
+    def make_rtm_response(database, experiment_id, last_modified_job, measure, num_jobs, cost, csv=False, type='png'):
         solver_configs = sorted(exp.solver_configurations, key=lambda sc: sc.idSolverConfig)
         instances = sorted(exp.instances, key=lambda i: i.idInstance)
-        solver_configs_dict = dict((sc.idSolverConfig, sc) for sc in solver_configs)
 
-        table = db.metadata.tables['ExperimentResults']
-        from_table = table
-        table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
-        table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
-        cost_limit = table.c['CPUTimeLimit'] if cost == 'resultTime' else table.c[
-            'wallClockTimeLimit'] if cost == 'wallTime' else exp.cost_penalty if cost == 'cost' else None
-
-        if cost in ('resultTime', 'wallTime', 'cost'):
-            cost_c = table.c[cost]
-        else:
-            cost_c = table_has_prop_value.c['value']
+        # penalty of unsuccessful runs if the cost is not a time with a limit
+        penalty = None
+        if cost == 'cost':
+            penalty = exp.costPenalty
+        elif cost not in ('resultTime', 'wallTime'):
+            table = db.metadata.tables['ExperimentResults']
+            table_has_prop = db.metadata.tables['ExperimentResult_has_Property']
+            table_has_prop_value = db.metadata.tables['ExperimentResult_has_PropertyValue']
             from_table = table.join(table_has_prop, and_(table_has_prop.c['idProperty'] == int(cost),
                                                          table_has_prop.c['idExperimentResults'] == table.c[
                                                              'idJob'])).join(table_has_prop_value)
-
-        if cost not in ('resultTime', 'wallTime', 'cost'):
-            s = select([func.max(expression.cast(cost_c, sqlalchemy.types.Float))],
+            s = select([func.max(expression.cast(table_has_prop_value.c['value'], sqlalchemy.types.Float))],
                        table.c['Experiment_idExperiment'] == experiment_id).select_from(from_table)
-            cost_limit = float(db.session.connection().execute(s).fetchone()[0])
-
-        if measure == 'par10':
-            time_case = expression.case([
-                                            (table.c['resultCode'].like(u'1%'),
-                                             expression.cast(cost_c, sqlalchemy.types.Float))],
-                                        else_=cost_limit * 10.0)
-        else:
-            time_case = cost_c
-
-        s = select([time_case,
-                    table.c['resultCode'],
-                    table.c['SolverConfig_idSolverConfig'],
-                    table.c['Instances_idInstance']],
-                   table.c['Experiment_idExperiment'] == experiment_id).select_from(from_table)
-        runs = db.session.connection().execute(s)
-
-        if measure == 'mean':
-            aggregate_func = func.AVG(time_case)
-        elif measure == 'min':
-            aggregate_func = func.MIN(time_case)
-        elif measure == 'max':
-            aggregate_func = func.MAX(time_case)
-        elif measure == 'par10' or measure is None:
-            aggregate_func = func.AVG(time_case)
-
-        s = select([table.c['SolverConfig_idSolverConfig'],
-                    aggregate_func], table.c['Experiment_idExperiment'] == experiment_id) \
-            .group_by(table.c['SolverConfig_idSolverConfig']) \
-            .select_from(from_table)
-        solver_score = dict((sc[0], float(sc[1])) for sc in db.session.connection().execute(s))
-
-        # throw out all solver configs for which there are no runs
-        solver_configs = filter(lambda sc: sc.idSolverConfig in solver_score.keys(), solver_configs)
-
-        s = select([table.c['Instances_idInstance'],
-                    aggregate_func], table.c['Experiment_idExperiment'] == experiment_id) \
-            .group_by(table.c['Instances_idInstance']) \
-            .select_from(from_table)
-        instance_hardness = dict((inst[0], float(inst[1])) for inst in db.session.connection().execute(s))
-
-        results_by_instance = {}
-        for r in runs:
-            c = float(r[0])
-            if r.Instances_idInstance not in results_by_instance:
-                results_by_instance[r.Instances_idInstance] = {r.SolverConfig_idSolverConfig: [c]}
+            penalty = float(db.read_session().connection().execute(s).fetchone()[0])
+
+        solver_config_ids = [sc.idSolverConfig for sc in solver_configs]
+        instance_ids = [i.idInstance for i in instances]
+        rt_matrix = summary.get_summary(db, experiment_id, cost).measure_matrix(measure, solver_config_ids,
+                                                                                instance_ids, penalty)
+
+        # throw out all solver configs and instances for which there are no runs
+        measured = (rt_matrix.runs > 0) & ~numpy.isnan(rt_matrix.values)
+        values = numpy.where(measured, rt_matrix.values, 0.0)
+        count_by_solver, count_by_instance = measured.sum(axis=1), measured.sum(axis=0)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            if measure == 'min':
+                solver_score = numpy.where(measured, values, numpy.inf).min(axis=1)
+                instance_hardness = numpy.where(measured, values, numpy.inf).min(axis=0)
+            elif measure == 'max':
+                solver_score = numpy.where(measured, values, -numpy.inf).max(axis=1)
+                instance_hardness = numpy.where(measured, values, -numpy.inf).max(axis=0)
             else:
-                rs = results_by_instance[r.Instances_idInstance]
-                if r.SolverConfig_idSolverConfig not in rs:
-                    rs[r.SolverConfig_idSolverConfig] = [c]
-                else:
-                    rs[r.SolverConfig_idSolverConfig].append(c)
-
-        sorted_solver_configs = sorted(solver_configs, key=lambda sc: solver_score[sc.idSolverConfig])
-        sorted_instances = sorted(instances, key=lambda i: instance_hardness[i.idInstance])
-
-        rt_matrix = dict((sc.idSolverConfig, dict((i.idInstance, None) for i in instances)) for sc in solver_configs)
-        flattened_rt_matrix = []
-        for instance in sorted_instances:
-            if instance.idInstance not in results_by_instance: continue
-            rs = results_by_instance[instance.idInstance]
-            for solver_config in sorted_solver_configs:
-                jobs = rs.get(solver_config.idSolverConfig, [])
-                runtimes = filter(lambda r: r is not None, jobs)
-                time_measure = None
-                if len(runtimes) > 0:
-                    if measure == 'mean':
-                        time_measure = numpy.average(runtimes)
-                    elif measure == 'median':
-                        time_measure = numpy.median(runtimes)
-                    elif measure == 'min':
-                        time_measure = min(runtimes)
-                    elif measure == 'max':
-                        time_measure = max(runtimes)
-                    elif measure == 'par10' or measure is None:
-                        time_measure = numpy.average(jobs or [0])
-                if request.args.has_key('csv'): rt_matrix[solver_config.idSolverConfig][
-                    instance.idInstance] = time_measure
-                flattened_rt_matrix.append(time_measure + 0.0000001)
+                solver_score = values.sum(axis=1) / count_by_solver
+                instance_hardness = values.sum(axis=0) / count_by_instance
+        sc_order = numpy.array([n for n in numpy.argsort(solver_score, kind='mergesort') if count_by_solver[n] > 0],
+                               dtype=int)
+        instance_order = numpy.array([n for n in numpy.argsort(instance_hardness, kind='mergesort')
+                                      if count_by_instance[n] > 0], dtype=int)
+        sorted_solver_configs = [solver_configs[n] for n in sc_order]
+        sorted_instances = [instances[n] for n in instance_order]
 
         if csv:
             csv_response = StringIO.StringIO()
             csv_writer = csv.writer(csv_response)
             csv_writer.writerow([''] + map(str, sorted_solver_configs))
-            for instance in sorted_instances:
-                row = [str(instance)]
-                for sc in sorted_solver_configs:
-                    row.append(str(rt_matrix[sc.idSolverConfig][instance.idInstance]))
-                csv_writer.writerow(row)
+            for instance, i in zip(sorted_instances, instance_order):
+                csv_writer.writerow([str(instance)] + [str(float(rt_matrix.values[n, i])) for n in sc_order])
             csv_response.seek(0)
 
             headers = Headers()
@@ -1172,9 +1212,9 @@ def runtime_matrix_plot(database, experiment_id):
             headers.add('Content-Disposition', 'attachment', filename=secure_filename(exp.name + "_runtime_matrix.csv"))
             return Response(response=csv_response.read(), headers=headers)
         else:
-            return make_plot_response(plots.runtime_matrix_plot, flattened_rt_matrix, len(sorted_solver_configs),
-                                      len(sorted_instances),
-                                      measure)
+            flattened_rt_matrix = (rt_matrix.values[numpy.ix_(sc_order, instance_order)].T + 0.0000001).ravel()
+            return make_plot_response(plots.runtime_matrix_plot, flattened_rt_matrix.tolist(),
+                                      len(sorted_solver_configs), len(sorted_instances), measure)
 
     if request.args.has_key('pdf'):
         type = 'pdf'
@@ -1184,7 +1224,7 @@ def runtime_matrix_plot(database, experiment_id):
         type = 'rscript'
     else:
         type = 'png'
-    return make_rtm_response(experiment_id, last_modified_job, measure, exp.get_num_jobs(db), cost,
+    return make_rtm_response(database, experiment_id, last_modified_job, measure, exp.get_num_jobs(db), cost,
                              request.args.has_key('csv'), type)
 
 
@@ -1193,17 +1233,17 @@ def runtime_matrix_plot(database, experiment_id):
 @require_login
 def parameter_plot_1d(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     parameter_id = int(request.args.get('parameter'))
-    parameter_name = db.session.query(db.Parameter).get(parameter_id).name
+    parameter_name = db.read_session().query(db.Parameter).get(parameter_id).name
     measure = request.args.get('measure', 'par10')
     instance_ids = map(int, request.args.getlist('i'))
     runtime_cap = float(request.args.get('runtime_cap'))
     log_param = request.args.has_key('log_x')
     log_cost = request.args.has_key('log_y')
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+    last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
         .filter_by(experiment=exp).first()
 
     CACHE_TIME = 14 * 24 * 60 * 60
@@ -1229,7 +1269,7 @@ def parameter_plot_1d(database, experiment_id):
                         not_(table.c['status'].in_((-1, 0,))),
                         table.c['Instances_idInstance'].in_(instance_ids)
                    ), from_obj=table.join(table_sc))
-        runs = db.session.connection().execute(s)
+        runs = db.read_session().connection().execute(s)
 
         table_sc = db.metadata.tables['SolverConfig']
         table_sc_params = db.metadata.tables['SolverConfig_has_Parameters']
@@ -1237,9 +1277,9 @@ def parameter_plot_1d(database, experiment_id):
                    and_(table_sc.c['Experiment_idExperiment'] == experiment_id,
                         table_sc_params.c['Parameters_idParameter'] == parameter_id),
                    from_obj=table_sc.join(table_sc_params))
-        param_values = db.session.connection().execute(s)
+        param_values = db.read_session().connection().execute(s)
 
-        solver_configs = db.session.query(db.SolverConfiguration).filter_by(experiment=exp).all()
+        solver_configs = db.read_session().query(db.SolverConfiguration).filter_by(experiment=exp).all()
         sc_dict = dict((sc.idSolverConfig, sc) for sc in solver_configs)
         sc_param_values = dict((sc.idSolverConfig, None) for sc in solver_configs)
         for pv in param_values: sc_param_values[pv.idSolverConfig] = float(pv.value)
@@ -1282,13 +1322,13 @@ def parameter_plot_1d(database, experiment_id):
 @require_login
 def parameter_plot_2d(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     surface_interpolation = request.args.has_key('surface_interpolation')
     parameter1_id = int(request.args.get('parameter1'))
     parameter2_id = int(request.args.get('parameter2'))
-    parameter1_name = db.session.query(db.Parameter).get(parameter1_id).name
-    parameter2_name = db.session.query(db.Parameter).get(parameter2_id).name
+    parameter1_name = db.read_session().query(db.Parameter).get(parameter1_id).name
+    parameter2_name = db.read_session().query(db.Parameter).get(parameter2_id).name
     measure = request.args.get('measure', 'par10')
     log_x = request.args.has_key('log_x')
     log_y = request.args.has_key('log_y')
@@ -1296,7 +1336,7 @@ def parameter_plot_2d(database, experiment_id):
     instance_ids = map(int, request.args.getlist('i'))
     runtime_cap = float(request.args.get('runtime_cap'))
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+    last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
         .filter_by(experiment=exp).first()
 
     CACHE_TIME = 14 * 24 * 60 * 60
@@ -1326,7 +1366,7 @@ def parameter_plot_2d(database, experiment_id):
                         not_(table.c['status'].in_((-1, 0,))),
                         table.c['Instances_idInstance'].in_(instance_ids)
                    ), from_obj=table.join(table_sc))
-        runs = db.session.connection().execute(s)
+        runs = db.read_session().connection().execute(s)
 
         s = select(['idSolverConfig', table_sc_params1.c['value'], table_sc_params2.c['value']],
                    and_(table_sc.c['Experiment_idExperiment'] == experiment_id,
@@ -1334,9 +1374,9 @@ def parameter_plot_2d(database, experiment_id):
                         table_sc_params2.c['Parameters_idParameter'] == parameter2_id,
                         table_sc_params1.c['value'] != None, table_sc_params2.c['value'] != None),
                    from_obj=table_sc.join(table_sc_params1).join(table_sc_params2))
-        param_values = db.session.connection().execute(s)
+        param_values = db.read_session().connection().execute(s)
 
-        solver_configs = db.session.query(db.SolverConfiguration).filter_by(experiment=exp).all()
+        solver_configs = db.read_session().query(db.SolverConfiguration).filter_by(experiment=exp).all()
         sc_dict = dict((sc.idSolverConfig, sc) for sc in solver_configs)
         sc_param_values = dict((sc.idSolverConfig, None) for sc in solver_configs)
         for pv in param_values: sc_param_values[pv.idSolverConfig] = (float(pv[1]), float(pv[2]))
@@ -1382,27 +1422,20 @@ def parameter_plot_2d(database, experiment_id):
 @require_login
 def perc_solved_alone(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    exp = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    exp = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
     instance_ids = map(int, request.args.getlist('i'))
     solver_config_ids = map(int, request.args.getlist('sc'))
     solver_configs = [sc for sc in exp.solver_configurations if sc.idSolverConfig in solver_config_ids]
 
-    table = db.metadata.tables['ExperimentResults']
-    s = select([table.c['SolverConfig_idSolverConfig'],
-                table.c['Instances_idInstance']],
-               and_(table.c['resultCode'].like(u'1%'),
-                    table.c['Instances_idInstance'].in_(instance_ids),
-                    table.c['SolverConfig_idSolverConfig'].in_(solver_config_ids),
-                    table.c['Experiment_idExperiment'] == exp.idExperiment,
-                    table.c['status'] == 1)).select_from(table)
-    successful_runs = db.session.connection().execute(s)
-
+    results_summary = summary.get_summary(db, exp.idExperiment)
     solved_instances = set()
     solved_instances_by_solver = dict((sc, set()) for sc in solver_config_ids)
-    for run in successful_runs:
-        solved_instances.add(run.Instances_idInstance)
-        solved_instances_by_solver[run.SolverConfig_idSolverConfig].add(run.Instances_idInstance)
+    for sc_id in solver_config_ids:
+        for i_id in instance_ids:
+            if results_summary.get(sc_id, i_id).successful > 0:
+                solved_instances.add(i_id)
+                solved_instances_by_solver[sc_id].add(i_id)
 
     perc_solved_by_solver = dict()
     for sc in solver_configs:
@@ -1417,38 +1450,29 @@ def perc_solved_alone(database, experiment_id):
 @require_login
 def correlation_matrix_plot(database, experiment_id):
     db = models.get_database(database) or abort(404)
-    experiment = db.session.query(db.Experiment).get(experiment_id) or abort(404)
+    experiment = db.read_session().query(db.Experiment).get(experiment_id) or abort(404)
 
-    instances = db.session.query(db.Instance).filter(
+    instances = db.read_session().query(db.Instance).filter(
         db.Instance.idInstance.in_(map(int, request.args.getlist('i')))).all()
-    solver_configs = db.session.query(db.SolverConfiguration).filter(
+    solver_configs = db.read_session().query(db.SolverConfiguration).filter(
         db.SolverConfiguration.idSolverConfig.in_(map(int, request.args.getlist('sc')))).all()
 
     @cache.memoize(7 * 24 * 60 * 60)
     def cached_correlation_matrix_plot(database, experiment_id, sc_names, request_args, job_count, last_modified_job):
         result_matrix, _, _ = experiment.get_result_matrix(db, solver_configs, instances,
                                                            request.args.get('cost', 'resultTime'))
-        sc_correlation = dict((sc, dict()) for sc in solver_configs)
-        for sc1 in solver_configs:
-            for sc2 in solver_configs:
-                if sc1 == sc2: sc_correlation[sc1][sc2] = sc_correlation[sc2][sc1] = 1.0; continue
-                if sc1 in sc_correlation and sc2 in sc_correlation[sc1]: continue
-                v1 = []
-                v2 = []
-                for instance in instances:
-                    for sc1run, sc2run in zip(result_matrix[instance.idInstance][sc1.idSolverConfig],
-                                              result_matrix[instance.idInstance][sc2.idSolverConfig]):
-                        v1.append(sc1run.penalized_time1)
-                        v2.append(sc2run.penalized_time1)
-                sc_correlation[sc1][sc2] = statistics.spearman_correlation(v1, v2)[0]
-                sc_correlation[sc2][sc1] = sc_correlation[sc1][sc2]
+        coefficients, _ = statistics.correlation_matrix(
+            statistics.aligned_run_matrix(result_matrix, solver_configs, instances),
+            request.args.get('method', 'spearman'))
+        sc_correlation = dict((sc1, dict((sc2, float(coefficients[i, j])) for j, sc2 in enumerate(solver_configs)))
+                              for i, sc1 in enumerate(solver_configs))
 
         return make_plot_response(plots.correlation_matrix_plot, sc_correlation)
 
 
-    last_modified_job = db.session.query(func.max(db.ExperimentResult.date_modified)) \
+    last_modified_job = db.read_session().query(func.max(db.ExperimentResult.date_modified)) \
         .filter_by(experiment=experiment).first()
-    job_count = db.session.query(db.ExperimentResult).filter_by(experiment=experiment).count()
+    job_count = db.read_session().query(db.ExperimentResult).filter_by(experiment=experiment).count()
 
     return cached_correlation_matrix_plot(database, experiment_id, ''.join(sc.name for sc in solver_configs),
-                                          request.args, job_count, last_modified_job)
+                                          request_args_cache_key(), job_count, last_modified_job)
@@ -13,13 +13,13 @@
 import uuid, datetime, os
 
 from jinja2 import FileSystemBytecodeCache
-from werkzeug import ImmutableDict
-from flask import Flask, Request, g, Blueprint
+from werkzeug import ImmutableDict, ImmutableMultiDict
+from flask import Flask, Request, g, Blueprint, request, abort
 from flask.ext.cache import Cache
 from flask.ext.mail import Mail
 from simplekv.fs import FilesystemStore
 from flask.ext.kvsession import KVSessionExtension
-from edacc import config, models, utils
+from edacc import config, models, utils, selection
 
 try:
     os.makedirs(config.TEMP_DIR)
@@ -53,6 +53,8 @@ if config.LOGGING:
 # initialize configured database connections
 for username, password, database, label, hidden in config.DEFAULT_DATABASES:
     models.add_database(username, password, database, label, hidden)
+for snapshot, database, label, hidden in config.DEFAULT_SNAPSHOTS:
+    models.add_database(None, None, database, label, hidden, snapshot=snapshot)
 
 
 class LimitedRequest(Request):
@@ -121,11 +123,27 @@ def make_unique_id():
     g.unique_id = uuid.uuid4().hex
 
 
+@app.before_request
+def expand_selection():
+    """ Replaces the selection=<ID> query argument of a stored selection by
+        the instance and solver configuration IDs it stands for.
+    """
+    if 'selection' not in request.args or 'database' not in (request.view_args or {}): return
+    database = request.view_args['database']
+    ids_by_argument = models.get_database(database) and \
+                      selection.load_selection(database, request.args['selection'])
+    if ids_by_argument is None: abort(404)
+    g.stored_selection = (request.args['selection'], ids_by_argument)
+    request.args = ImmutableMultiDict(selection.expand_arguments(request.args, ids_by_argument))
+
+
 @app.after_request
 def shutdown_session(response):
     """ remove SQLAlchemy session from thread after requests - might not even be needed for
     non-declarative SQLAlchemy usage according to the SQLAlchemy documentation.
+    Only databases the request actually used have a session to remove.
     """
     for db in models.get_databases().itervalues():
-        db.session.remove()
+        if db.session_in_use():
+            db.remove_sessions()
     return response
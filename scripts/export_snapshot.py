@@ -0,0 +1,29 @@
+"""
+    Exports an experiment of an EDACC database into a SQLite snapshot file
+    that the web frontend can serve read-only (see DEFAULT_SNAPSHOTS in
+    config.py). The database has to be configured in DEFAULT_DATABASES.
+
+    usage: python export_snapshot.py <database> <experiment id> <snapshot file>
+"""
+import sys
+sys.path.append("..")
+from edacc import models, config, snapshot
+
+if len(sys.argv) != 4:
+    print __doc__
+    sys.exit(1)
+
+database, experiment_id, filename = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+
+for username, password, db_name, label, hidden in config.DEFAULT_DATABASES:
+    if db_name == database:
+        break
+else:
+    print "Database " + database + " is not configured in DEFAULT_DATABASES"
+    sys.exit(1)
+
+db = models.add_database(username, password, database, label, hidden)
+row_counts = snapshot.export_experiment(db, experiment_id, filename)
+for table_name in sorted(row_counts):
+    print "%s: %d rows" % (table_name, row_counts[table_name])
+print "Exported experiment %d to %s" % (experiment_id, filename)
@@ -23,7 +23,7 @@ setup(
         "pillow>=1.1.7",
         "scipy>=0.9.0",
         "scikits.learn==0.8.1",
-        "numpy>=1.5.1",
+        "numpy>=1.6",
         "lxml>=2.3",
         "pbkdf2>=1.3",
         "pylzma>=0.4.4",